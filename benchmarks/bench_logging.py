@@ -0,0 +1,53 @@
+import contextlib
+import os
+import random
+import time
+
+from projects.rpg_env import RpgEnv
+
+"""
+比较 RpgEnv 三种 verbosity 下的 step 吞吐量。
+运行: python -m benchmarks.bench_logging [回合数]
+("human" 模式的输出被重定向到 os.devnull, 只计算格式化 + 写出的开销)
+"""
+
+
+def run_episodes(verbosity, n_episodes, seed=0):
+    """跑 n_episodes 个随机策略回合, 返回 (agent-steps 数, 用时秒)"""
+    env = RpgEnv(verbosity=verbosity)
+    policy_rng = random.Random(seed)
+    num_actions = env.action_spaces[env.possible_agents[0]].n
+    agent_steps = 0
+    start = time.perf_counter()
+    for episode in range(n_episodes):
+        env.reset(seed=seed + episode)
+        while env.agents:
+            actions = {agent: policy_rng.randrange(num_actions) for agent in env.agents}
+            agent_steps += len(actions)
+            env.step(actions)
+        if env.event_log is not None:
+            env.event_log.clear()
+    return agent_steps, time.perf_counter() - start
+
+
+def main(n_episodes=200):
+    results = {}
+    with open(os.devnull, "w") as devnull:
+        for verbosity in ("human", "events", "silent"):
+            if verbosity == "human":
+                with contextlib.redirect_stdout(devnull):
+                    agent_steps, elapsed = run_episodes(verbosity, n_episodes)
+            else:
+                agent_steps, elapsed = run_episodes(verbosity, n_episodes)
+            results[verbosity] = agent_steps / elapsed
+
+    print(f"--- [Benchmark] RpgEnv.step verbosity ({n_episodes} 回合) ---")
+    for verbosity, rate in results.items():
+        speedup = rate / results["human"]
+        print(f"  {verbosity:>6}: {rate:12,.0f} agent-steps/s  (x{speedup:.2f} vs human)")
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,125 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+"""
+启动开销基准: 每一项都在全新的 Python 进程里测 "import 耗时" 和 "第一次 reset (构造 + reset) 耗时",
+也就是短评估任务的 worker 每次启动都要付的固定成本。
+
+    python -m benchmarks.bench_startup                    # 每项跑 5 次, 取中位数
+    python -m benchmarks.bench_startup rpg_env --repeat 20
+    python -m benchmarks.bench_startup --output startup.json
+
+"进程" 一列是父进程看到的整个子进程耗时 (包括解释器自己的启动)。
+*_cold 项把 RPG_CACHE_DIR 设成一个空的临时目录, 所以 config 需要重新编译并写缓存。
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 名字 -> (import 语句, 第一次 reset 的代码)
+CASES = {
+    "rpg_env": (
+        "from projects.rpg_env import RpgEnv",
+        "RpgEnv(verbosity='silent').reset(seed=0)",
+    ),
+    "rpg_env_cold": (
+        "from projects.rpg_env import RpgEnv",
+        "RpgEnv(verbosity='silent').reset(seed=0)",
+    ),
+    "vec_rpg_env": (
+        "from projects.vec_rpg_env import VecRpgEnv",
+        "VecRpgEnv(64).reset(seed=0)",
+    ),
+    "rollout_farm": (
+        "from projects import rollout_farm",
+        "rollout_farm.RpgEnv(verbosity='silent').reset(seed=0)",
+    ),
+    "llm_agent": (
+        "from projects.llm_agent import LLMAgent; from projects.fake_llm import FakeGenerativeModel",
+        "LLMAgent(model=FakeGenerativeModel(latency=0))",
+    ),
+}
+
+CHILD = """
+import json, sys, time
+t0 = time.perf_counter()
+{imports}
+t1 = time.perf_counter()
+{first}
+t2 = time.perf_counter()
+print(json.dumps({{"import_s": t1 - t0, "first_s": t2 - t1, "modules": len(sys.modules)}}))
+"""
+
+
+def run_once(name):
+    imports, first = CASES[name]
+    env = dict(os.environ)
+    cold_dir = None
+    if name.endswith("_cold"):
+        cold_dir = tempfile.TemporaryDirectory(prefix="rpg_cache_")
+        env["RPG_CACHE_DIR"] = cold_dir.name
+    try:
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", CHILD.format(imports=imports, first=first)],
+                             cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+        wall = time.perf_counter() - start
+    finally:
+        if cold_dir is not None:
+            cold_dir.cleanup()
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result["process_s"] = wall
+    return result
+
+
+def run_startup_benchmarks(names=None, repeat=5):
+    results = {}
+    for name in names or CASES:
+        runs = [run_once(name) for _ in range(repeat)]
+        results[name] = {
+            "import_ms": statistics.median(r["import_s"] for r in runs) * 1e3,
+            "first_reset_ms": statistics.median(r["first_s"] for r in runs) * 1e3,
+            "process_ms": statistics.median(r["process_s"] for r in runs) * 1e3,
+            "modules": runs[-1]["modules"],
+        }
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="import + 第一次 reset 的启动开销")
+    parser.add_argument("names", nargs="*", help=f"只跑这些项 (可选: {', '.join(CASES)})")
+    parser.add_argument("--repeat", type=int, default=5, help="每一项启动几个进程 (取中位数)")
+    parser.add_argument("--output", default=None, help="把结果写进这个 JSON 文件")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.names if name not in CASES]
+    if unknown:
+        parser.error(f"未知的基准项: {unknown}")
+
+    report = run_startup_benchmarks(args.names or None, args.repeat)
+    print(f"--- [Benchmark] 启动开销 (中位数, {args.repeat} 个进程) ---")
+    print(f"  {'case':<14} {'import ms':>10} {'首次 reset ms':>14} {'进程 ms':>10} {'模块数':>8}")
+    for name, r in report["results"].items():
+        print(f"  {name:<14} {r['import_ms']:>10.1f} {r['first_reset_ms']:>14.1f} {r['process_ms']:>10.1f} {r['modules']:>8}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
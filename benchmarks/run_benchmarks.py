@@ -0,0 +1,449 @@
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from projects.rpg_env import RpgEnv
+from projects.rpg_aec_env import RpgAECEnv
+from projects.vec_rpg_env import VecRpgEnv
+from projects.llm_agent import LLMAgent
+from projects.fake_llm import FakeGenerativeModel
+from projects.trajectory import TrajectoryRecorder
+from projects.profiler import Profiler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test"))
+from hello_boss import HelloBossEnv
+
+"""
+性能基准套件: 测量 env 的 step 吞吐量, 并和保存的基线比较。
+
+    python -m benchmarks.run_benchmarks --no-baseline           # 跑全部, 只打印结果
+    python -m benchmarks.run_benchmarks --output results.json   # 结果写成 JSON
+    python -m benchmarks.run_benchmarks --save-baseline         # 把这次结果存为基线
+    python -m benchmarks.run_benchmarks --baseline benchmarks/baseline.json --threshold 0.2
+        # 任何一项比基线慢 20% 以上 (或者每次调用的分配多 20% 以上) 就以退出码 1 失败
+        # 基线文件不存在时以退出码 2 失败 (不会悄悄跳过比较)
+
+每一项报告:
+    ops_per_sec          每秒调用次数 (step / reset / prompt 构建 ...)
+    ns_per_agent_step    每个 agent-step 的纳秒数 (非 step 类的项 = 每次调用)
+    alloc_blocks_per_op  每次调用留下的内存块数 (sys.getallocatedblocks 的差值, 单独一轮测量)。
+                         测量时关掉 gc, 所以每次调用产生的循环垃圾也算在里面; 回归检查看的是这一项
+    peak_bytes_per_op    每次调用期间 tracemalloc 记录的内存峰值 (相对调用前, 单独一轮测量, 只做参考)
+"""
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# 动作组合: 随机 / 全是战斗 (打 Boss, 战斗中即攻击) / 全是制作升级
+ACTION_MIXES = {
+    "random": list(range(12)),
+    "battle": list(range(1, 7)),
+    "craft": list(range(7, 12)),
+}
+
+
+def _action_table(agents, mix, n=None, seed=0):
+    """预先生成动作字典, 避免把策略的开销算进 env (agent 很多时少生成几个, 控制内存)"""
+    if n is None:
+        n = 1024 if len(agents) <= 64 else 64
+    rng = random.Random(seed)
+    return [{agent: rng.choice(mix) for agent in agents} for _ in range(n)]
+
+
+def case_rpg_reset(n_agents=5):
+    def make():
+        return _rpg_reset(n_agents)
+    return make
+
+
+def _rpg_reset(n_agents):
+    env = RpgEnv(verbosity="silent", n_agents=n_agents)
+    seeds = iter(range(10 ** 9))
+
+    def run():
+        env.reset(seed=next(seeds))
+        return len(env.agents)
+    return run
+
+
+def case_rpg_step(mix, record=False, profile=False, **env_kwargs):
+    def make():
+        # record: 每一步都写进轨迹 (分段写进临时目录, 测完删掉); profile: 打开分阶段计时
+        tmp = tempfile.TemporaryDirectory(prefix="bench_traj_") if record else None
+        recorder = TrajectoryRecorder(tmp.name) if record else None
+        env = RpgEnv(verbosity="silent", recorder=recorder, profiler=Profiler() if profile else None, **env_kwargs)
+        env.reset(seed=0)
+        table = _action_table(env.possible_agents, ACTION_MIXES[mix])
+        state = {"i": 0, "episode": 0}
+
+        def run():
+            if not env.agents:
+                state["episode"] += 1
+                env.reset(seed=state["episode"])
+            n = len(env.agents)
+            env.step(table[state["i"] % len(table)])
+            state["i"] += 1
+            return n
+
+        if record:
+            def close():
+                recorder.close()
+                tmp.cleanup()
+            run.close = close
+        return run
+    return make
+
+
+def case_rpg_step_sparse(n_agents, n_acting):
+    """大世界里每一步只有 n_acting 个 agent 提交动作 (fast_forward: 每个 agent 的时钟只在自己行动时前进)"""
+    def make():
+        env = RpgEnv(verbosity="silent", fast_forward=True, n_agents=n_agents)
+        env.reset(seed=0)
+        rng = random.Random(0)
+        table = [{agent: rng.choice(ACTION_MIXES["random"]) for agent in rng.sample(env.possible_agents, n_acting)}
+                 for _ in range(1024)]
+        state = {"i": 0, "episode": 0}
+
+        def run():
+            if env.num_agents == 0: # (不读 env.agents: 有 agent 结束之后它要重建整个列表)
+                state["episode"] += 1
+                env.reset(seed=state["episode"])
+            rewards = env.step(table[state["i"] & 1023])[1]
+            state["i"] += 1
+            return len(rewards) # 已经结束的 agent 的动作会被忽略
+        return run
+    return make
+
+
+def case_vec_step(n_envs, n_agents, mix):
+    def make():
+        import numpy as np
+        env = VecRpgEnv(n_envs, n_agents)
+        env.reset(seed=0)
+        rng = np.random.default_rng(0)
+        table = rng.choice(ACTION_MIXES[mix], size=(64, n_envs, n_agents))
+        state = {"i": 0}
+
+        def run():
+            if not env.active.any():
+                env.reset(seed=state["i"])
+            n = int(env.active.sum())
+            env.step(table[state["i"] & 63])
+            state["i"] += 1
+            return n
+        return run
+    return make
+
+
+def case_rpg_episode(fast_forward):
+    """一整个回合 (全是战斗动作); fast_forward 模式下战斗在一次 step 里打完"""
+    def make():
+        env = RpgEnv(verbosity="silent", fast_forward=fast_forward)
+        table = _action_table(env.possible_agents, ACTION_MIXES["battle"])
+        state = {"episode": 0}
+
+        def run():
+            env.reset(seed=state["episode"])
+            state["episode"] += 1
+            i = 0
+            while env.agents:
+                env.step(table[i & 1023])
+                i += 1
+            # agent-step 按游戏里经过的步数算, 两种模式可以直接比较
+            return sum(env.agent_steps.values()) if fast_forward else env.current_step * len(env.possible_agents)
+        return run
+    return make
+
+
+def case_rpg_snapshot(restore):
+    def make():
+        env = RpgEnv(verbosity="silent")
+        env.reset(seed=0)
+        table = _action_table(env.possible_agents, ACTION_MIXES["battle"])
+        for actions in table[:30]:
+            env.step(actions)
+        state = env.get_state()
+
+        def run():
+            if restore:
+                env.set_state(state)
+            else:
+                env.get_state()
+            return 1
+        return run
+    return make
+
+
+def case_vec_restore(n_envs, n_agents):
+    def make():
+        env = VecRpgEnv(n_envs, n_agents)
+        env.reset(seed=0)
+        state = env.get_state()
+
+        def run():
+            env.set_state(state)
+            return 1
+        return run
+    return make
+
+
+def case_hello_boss_aec():
+    env = HelloBossEnv()
+    env.reset()
+
+    def run():
+        agent = env.agent_selection
+        if env.terminations[agent]:
+            env.reset()
+        env.step(1 if agent == "player_0" else 0)
+        return 1
+    return run
+
+
+def case_rpg_aec(native, mix="random", **env_kwargs):
+    """AEC 接口的一次 agent 回合 (last + step): 原生的 RpgAECEnv 对比 PettingZoo 通用的 parallel_to_aec 转换"""
+    def make():
+        env = RpgEnv(verbosity="silent", **env_kwargs)
+        if native:
+            aec = RpgAECEnv(env)
+        else:
+            import warnings
+            from pettingzoo.utils.conversions import parallel_to_aec
+            warnings.simplefilter("ignore") # 通用转换会对 action_spaces 字典发 DeprecationWarning
+            aec = parallel_to_aec(env)
+        aec.reset(seed=0)
+        table = _action_table(env.possible_agents, ACTION_MIXES[mix])
+        state = {"i": 0, "episode": 0}
+
+        def run():
+            if not aec.agents:
+                state["episode"] += 1
+                aec.reset(seed=state["episode"])
+            agent = aec.agent_selection
+            _, _, terminated, truncated, _ = aec.last()
+            aec.step(None if terminated or truncated else table[state["i"] & 1023][agent])
+            state["i"] += 1
+            return 1
+        return run
+    return make
+
+
+def _llm_agent():
+    return LLMAgent(model=FakeGenerativeModel(latency=0))
+
+
+def case_llm_prompt_build():
+    agent = _llm_agent()
+    env = RpgEnv(verbosity="silent")
+    observations, infos = env.reset(seed=0)
+    obs = observations["player_0"]
+    obs["my_inventory"]["common_stone"] = 15
+    obs["my_weapons"]["fire_sword"] = 2
+
+    def run():
+        agent._build_prompt(obs, 42)
+        return 1
+    return run
+
+
+def case_llm_parse():
+    agent = _llm_agent()
+    text = json.dumps({"thought": "我的背包是空的, 我需要 common_stone, 我应该去打 fire_boss。", "action_id": 1},
+                      ensure_ascii=False)
+
+    def run():
+        agent._parse_llm_response(text)
+        return 1
+    return run
+
+
+# 名字 -> 构造函数 (返回一个 run() -> 这次调用包含的 agent-step 数)
+CASES = {
+    "rpg_reset": case_rpg_reset(),
+    "rpg_reset_1000": case_rpg_reset(1000),
+    "rpg_step_random_5": case_rpg_step("random"),
+    "rpg_step_battle_5": case_rpg_step("battle"),
+    "rpg_step_craft_5": case_rpg_step("craft"),
+    "rpg_step_random_1000": case_rpg_step("random", n_agents=1000),
+    "rpg_step_battle_1000": case_rpg_step("battle", n_agents=1000),
+    "rpg_step_craft_1000": case_rpg_step("craft", n_agents=1000),
+    "rpg_step_random_5_array": case_rpg_step("random", obs_format="array"),
+    "rpg_step_battle_5_delta": case_rpg_step("battle", delta_obs=True),
+    "rpg_step_random_5_record": case_rpg_step("random", record=True),
+    "rpg_step_random_5_profile": case_rpg_step("random", profile=True),
+    "rpg_step_sparse_64_of_1000": case_rpg_step_sparse(1000, 64),
+    "rpg_step_sparse_64_of_10000": case_rpg_step_sparse(10000, 64),
+    "vec_step_random_256x5": case_vec_step(256, 5, "random"),
+    "vec_step_random_1x1000": case_vec_step(1, 1000, "random"),
+    "vec_step_battle_1x1000": case_vec_step(1, 1000, "battle"),
+    "vec_step_craft_1x1000": case_vec_step(1, 1000, "craft"),
+    "rpg_episode_battle": case_rpg_episode(fast_forward=False),
+    "rpg_episode_battle_ff": case_rpg_episode(fast_forward=True),
+    "rpg_get_state": case_rpg_snapshot(restore=False),
+    "rpg_set_state": case_rpg_snapshot(restore=True),
+    "vec_set_state_256x5": case_vec_restore(256, 5),
+    "hello_boss_aec_step": case_hello_boss_aec,
+    "rpg_aec_turn_native": case_rpg_aec(native=True),
+    "rpg_aec_turn_generic": case_rpg_aec(native=False),
+    "rpg_aec_turn_native_array": case_rpg_aec(native=True, obs_format="array"),
+    "rpg_aec_turn_generic_array": case_rpg_aec(native=False, obs_format="array"),
+    "llm_prompt_build": case_llm_prompt_build,
+    "llm_parse": case_llm_parse,
+}
+
+
+def measure(make_case, min_time=0.5, alloc_ops=200):
+    """计时一轮 (至少 min_time 秒), 再单独测一轮分配和一轮内存峰值; 测完调用 run.close() (如果有)"""
+    run = make_case()
+    try:
+        return _measure(run, min_time, alloc_ops)
+    finally:
+        close = getattr(run, "close", None)
+        if close is not None:
+            close()
+
+
+def _measure(run, min_time, alloc_ops):
+    for _ in range(10): # 预热
+        run()
+
+    ops = 0
+    agent_steps = 0
+    start = time.perf_counter_ns()
+    deadline = start + int(min_time * 1e9)
+    now = start
+    while now < deadline:
+        for _ in range(50):
+            agent_steps += run()
+        ops += 50
+        now = time.perf_counter_ns()
+    elapsed_ns = now - start
+
+    gc.collect()
+    gc.disable()
+    try:
+        blocks = sys.getallocatedblocks()
+        for _ in range(alloc_ops):
+            run()
+        blocks = sys.getallocatedblocks() - blocks
+    finally:
+        gc.enable()
+    gc.collect()
+
+    tracemalloc.start()
+    peak_total = 0
+    for _ in range(alloc_ops):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+        peak_total += peak - current
+    tracemalloc.stop()
+
+    return {
+        "ops": ops,
+        "seconds": elapsed_ns / 1e9,
+        "ops_per_sec": ops / (elapsed_ns / 1e9),
+        "ns_per_agent_step": elapsed_ns / max(agent_steps, 1),
+        "alloc_blocks_per_op": blocks / alloc_ops,
+        "peak_bytes_per_op": peak_total / alloc_ops,
+    }
+
+
+def run_benchmarks(names=None, min_time=0.5):
+    results = {}
+    with open(os.devnull, "w") as devnull:
+        for name in names or CASES:
+            # HelloBossEnv 和 LLMAgent 会 print, 基准测试时丢掉
+            with contextlib.redirect_stdout(devnull):
+                results[name] = measure(CASES[name], min_time=min_time)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare_to_baseline(report, baseline, threshold):
+    """返回回归列表: 吞吐量低于基线 (1 - threshold) 倍, 或者每次调用的分配高于基线 (1 + threshold) 倍"""
+    regressions = []
+    for name, current in report["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        if current["ops_per_sec"] < base["ops_per_sec"] * (1 - threshold):
+            regressions.append(f"{name}: {current['ops_per_sec']:,.0f} ops/s < 基线 {base['ops_per_sec']:,.0f} ops/s")
+        # 分配给 1 块/次的余量, 避免很小的数字抖动 (例如偶尔扩容的缓存) 触发失败
+        if "alloc_blocks_per_op" not in base:
+            regressions.append(f"{name}: 基线里没有 alloc_blocks_per_op (旧格式), 请重新 --save-baseline")
+        elif current["alloc_blocks_per_op"] > base["alloc_blocks_per_op"] * (1 + threshold) + 1:
+            regressions.append(f"{name}: 分配 {current['alloc_blocks_per_op']:,.1f} 块/op > "
+                               f"基线 {base['alloc_blocks_per_op']:,.1f} 块/op")
+    return regressions
+
+
+def print_report(report):
+    print(f"  {'benchmark':<26} {'ops/s':>12} {'ns/agent-step':>14} {'blocks/op':>10} {'peak B/op':>11}")
+    for name, r in report["results"].items():
+        print(f"  {name:<26} {r['ops_per_sec']:>12,.0f} {r['ns_per_agent_step']:>14,.0f} "
+              f"{r['alloc_blocks_per_op']:>10,.1f} {r['peak_bytes_per_op']:>11,.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="env 吞吐量基准测试 + 回归检查")
+    parser.add_argument("names", nargs="*", help=f"只跑这些项 (可选: {', '.join(CASES)})")
+    parser.add_argument("--min-time", type=float, default=0.5, help="每一项至少计时多少秒")
+    parser.add_argument("--output", default=None, help="把结果写进这个 JSON 文件")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="基线 JSON 文件")
+    parser.add_argument("--threshold", type=float, default=0.2, help="允许的回归比例 (0.2 = 20%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="把这次的结果存为基线")
+    parser.add_argument("--no-baseline", action="store_true", help="只打印结果, 不和基线比较")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.names if name not in CASES]
+    if unknown:
+        parser.error(f"未知的基准项: {unknown}")
+
+    report = run_benchmarks(args.names or None, min_time=args.min_time)
+    print("--- [Benchmark] ---")
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"--- 基线已保存到 {args.baseline} ---")
+        return 0
+
+    if args.no_baseline:
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"--- [警告] 基线文件 {args.baseline} 不存在, 没法做回归检查 "
+              f"(先用 --save-baseline 生成, 或者加 --no-baseline 只打印结果) ---")
+        return 2
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare_to_baseline(report, baseline, args.threshold)
+    if regressions:
+        print(f"--- [回归] 超过 {args.threshold:.0%} 阈值: ---")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"--- 和基线相比没有超过 {args.threshold:.0%} 的回归 ---")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
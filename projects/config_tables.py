@@ -0,0 +1,222 @@
+import os
+import pickle
+import hashlib
+import functools
+
+import numpy as np
+
+from config import config_globals, config_bosses, config_weapons
+
+"""
+Config 编译阶段: 把 config/ 里的字典翻译成按整数下标索引的 NumPy 表。
+编译结果会缓存到磁盘 (见 load_config_tables), 进程启动时 config 没改就直接读取。
+
+    damage[武器, 等级, Boss]  有武器时的一次攻击伤害 (已乘属性克制)
+    cost[武器, 等级, 材料]    升到这个等级需要的各材料数量 (第 0 级全 0)
+
+下标顺序: Boss 同 BOSS_DATA, 武器同 WEAPON_DATA, 材料同 STONE_NAMES。
+配置错误 (例如缺少 ATTR_MATRIX 条目) 会在编译时抛出 ValueError, 而不是在回合中途 KeyError。
+"""
+
+FIST_DAMAGE = 1  # 没有武器时的伤害
+FINAL_BOSS = "final_boss"
+
+# 编译结果的磁盘缓存目录 (设成空字符串 = 不用磁盘缓存)
+CACHE_DIR_ENV = "RPG_CACHE_DIR"
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "rpg")
+# ConfigTables 的字段有变化时改这里, 旧的缓存文件就不会再被读取
+CACHE_FORMAT = 2
+
+
+class ConfigTables:
+    """编译好的 config, 所有字段只读"""
+
+    def __init__(self, boss_data, loot_tables, weapon_data, attr_matrix,
+                 upgrade_costs, upgrade_damage, stone_names, max_weapon_level):
+        self.boss_names = list(boss_data.keys())
+        self.weapon_names = list(weapon_data.keys())
+        self.stone_names = list(stone_names)
+        self.max_weapon_level = max_weapon_level
+        # 每把武器的属性 (顺序同 weapon_names)
+        self.weapon_attrs = [weapon_data[w][1] for w in self.weapon_names]
+
+        self.boss_index = {name: i for i, name in enumerate(self.boss_names)}
+        self.weapon_index = {name: i for i, name in enumerate(self.weapon_names)}
+        self.stone_index = {name: i for i, name in enumerate(self.stone_names)}
+
+        _validate(boss_data, loot_tables, weapon_data, attr_matrix,
+                  upgrade_costs, upgrade_damage, self.stone_index, max_weapon_level)
+
+        n_bosses = len(self.boss_names)
+        n_weapons = len(self.weapon_names)
+        n_levels = max_weapon_level + 1
+
+        # --- Boss ---
+        self.boss_hp = np.array([boss_data[b][0] for b in self.boss_names], dtype=np.float64)
+        self.boss_retaliation = np.array([boss_data[b][2] for b in self.boss_names], dtype=np.int32)
+        self.boss_is_final = np.array([b == FINAL_BOSS for b in self.boss_names])
+        self.final_boss = self.boss_index[FINAL_BOSS]
+        # final_boss 需要一把满级武器才能造成伤害
+        self.requires_max_weapon = self.boss_is_final.copy()
+
+        # --- 伤害表 [武器, 等级, Boss] ---
+        self.damage = np.zeros((n_weapons, n_levels, n_bosses), dtype=np.float64)
+        for w, weapon_name in enumerate(self.weapon_names):
+            base_dmg, weapon_attr = weapon_data[weapon_name]
+            for level in range(n_levels):
+                for b, boss_name in enumerate(self.boss_names):
+                    boss_attr = boss_data[boss_name][1]
+                    multiplier = attr_matrix[weapon_attr][boss_attr]
+                    self.damage[w, level, b] = (base_dmg + upgrade_damage[level]) * multiplier
+
+        # --- 升级成本表 [武器, 等级, 材料] ---
+        self.cost = np.zeros((n_weapons, n_levels, len(self.stone_names)), dtype=np.int32)
+        for w, weapon_name in enumerate(self.weapon_names):
+            for level in range(1, n_levels):
+                for material, amount in upgrade_costs[level].items():
+                    stone = _resolve_material(material, weapon_data[weapon_name][1])
+                    self.cost[w, level, self.stone_index[stone]] += amount
+
+        # --- 掉落表: Boss 下标 -> [(材料下标, 概率, 数量), ...] ---
+        self.loot = [
+            [(self.stone_index[item], prob, amount) for item, prob, amount in loot_tables[boss_name]]
+            for boss_name in self.boss_names
+        ]
+        # 同一张掉落表补齐成矩阵 [Boss, 条目] (批量掉落用): 补齐的条目概率为 0, 永远不会掉
+        max_entries = max(len(entries) for entries in self.loot)
+        self.loot_count = np.array([len(entries) for entries in self.loot], dtype=np.int64)
+        self.loot_item = np.zeros((n_bosses, max_entries), dtype=np.intp)
+        self.loot_prob = np.zeros((n_bosses, max_entries), dtype=np.float64)
+        self.loot_amount = np.zeros((n_bosses, max_entries), dtype=np.int32)
+        for b, entries in enumerate(self.loot):
+            for k, (item, prob, amount) in enumerate(entries):
+                self.loot_item[b, k] = item
+                self.loot_prob[b, k] = prob
+                self.loot_amount[b, k] = amount
+
+        # 逐 agent 的 (dict 状态) 热路径用的 Python 版本, 避免 NumPy 标量的开销
+        self.damage_list = self.damage.tolist()
+        self.boss_hp_list = [boss_data[b][0] for b in self.boss_names]
+        self.boss_retaliation_list = self.boss_retaliation.tolist()
+        # recipes[武器][等级] -> ((材料名, 数量), ...)
+        self.recipes = [
+            [
+                tuple((self.stone_names[s], int(self.cost[w, level, s])) for s in np.flatnonzero(self.cost[w, level]))
+                for level in range(n_levels)
+            ]
+            for w in range(n_weapons)
+        ]
+
+
+def _resolve_material(material, weapon_attr):
+    """UPGRADE_COSTS 里的 "attribute_stone" 指的是武器自己属性的石头"""
+    if material == "attribute_stone":
+        return f"{weapon_attr}_stone"
+    return material
+
+
+def _validate(boss_data, loot_tables, weapon_data, attr_matrix,
+              upgrade_costs, upgrade_damage, stone_index, max_weapon_level):
+    if FINAL_BOSS not in boss_data:
+        raise ValueError(f"BOSS_DATA 缺少 {FINAL_BOSS}")
+
+    for boss_name, (hp, boss_attr, retaliation) in boss_data.items():
+        if hp <= 0:
+            raise ValueError(f"BOSS_DATA[{boss_name!r}] 的血量必须大于 0")
+        if retaliation < 0:
+            raise ValueError(f"BOSS_DATA[{boss_name!r}] 的反击伤害不能为负")
+        if boss_name not in loot_tables:
+            raise ValueError(f"LOOT_TABLES 缺少 {boss_name!r}")
+        for item, prob, amount in loot_tables[boss_name]:
+            if item not in stone_index:
+                raise ValueError(f"LOOT_TABLES[{boss_name!r}] 里的 {item!r} 不在 STONE_NAMES 中")
+            if not 0.0 <= prob <= 1.0:
+                raise ValueError(f"LOOT_TABLES[{boss_name!r}] 里 {item!r} 的概率 {prob} 不在 [0, 1] 内")
+
+    boss_attrs = {boss_attr for _, boss_attr, _ in boss_data.values()}
+    for weapon_name, (base_dmg, weapon_attr) in weapon_data.items():
+        if weapon_attr not in attr_matrix:
+            raise ValueError(f"ATTR_MATRIX 缺少武器属性 {weapon_attr!r} ({weapon_name})")
+        for boss_attr in boss_attrs:
+            if boss_attr not in attr_matrix[weapon_attr]:
+                raise ValueError(f"ATTR_MATRIX[{weapon_attr!r}] 缺少 Boss 属性 {boss_attr!r}")
+
+    for level in range(max_weapon_level + 1):
+        if level not in upgrade_damage:
+            raise ValueError(f"UPGRADE_DAMAGE 缺少等级 {level}")
+    for level in range(1, max_weapon_level + 1):
+        if level not in upgrade_costs:
+            raise ValueError(f"UPGRADE_COSTS 缺少等级 {level}")
+        for material in upgrade_costs[level]:
+            for weapon_name, (_, weapon_attr) in weapon_data.items():
+                stone = _resolve_material(material, weapon_attr)
+                if stone not in stone_index:
+                    raise ValueError(f"UPGRADE_COSTS[{level}] 的材料 {stone!r} ({weapon_name}) 不在 STONE_NAMES 中")
+
+
+def compile_config(**overrides):
+    """
+    编译 config 模块。可以用关键字参数替换任意一张表 (例如 attr_matrix=...), 方便测试新配置。
+    """
+    sources = dict(
+        boss_data=config_bosses.BOSS_DATA,
+        loot_tables=config_bosses.LOOT_TABLES,
+        weapon_data=config_weapons.WEAPON_DATA,
+        attr_matrix=config_weapons.ATTR_MATRIX,
+        upgrade_costs=config_weapons.UPGRADE_COSTS,
+        upgrade_damage=config_weapons.UPGRADE_DAMAGE,
+        stone_names=config_globals.STONE_NAMES,
+        max_weapon_level=config_globals.MAX_WEAPON_LEVEL,
+    )
+    unknown = set(overrides) - set(sources)
+    if unknown:
+        raise TypeError(f"未知的 config 表: {sorted(unknown)}")
+    sources.update(overrides)
+    return ConfigTables(**sources)
+
+
+def config_fingerprint():
+    """默认 config 的指纹: config/*.py 和这个文件的内容, 加上 Python / NumPy 版本 (pickle 兼容性)"""
+    digest = hashlib.sha256(f"{CACHE_FORMAT}|{np.__version__}|{pickle.HIGHEST_PROTOCOL}".encode())
+    for path in (config_globals.__file__, config_bosses.__file__, config_weapons.__file__, __file__):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def load_config_tables(cache_dir=None):
+    """
+    默认 config 的编译结果, 优先从磁盘缓存读取 (文件名带 config_fingerprint(), config 一改就自动重新编译)。
+    缓存读不了/写不了 (损坏, 只读文件系统...) 时直接编译, 不会报错。
+    """
+    if cache_dir is None:
+        cache_dir = os.environ.get(CACHE_DIR_ENV, DEFAULT_CACHE_DIR)
+    if not cache_dir:
+        return compile_config()
+
+    path = os.path.join(cache_dir, f"config_tables-{config_fingerprint()}.pkl")
+    try:
+        with open(path, "rb") as f:
+            tables = pickle.load(f)
+        if isinstance(tables, ConfigTables):
+            return tables
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        pass
+
+    tables = compile_config()
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # 先写临时文件再替换, 并发启动的进程不会读到写了一半的文件
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(tables, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+    return tables
+
+
+@functools.lru_cache(maxsize=None)
+def get_config_tables():
+    """默认 config 的编译结果 (每个进程只加载一次, 见 load_config_tables)"""
+    return load_config_tables()
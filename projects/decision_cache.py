@@ -0,0 +1,110 @@
+import hashlib
+import json
+import sqlite3
+from collections import OrderedDict
+
+"""
+LLMAgent 的决策缓存。
+
+观察空间很小而且高度重复, 同一个 (观察, Prompt 版本, 模型) 没必要每次都问一遍 LLM。
+缓存的 key 是 _build_user_prompt 用到的那些观察字段的规范化哈希:
+    血量, 状态, 战斗中 Boss 血量, 背包 (非零项), 武器 (非零项), 当前步数 (可分桶)
+再加上 Prompt 版本和模型名。
+
+两层存储:
+    内存 LRU (超过 max_entries 时淘汰最久没用过的)
+    可选的 sqlite 文件 (多次运行之间共享, 内存里没有时再查)
+"""
+
+
+class DecisionCache:
+    """
+    max_entries: 内存 LRU 的容量
+    path:        sqlite 文件路径 (None = 只用内存)
+    step_bucket: 步数分桶大小。1 = 精确步数, k = 按 step // k 分桶, None = 不看步数
+    """
+
+    def __init__(self, max_entries=10000, path=None, step_bucket=1):
+        self.max_entries = max_entries
+        self.step_bucket = step_bucket
+        self._entries = OrderedDict()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._db = None
+        if path is not None:
+            # autocommit + WAL: 多个进程可以同时读写同一个缓存文件
+            self._db = sqlite3.connect(path, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS decisions (key TEXT PRIMARY KEY, action_id INTEGER NOT NULL)")
+
+    def make_key(self, obs, current_step, model_name, prompt_version):
+        """把观察规范化后哈希成缓存 key"""
+        if self.step_bucket is None:
+            step = None
+        else:
+            step = current_step // self.step_bucket
+        canonical = [
+            prompt_version,
+            model_name,
+            step,
+            int(obs["my_health"]),
+            int(obs["my_state"]),
+            float(obs["battle_boss_health"]),
+            sorted((item, int(count)) for item, count in obs["my_inventory"].items() if count > 0),
+            sorted((wep, int(lvl)) for wep, lvl in obs["my_weapons"].items() if lvl > 0),
+        ]
+        text = json.dumps(canonical, separators=(",", ":"))
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """命中返回动作ID, 否则返回 None"""
+        action_id = self._entries.get(key)
+        if action_id is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return action_id
+
+        if self._db is not None:
+            row = self._db.execute("SELECT action_id FROM decisions WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self.disk_hits += 1
+                self._remember(key, row[0])
+                return row[0]
+
+        self.misses += 1
+        return None
+
+    def put(self, key, action_id):
+        self._remember(key, action_id)
+        if self._db is not None:
+            self._db.execute("INSERT OR REPLACE INTO decisions (key, action_id) VALUES (?, ?)", (key, action_id))
+
+    def _remember(self, key, action_id):
+        self._entries[key] = action_id
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,106 @@
+import numpy as np
+
+from .config_tables import get_config_tables
+
+"""
+LLM 前面的规则层: 不需要推理的状态直接按规则出动作, 只有真正要做选择的状态才去问 LLM。
+
+规则 (都由编译好的 config 推出来, 和 RpgEnv 的规则一致):
+    battle_attack   战斗中: 攻击 (闲置什么都不会发生)
+    final_boss      已经有满级武器: 去打 final_boss
+    upgrade         正在用的武器 (第一把等级 > 0 的, 只有它造成伤害) 材料够了: 升级它
+    first_weapon    还没有武器, 而且只有一把武器造得起: 造它
+其它状态 (去打哪个 Boss 刷材料, 有好几条武器线可以选) 返回 None, 交给 LLM。
+
+    router = RuleRouter()
+    agent = LLMAgent(router=router)        # 决策顺序: 规则 -> 决策缓存 -> LLM -> fallback
+    print(summarize_routes([agent.routes]))
+"""
+
+# LLMAgent 的决策层级 (LLMAgent.routes 的 key)
+ROUTE_TIERS = ("rule", "cache", "llm", "fallback")
+RULES = ("battle_attack", "final_boss", "upgrade", "first_weapon")
+
+
+class RuleRouter:
+    """确定性的快速路径; route() 能直接决定就返回动作ID, 需要推理就返回 None"""
+
+    def __init__(self, tables=None):
+        self.tables = tables if tables is not None else get_config_tables()
+        tables = self.tables
+        self.stone_names = tables.stone_names
+        self.weapon_names = tables.weapon_names
+        self.n_bosses = len(tables.boss_names)
+        self.max_level = tables.max_weapon_level
+        self.final_boss_action = 1 + tables.final_boss
+        # recipes[武器][当前等级] -> 升一级的成本 ((材料下标, 数量), ...); 满级为 None
+        self._recipes = [
+            [tuple((tables.stone_index[stone], amount) for stone, amount in recipes[level + 1])
+             for level in range(tables.max_weapon_level)] + [None]
+            for recipes in tables.recipes
+        ]
+        # 每条规则命中的次数
+        self.counts = dict.fromkeys(RULES, 0)
+
+    def _parse(self, obs):
+        if isinstance(obs, np.ndarray):
+            # obs_format="array" (布局见 rpg_env.OBS_INDEX)
+            from .rpg_env import OBS_STATE, OBS_INVENTORY, OBS_WEAPONS
+            return obs[OBS_STATE] == 1, obs[OBS_INVENTORY].tolist(), obs[OBS_WEAPONS].tolist()
+        inventory = obs["my_inventory"]
+        weapons = obs["my_weapons"]
+        return (obs["my_state"] == 1, [inventory[stone] for stone in self.stone_names],
+                [weapons[weapon] for weapon in self.weapon_names])
+
+    def _can_afford(self, weapon_idx, level, inventory):
+        recipe = self._recipes[weapon_idx][level]
+        if recipe is None:
+            return False
+        for stone, amount in recipe:
+            if inventory[stone] < amount:
+                return False
+        return True
+
+    def _hit(self, rule, action_id, action_mask):
+        if action_mask is not None and not action_mask[action_id]:
+            return None # 规则和 env 给的掩码对不上 (例如 config 不一致): 交给 LLM
+        self.counts[rule] += 1
+        return action_id
+
+    def route(self, obs, action_mask=None):
+        """obs: "dict" 或 "array" 格式的观察; action_mask: env 给的合法动作掩码 (可选)"""
+        in_battle, inventory, weapons = self._parse(obs)
+        if in_battle:
+            # 任何非 0 动作都是攻击; 有掩码时用掩码里的那一个 (这场战斗的 Boss)
+            attack = 1 if action_mask is None else max(i for i, valid in enumerate(action_mask) if valid)
+            return self._hit("battle_attack", attack, action_mask)
+
+        if self.max_level in weapons:
+            return self._hit("final_boss", self.final_boss_action, action_mask)
+
+        upgrade_base = 1 + self.n_bosses
+        for weapon_idx, level in enumerate(weapons):
+            if level > 0:
+                # 只有第一把等级 > 0 的武器造成伤害: 它能升级就升级, 否则要不要换武器线交给 LLM
+                if self._can_afford(weapon_idx, level, inventory):
+                    return self._hit("upgrade", upgrade_base + weapon_idx, action_mask)
+                return None
+
+        affordable = [weapon_idx for weapon_idx in range(len(weapons)) if self._can_afford(weapon_idx, 0, inventory)]
+        if len(affordable) == 1:
+            return self._hit("first_weapon", upgrade_base + affordable[0], action_mask)
+        return None
+
+
+def summarize_routes(routes):
+    """把若干个 LLMAgent.routes 汇总成 {层级: 次数} 和各层级占的比例"""
+    totals = dict.fromkeys(ROUTE_TIERS, 0)
+    for route in routes:
+        for tier, count in route.items():
+            totals[tier] += count
+    decisions = sum(totals.values())
+    return {
+        "decisions": decisions,
+        **totals,
+        "fractions": {tier: count / decisions if decisions else 0.0 for tier, count in totals.items()},
+    }
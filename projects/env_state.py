@@ -0,0 +1,85 @@
+import numpy as np
+
+from .rng import RNG_STATE_WORDS
+
+"""
+env 状态快照的二进制格式 (RpgEnv / VecRpgEnv 的 get_state / set_state 共用)。
+
+整个世界 (血量, 背包, 武器等级, 战斗副本, 步数, 随机数流) 放在一块固定大小的 uint8 缓冲区里,
+每个字段是其中一段连续内存 (按 env, agent 排列), 开头是描述形状的头部:
+    header            [版本, n_envs, n_agents, 材料数, 武器数, 随机数块大小]
+    current_step      (n_envs,)
+    agent_steps       (n_envs, n_agents)          每个 agent 的步数时钟 (RpgEnv fast_forward 模式)
+    active            (n_envs, n_agents)          还没有结束的 agent
+    agent_healths     (n_envs, n_agents)
+    agent_states      (n_envs, n_agents)          0 = WORLD, 1 = BATTLE
+    battle_boss       (n_envs, n_agents)          -1 = 没有副本
+    battle_health     (n_envs, n_agents)
+    agent_inventories (n_envs, n_agents, 材料数)
+    agent_weapons     (n_envs, n_agents, 武器数)
+    rng_block         (n_envs, 块大小)            还没用掉的均匀数在 rng_block[pos:]
+    rng_pos           (n_envs,)
+    rng_words         (n_envs, RNG_STATE_WORDS)   生成器状态 (见 rng.pack_generator_state)
+
+同一个缓冲区也就是 checkpoint 的文件格式 (buffer.tofile / np.fromfile 即可)。
+RpgEnv 的快照和 n_envs=1 的 VecRpgEnv 快照格式相同, 可以互相加载。
+"""
+
+STATE_VERSION = 2
+_ALIGN = 8
+
+
+class StateLayout:
+    def __init__(self, n_envs, n_agents, n_stones, n_weapons, block_size):
+        self.header = np.array([STATE_VERSION, n_envs, n_agents, n_stones, n_weapons, block_size], dtype=np.int64)
+        agents = (n_envs, n_agents)
+        fields = [
+            ("header", np.int64, self.header.shape),
+            ("current_step", np.int64, (n_envs,)),
+            ("agent_steps", np.int64, agents),
+            ("active", np.bool_, agents),
+            ("agent_healths", np.int32, agents),
+            ("agent_states", np.int8, agents),
+            ("battle_boss", np.int8, agents),
+            ("battle_health", np.float64, agents),
+            ("agent_inventories", np.int32, agents + (n_stones,)),
+            ("agent_weapons", np.int32, agents + (n_weapons,)),
+            ("rng_block", np.float64, (n_envs, block_size)),
+            ("rng_pos", np.int64, (n_envs,)),
+            ("rng_words", np.uint64, (n_envs, RNG_STATE_WORDS)),
+        ]
+        self.fields = []
+        offset = 0
+        for name, dtype, shape in fields:
+            dtype = np.dtype(dtype)
+            self.fields.append((name, dtype, shape, offset))
+            offset += dtype.itemsize * int(np.prod(shape))
+            offset = -(-offset // _ALIGN) * _ALIGN
+        self.nbytes = offset
+
+    def allocate(self):
+        """新的全 0 缓冲区 (已写好头部)"""
+        buffer = np.zeros(self.nbytes, dtype=np.uint8)
+        self.views(buffer)["header"][:] = self.header
+        return buffer
+
+    def views(self, buffer):
+        """缓冲区里每个字段的视图 (零拷贝): {字段名: ndarray}"""
+        return {
+            name: np.ndarray(shape, dtype=dtype, buffer=buffer, offset=offset)
+            for name, dtype, shape, offset in self.fields
+        }
+
+    def check(self, state):
+        """把 state (ndarray 或 bytes) 转成 uint8 数组, 并检查它和这个布局匹配"""
+        if isinstance(state, (bytes, bytearray, memoryview)):
+            state = np.frombuffer(state, dtype=np.uint8)
+        if not isinstance(state, np.ndarray) or state.dtype != np.uint8 or state.ndim != 1:
+            raise ValueError("state 必须是 get_state() 返回的一维 uint8 数组 (或它的 bytes)")
+        if state.size != self.nbytes:
+            raise ValueError(f"state 大小为 {state.size} 字节, 这个 env 需要 {self.nbytes} 字节")
+        header = state[:self.header.nbytes].tobytes()
+        if header != self.header.tobytes():
+            header = np.frombuffer(header, dtype=np.int64).tolist()
+            raise ValueError(f"state 的头部 {header} 和这个 env 的 {self.header.tolist()} 不匹配")
+        return state
@@ -0,0 +1,61 @@
+from collections import deque, namedtuple
+
+"""
+RpgEnv 的事件日志。
+
+RpgEnv 的 verbosity 有三档:
+    "silent" - 什么都不记录, 也不做任何字符串格式化
+    "events" - 把结构化事件 Event(step, kind, data) 写进 EventLog (环形缓冲区 和/或 回调)
+    "human"  - 和以前一样, 把事件翻译成中文文本 print 出来
+"""
+
+VERBOSITY_LEVELS = ("silent", "events", "human")
+
+# 事件类型 -> 人类可读的文本模板 (只有 "human" 模式才会用到)
+EVENT_TEMPLATES = {
+    "idle": "  > {agent} [World] 闲置...",
+    "battle_start": "  > {agent} 开始挑战 {boss}!",
+    "battle_idle": "  > {agent} [Battle] 闲置...",
+    "attack": "  > {agent} [Battle] 攻击 {boss}, 造成 {damage:.0f} 伤害. 剩余 HP: {boss_health:.0f}",
+    "retaliation": "  > {boss} 反击 {agent}, 造成 {damage} 伤害.",
+    "death": "--- {agent} 死亡! 满血复活. ---",
+    "boss_defeated": "*** {boss} 被 {agent} 击败! ***",
+    "loot": "  > Boss {boss} 掉落了: {loot}",
+    "final_victory": "*** {agent} 击败了最终Boss! ***",
+    "upgrade": "  > {agent} 成功将 {weapon} 升级到 Lv.{level}!",
+    "upgrade_failed": "  > {agent} 尝试升级 {weapon}, 但材料不足.",
+    "truncated": "--- 达到最大步数 {max_steps}, 游戏超时 ---",
+}
+
+Event = namedtuple("Event", ["step", "kind", "data"])
+
+
+def format_event(event):
+    """把一个 Event 翻译成 "human" 模式下的文本"""
+    return EVENT_TEMPLATES[event.kind].format(**event.data)
+
+
+class EventLog:
+    """
+    结构化事件的接收端。
+    capacity: 环形缓冲区大小 (只保留最近的 capacity 条, None = 不限)
+    callback: 每条事件都会调用 callback(event) (可选)
+    """
+
+    def __init__(self, capacity=10000, callback=None):
+        self.records = deque(maxlen=capacity)
+        self.callback = callback
+
+    def append(self, event):
+        self.records.append(event)
+        if self.callback is not None:
+            self.callback(event)
+
+    def clear(self):
+        self.records.clear()
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
@@ -0,0 +1,125 @@
+import json
+import random
+import re
+import time
+
+from .llm_agent import estimate_tokens
+
+"""
+本地的假 LLM 后端, 接口和 google.generativeai.GenerativeModel 一样
+(generate_content / generate_content_async, 返回带 .text 的对象)。
+不需要网络和 API Key, 用来测试 LLMAgent 和各种 runner。
+也可以注入故障 (随机 429, 一段时间的 503, 延迟抖动), 测试 llm_client 的重试/熔断/回退。
+"""
+
+
+def _listed_actions(text):
+    """LLMAgent 的 user prompt 里列出的可选动作 (compact: "act=0,1,7"; verbose: 每行 "<ID>: <名字>")"""
+    match = re.search(r"act=([\d,]+)", text)
+    if match:
+        return [int(action_id) for action_id in match.group(1).split(",")]
+    return [int(action_id) for action_id in re.findall(r"^\s*(\d+): ", text, flags=re.MULTILINE)]
+
+
+class FakeAPIError(Exception):
+    """和 google.api_core 的异常一样带 HTTP 状态码 .code (429 时可能带 retry_after 秒数)"""
+
+    def __init__(self, code, message, retry_after=None):
+        super().__init__(f"{code} {message}")
+        self.code = code
+        self.retry_after = retry_after
+
+
+class FakeUsageMetadata:
+    def __init__(self, prompt_token_count, candidates_token_count):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+
+
+class FakeResponse:
+    def __init__(self, text, usage_metadata=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class FakeGenerativeModel:
+    """
+    latency: 每次调用的模拟延迟 (秒)
+    policy:  policy(prompt) -> action_id, 不传则随机选一个动作
+             (Prompt 里列出了当前可选的动作时, 只在这些动作里随机选)
+    error_rate:     每次调用以这个概率返回 429 (配额用完)
+    outage:         (start_s, stop_s): 创建之后第 start_s 到 stop_s 秒之间的调用全部返回 503, 模拟后端宕机一段时间
+    latency_jitter: 每次调用额外的随机延迟, 在 [0, latency_jitter] 秒里均匀分布
+    """
+
+    def __init__(self, latency=0.1, policy=None, num_actions=12, seed=0, error_rate=0.0, outage=None,
+                 latency_jitter=0.0, retry_after=None):
+        self.latency = latency
+        self.policy = policy
+        self.num_actions = num_actions
+        self._rng = random.Random(seed)
+        # 故障注入用单独的随机数流, 不影响选动作的序列
+        self._fault_rng = random.Random(seed + 1)
+        self.error_rate = error_rate
+        self.outage = outage
+        self.latency_jitter = latency_jitter
+        self.retry_after = retry_after
+        self.calls = 0
+        self.errors = 0
+        self._created = time.monotonic()
+
+    def _choose(self, prompt, state_text):
+        if self.policy is not None:
+            return self.policy(prompt)
+        valid = _listed_actions(state_text)
+        if valid:
+            return self._rng.choice(valid)
+        return self._rng.randrange(self.num_actions)
+
+    def _respond(self, prompt):
+        self.calls += 1
+        reply = {}
+        # 和真模型一样: 只有 system prompt 要求写 "thought" 时才写
+        if '"thought"' in prompt[0]:
+            reply["thought"] = "(fake) 我的背包是空的, 我需要 common_stone, 我应该去打 fire_boss。"
+        # 联合模式 (JointLLMController): 每行一个 "玩家ID: 状态"
+        if '"actions"' in prompt[0]:
+            lines = re.findall(r"^(\S+):(.*)$", prompt[1], flags=re.MULTILINE)
+            reply["actions"] = {agent_id: self._choose(prompt, state_text) for agent_id, state_text in lines}
+        else:
+            reply["action_id"] = self._choose(prompt, prompt[1])
+        text = json.dumps(reply, ensure_ascii=False)
+        usage = FakeUsageMetadata(sum(estimate_tokens(part) for part in prompt), estimate_tokens(text))
+        return FakeResponse(text, usage)
+
+    def _delay(self):
+        if self.latency_jitter:
+            return self.latency + self._fault_rng.uniform(0, self.latency_jitter)
+        return self.latency
+
+    def _fault(self):
+        """这次调用要注入的错误 (没有就是 None); 失败的调用也算一次 call"""
+        if self.outage is not None and self.outage[0] <= time.monotonic() - self._created < self.outage[1]:
+            error = FakeAPIError(503, "Service Unavailable")
+        elif self.error_rate and self._fault_rng.random() < self.error_rate:
+            error = FakeAPIError(429, "Resource has been exhausted (e.g. check quota).", self.retry_after)
+        else:
+            return None
+        self.calls += 1
+        self.errors += 1
+        return error
+
+    def generate_content(self, prompt):
+        time.sleep(self._delay())
+        error = self._fault()
+        if error is not None:
+            raise error
+        return self._respond(prompt)
+
+    async def generate_content_async(self, prompt):
+        import asyncio
+        await asyncio.sleep(self._delay())
+        error = self._fault()
+        if error is not None:
+            raise error
+        return self._respond(prompt)
@@ -0,0 +1,195 @@
+import json
+import time
+
+from config.config_globals import *
+
+from .llm_agent import LLMAgent
+
+"""
+联合决策模式: 一次 LLM 请求同时为所有存活的 agent 选动作。
+
+和每个 agent 一个 LLMAgent 相比, 每一步只发 1 个请求 (而不是 5 个),
+而且 system prompt 只发一次、被所有 agent 共享。
+LLM 回复一个 JSON: {"actions": {"player_0": 1, "player_1": 7, ...}}
+每个动作都会用 env.action_spaces (和 env 给的合法动作掩码) 检查, 缺失或者非法的 agent 单独回退到 fallback 策略。
+传了 router 时, 规则能直接决定的 agent 不放进请求; 所有 agent 都被规则决定时这一步不发请求。
+"""
+
+
+class JointLLMController(LLMAgent):
+    PROFILED_PHASES = {
+        "choose_actions": "llm.choose_action",
+        "_build_joint_prompt": "llm.prompt_build",
+        "_generate": "llm.network_wait",
+        "_generate_async": "llm.network_wait",
+        "_parse_joint_response": "llm.json_parse",
+    }
+
+    def __init__(self, action_spaces, model=None, prompt_profile="verbose", include_thought=True, fallback=None,
+                 profiler=None, client=None, router=None):
+        """
+        action_spaces: env.action_spaces, 用来检查 LLM 给出的每个动作
+        fallback: fallback(obs, current_step, action_mask) -> action_id (和 LLMAgent 一样),
+                  某个 agent 的动作缺失/非法 (或者 API 调用失败) 时使用; 不传则闲置 (动作 0)
+        client: llm_client.LLMClient (可选), 请求经过它的限流/重试/熔断
+        router: decision_router.RuleRouter (可选), 简单状态的 agent 直接按规则决策
+        """
+        self.action_spaces = action_spaces
+        super().__init__(model=model, prompt_profile=prompt_profile, include_thought=include_thought,
+                         fallback=fallback, profiler=profiler, client=client, router=router)
+        self.prompt_version = "joint-" + self.prompt_version
+
+    def _build_system_prompt(self):
+        """联合模式的角色设定: 规则和动作列表同单 agent 模式, 输出格式换成 {agent_id: action_id}"""
+        if self.prompt_profile == "compact":
+            rules = self._build_compact_system_prompt().rsplit("\n", 1)[0]
+        else:
+            rules = f"""你是一个 RPG 游戏的指挥官, 同时控制多个玩家。每个玩家的最终目标都是击败 'final_boss'。
+为了击败 'final_boss'，玩家必须先制作一把 {MAX_WEAPON_LEVEL} 级武器。
+
+[规则]
+1. 玩家通过攻击其他 Boss 来收集材料。
+2. 玩家会因为 Boss 反击而受伤，但死亡会自动满血复活。
+3. 每个玩家有自己独立的背包和武器。
+4. “制作/升级”动作会自动使用该玩家背包里的材料来提升武器等级。
+
+[玩家状态编码]
+s=步数 hp=血量 st=W(世界)|B<Boss剩余HP>(战斗) inv=材料:数量 wep=武器:等级
+
+[动作列表 (每个玩家必须选择其中之一)]
+{self.action_list_text}"""
+
+        if self.include_thought:
+            output = '[输出格式] 只回复 JSON: {"thought": "<一句话>", "actions": {"<玩家ID>": <动作>, ...}}, 每个玩家都要有动作。'
+        else:
+            output = '[输出格式] 只回复 JSON: {"actions": {"<玩家ID>": <动作>, ...}}, 每个玩家都要有动作。'
+        return rules + "\n" + output
+
+    def _build_joint_prompt(self, observations, agent_ids, current_step, valid_actions=None):
+        """每个存活的 agent 一行状态 (有合法动作掩码时行末是 act=<可选的动作>)"""
+        valid_actions = valid_actions or {}
+        lines = [f"{agent_id}: " + self._build_compact_user_prompt(
+                     dict(observations[agent_id], current_step=current_step, valid_actions=valid_actions.get(agent_id)))
+                 for agent_id in agent_ids]
+        return [self.system_prompt, "\n".join(lines)]
+
+    def _parse_joint_response(self, response_text, observations, agent_ids, current_step, action_masks=None,
+                              valid_actions=None):
+        """解析 {agent_id: action_id}, 逐个 agent 检查并回退"""
+        try:
+            data = json.loads(response_text)
+            chosen = data.get("actions", data) if isinstance(data, dict) else {}
+        except json.JSONDecodeError:
+            print(f"  > [LLM 错误]: LLM 返回了无效的 JSON。所有玩家回退。")
+            chosen = {}
+        if not isinstance(chosen, dict):
+            chosen = {}
+
+        valid_actions = valid_actions or {}
+        actions = {}
+        for agent_id in agent_ids:
+            action_id = chosen.get(agent_id)
+            try:
+                action_id = int(action_id)
+            except (TypeError, ValueError):
+                action_id = None
+            valid = valid_actions.get(agent_id)
+            if (action_id is None or not self.action_spaces[agent_id].contains(action_id)
+                    or (valid is not None and action_id not in valid)):
+                print(f"  > [LLM 错误]: {agent_id} 的动作 {chosen.get(agent_id)!r} 无效, 使用回退策略。")
+                self.fallbacks += 1
+                self._count("llm.fallback")
+                self._served("fallback")
+                action_id = self._fallback_action(agent_id, observations, current_step, action_masks)
+            else:
+                self._served("llm")
+            actions[agent_id] = action_id
+        return actions
+
+    def _fallback_action(self, agent_id, observations, current_step, action_masks):
+        if self.fallback_policy is None:
+            return 0
+        mask = action_masks.get(agent_id) if action_masks is not None else None
+        return self.fallback_policy(observations[agent_id], current_step, mask)
+
+    def _fallback_all(self, observations, agent_ids, current_step, action_masks):
+        self.fallbacks += len(agent_ids)
+        if self.profiler is not None:
+            self.profiler.count("llm.fallback", len(agent_ids))
+        self._served("fallback", len(agent_ids))
+        return {agent_id: self._fallback_action(agent_id, observations, current_step, action_masks)
+                for agent_id in agent_ids}
+
+    def _route_all(self, observations, agent_ids, action_masks):
+        """规则层: 返回 ({agent_id: 规则给出的动作}, 还需要问 LLM 的 agent_ids)"""
+        if self.router is None:
+            return {}, agent_ids
+        routed = {}
+        remaining = []
+        for agent_id in agent_ids:
+            mask = action_masks.get(agent_id) if action_masks is not None else None
+            action_id = self._route(observations[agent_id], mask)
+            if action_id is None:
+                remaining.append(agent_id)
+            else:
+                routed[agent_id] = action_id
+        return routed, remaining
+
+    def _valid_actions(self, action_masks, agent_ids):
+        if action_masks is None:
+            return None
+        return {agent_id: self.valid_actions(action_masks.get(agent_id)) for agent_id in agent_ids}
+
+    def choose_actions(self, observations, agent_ids, current_step, action_masks=None):
+        """
+        一次请求为 agent_ids 里的所有 agent 选动作, 返回 {agent_id: action_id}
+        action_masks: {agent_id: 合法动作掩码} (可选, 例如 {agent: infos[agent]["action_mask"]})
+        """
+        actions, agent_ids = self._route_all(observations, agent_ids, action_masks)
+        if not agent_ids:
+            return actions
+        valid_actions = self._valid_actions(action_masks, agent_ids)
+        full_prompt = self._build_joint_prompt(observations, agent_ids, current_step, valid_actions)
+
+        print(f"  > [Gemini]: Gemini 正在为 {len(agent_ids)} 个玩家思考...")
+
+        try:
+            start = time.perf_counter()
+            response = self._generate(full_prompt)
+            self._record_usage(full_prompt, response, time.perf_counter() - start)
+            actions.update(self._parse_joint_response(response.text, observations, agent_ids, current_step,
+                                                      action_masks, valid_actions))
+            return actions
+
+        except Exception as e:
+            print(f"  > [Gemini API 错误]: {e}. 所有玩家回退。")
+            actions.update(self._fallback_all(observations, agent_ids, current_step, action_masks))
+            return actions
+
+    async def choose_actions_async(self, observations, agent_ids, current_step, timeout=None, action_masks=None):
+        """choose_actions 的异步版本"""
+        actions, agent_ids = self._route_all(observations, agent_ids, action_masks)
+        if not agent_ids:
+            return actions
+        valid_actions = self._valid_actions(action_masks, agent_ids)
+        full_prompt = self._build_joint_prompt(observations, agent_ids, current_step, valid_actions)
+
+        print(f"  > [Gemini]: Gemini 正在为 {len(agent_ids)} 个玩家思考...")
+
+        import asyncio
+        try:
+            start = time.perf_counter()
+            response = await asyncio.wait_for(self._generate_async(full_prompt), timeout)
+            self._record_usage(full_prompt, response, time.perf_counter() - start)
+            actions.update(self._parse_joint_response(response.text, observations, agent_ids, current_step,
+                                                      action_masks, valid_actions))
+            return actions
+
+        except asyncio.TimeoutError:
+            print(f"  > [Gemini API 超时]: 超过 {timeout} 秒. 所有玩家回退。")
+            actions.update(self._fallback_all(observations, agent_ids, current_step, action_masks))
+            return actions
+        except Exception as e:
+            print(f"  > [Gemini API 错误]: {e}. 所有玩家回退。")
+            actions.update(self._fallback_all(observations, agent_ids, current_step, action_masks))
+            return actions
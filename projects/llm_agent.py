@@ -1,6 +1,6 @@
 import os
 import json
-import google.generativeai as genai # (新) 导入 Google 库
+import time
 
 # (旧) 我们不再需要 OpenAI 库了
 # from openai import OpenAI 
@@ -10,8 +10,96 @@ from config.config_globals import *
 from config.config_bosses import *
 from config.config_weapons import *
 
+# Prompt 的版本号: 修改 Prompt 模板时要改这里, 旧的决策缓存就会自动失效
+PROMPT_VERSION = "v2"
+
+# "verbose": 原来的中文长 Prompt; "compact": 精简的状态编码, 省 token
+PROMPT_PROFILES = ("verbose", "compact")
+
+def estimate_tokens(text):
+    """粗略估算 token 数 (API 没有返回用量时使用): 非 ASCII 字符各算 1 个, ASCII 每 4 个字符算 1 个"""
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return non_ascii + (len(text) - non_ascii + 3) // 4
+
+def summarize_usage(records):
+    """把若干条调用记录 (LLMAgent.usage) 汇总成总量和平均值"""
+    calls = len(records)
+    prompt_tokens = sum(r["prompt_tokens"] for r in records)
+    response_tokens = sum(r["response_tokens"] for r in records)
+    latency = sum(r["latency_s"] for r in records)
+    return {
+        "calls": calls,
+        "prompt_tokens": prompt_tokens,
+        "response_tokens": response_tokens,
+        "mean_prompt_tokens": prompt_tokens / calls if calls else 0.0,
+        "mean_response_tokens": response_tokens / calls if calls else 0.0,
+        "mean_latency_s": latency / calls if calls else 0.0,
+    }
+
 class LLMAgent:
-    def __init__(self):
+    # profiler 打开时被计时的方法 -> 阶段名 (见 profiler.py)
+    PROFILED_PHASES = {
+        "choose_action": "llm.choose_action",
+        "_build_prompt": "llm.prompt_build",
+        "_generate": "llm.network_wait",
+        "_generate_async": "llm.network_wait",
+        "_parse_llm_response": "llm.json_parse",
+    }
+
+    def __init__(self, model=None, cache=None, prompt_profile="verbose", include_thought=True, profiler=None,
+                 client=None, fallback=None, router=None):
+        """
+        model: 任何实现了 generate_content(prompt) (以及可选的 generate_content_async) 的对象。
+               不传则创建 Gemini 模型 (传了 client 时用 client.model); 测试时可以传入 fake_llm.FakeGenerativeModel。
+        client: llm_client.LLMClient (可选), 请求经过它的限流/重试/熔断
+        fallback: fallback(obs, current_step, action_mask) -> action_id, API 调用失败时使用
+                  (例如 planner.PlannerAgent().choose_action); 不传则闲置 (动作 0)
+        router: decision_router.RuleRouter (可选), 简单的状态直接按规则决策, 不调用 API
+        cache: 可选的 DecisionCache (可以在多个 agent 之间共享)
+        prompt_profile: "verbose" 或 "compact"
+        include_thought: 是否要求 LLM 在回复里写 "thought" (关掉可以省掉大部分回复 token)
+        profiler: Profiler (可选), 分阶段计时和回退计数 (见 profiler.py); 不传没有任何开销
+        """
+        if prompt_profile not in PROMPT_PROFILES:
+            raise ValueError(f"未知的 prompt_profile: {prompt_profile} (可选: {PROMPT_PROFILES})")
+        if model is None and client is not None:
+            model = client.model
+        self.model = model if model is not None else self._create_gemini_model()
+        self.client = client
+        self.fallback_policy = fallback
+        # API 调用失败、改用 fallback 的次数
+        self.fallbacks = 0
+        self.router = router
+        # 每个决策层级 (规则 / 决策缓存 / LLM / fallback) 做出的决策数, 见 decision_router.summarize_routes
+        self.routes = {"rule": 0, "cache": 0, "llm": 0, "fallback": 0}
+        self.model_name = getattr(self.model, "model_name", type(self.model).__name__)
+        self.cache = cache
+        self.prompt_profile = prompt_profile
+        self.include_thought = include_thought
+        self.prompt_version = f"{PROMPT_VERSION}-{prompt_profile}" + ("" if include_thought else "-nothought")
+
+        # 3. (不变) 构建动作列表
+        self.action_list_text = self._build_action_list()
+        self.num_actions = len(self.action_list_text.split('\n'))
+        # (新) 每个动作的短名字, 用来在 Prompt 里列出当前可选的动作
+        self.action_labels = self._build_action_labels()
+
+        # 4. (新) 编译 Prompt: system prompt 只依赖 config, 在这里渲染一次。
+        #    它永远是请求的第一段而且逐字不变, 后端可以对这段前缀做缓存。
+        self.system_prompt = self._build_system_prompt()
+
+        # (新) 每次 API 调用的用量记录: {"prompt_tokens", "response_tokens", "latency_s", "estimated"}
+        self.usage = []
+
+        self.profiler = profiler
+        if profiler is not None:
+            profiler.instrument(self, self.PROFILED_PHASES)
+
+    @staticmethod
+    def _create_gemini_model():
+        # (新) 只有真正要调用 Gemini 时才导入 Google 库
+        import google.generativeai as genai
+
         # --- (新!) 1. 配置 Google 客户端 ---
         api_key = os.environ.get("GOOGLE_API_KEY")
         if not api_key:
@@ -28,14 +116,11 @@ class LLMAgent:
             response_mime_type="application/json" 
         )
         
-        self.model = genai.GenerativeModel(
+        return genai.GenerativeModel(
             model_name="gemini-2.5-flash",
             generation_config=generation_config
         )
 
-        # 3. (不变) 构建动作列表
-        self.action_list_text = self._build_action_list()
-
     # --- (不变) 你的所有“翻译官”函数都不需要修改 ---
     
     def _build_action_list(self):
@@ -55,8 +140,32 @@ class LLMAgent:
             
         return "\n".join(action_list)
 
+    def _build_action_labels(self):
+        """动作ID -> 短名字 (顺序同 _build_action_list)"""
+        labels = ["闲置"]
+        labels += [f"打 {boss_name}" for boss_name in BOSS_DATA]
+        labels += [f"升级 {weapon_name}" for weapon_name in WEAPON_DATA]
+        return labels
+
+    @staticmethod
+    def valid_actions(action_mask):
+        """env 给的合法动作掩码 (infos[agent]["action_mask"]) -> 可选的动作ID 列表; 没有掩码时为 None"""
+        if action_mask is None:
+            return None
+        return [action_id for action_id, valid in enumerate(action_mask) if valid]
+
     def _build_system_prompt(self):
-        """(不变) - LLM 的“角色设定”"""
+        """LLM 的“角色设定” (只依赖 config 和 prompt_profile, 由 __init__ 编译一次)"""
+        if self.prompt_profile == "compact":
+            return self._build_compact_system_prompt()
+        if self.include_thought:
+            output_format = """包含你的“思考”和你选择的“动作ID”。
+        例如:
+        {"thought": "我的背包是空的, 我需要 common_stone, 我应该去打 fire_boss。", "action_id": 1}"""
+        else:
+            output_format = """只包含你选择的“动作ID”。
+        例如:
+        {"action_id": 1}"""
         return f"""
         你是一个 RPG 游戏的高玩。你的最终目标是击败 'final_boss'。
         为了击败 'final_boss'，你必须先制作一把 5 级武器 (MAX_WEAPON_LEVEL=5)。
@@ -71,13 +180,44 @@ class LLMAgent:
         {self.action_list_text}
         
         [输出格式]
-        你必须严格按照 JSON 格式回复，包含你的“思考”和你选择的“动作ID”。
-        例如:
-        {{"thought": "我的背包是空的, 我需要 common_stone, 我应该去打 fire_boss。", "action_id": 1}}
+        你必须严格按照 JSON 格式回复，{output_format}
         """
 
+    def _build_compact_system_prompt(self):
+        """(新) 精简版的角色设定: 去掉缩进和重复说明, 状态用短编码"""
+        lines = [
+            f"RPG。目标: 击败 final_boss (需要一把 Lv.{MAX_WEAPON_LEVEL} 武器, 否则 0 伤害)。",
+            "打 Boss 掉材料; 死亡满血复活; 制作/升级自动扣材料。",
+            "状态编码: s=步数 hp=血量 st=W(世界)|B<Boss剩余HP>(战斗) inv=材料:数量 wep=武器:等级",
+            "动作:",
+        ]
+        for i, boss_name in enumerate(BOSS_DATA.keys()):
+            loot = ",".join(item[0] for item in LOOT_TABLES[boss_name])
+            lines.append(f"{i+1} 打 {boss_name} 掉 {loot}")
+        boss_count = len(BOSS_DATA)
+        for i, weapon_name in enumerate(WEAPON_DATA.keys()):
+            lines.append(f"{i+boss_count+1} 升级 {weapon_name}")
+        lines.append("0 闲置")
+        if self.include_thought:
+            lines.append('只回复 JSON: {"thought": "<一句话>", "action_id": <动作>}')
+        else:
+            lines.append('只回复 JSON: {"action_id": <动作>}')
+        return "\n".join(lines)
+
+    def _build_compact_user_prompt(self, obs):
+        """(新) 精简版的状态: 一行短编码"""
+        inventory_text = ",".join(f"{item}:{count}" for item, count in obs["my_inventory"].items() if count > 0)
+        weapon_text = ",".join(f"{wep}:{lvl}" for wep, lvl in obs["my_weapons"].items() if lvl > 0)
+        state_text = "W" if obs["my_state"] == 0 else f"B{obs['battle_boss_health']:.0f}"
+        text = f"s={obs['current_step']} hp={obs['my_health']} st={state_text} inv={inventory_text or '-'} wep={weapon_text or '-'}"
+        if obs.get("valid_actions") is not None:
+            text += " act=" + ",".join(map(str, obs["valid_actions"]))
+        return text
+
     def _build_user_prompt(self, obs):
         """(不变) - 将环境的“字典”观察“翻译”成 LLM 能看懂的文本"""
+        if self.prompt_profile == "compact":
+            return self._build_compact_user_prompt(obs)
         inventory_text = ", ".join(f"{item}: {count}" for item, count in obs["my_inventory"].items() if count > 0)
         if not inventory_text: inventory_text = "空的"
         
@@ -85,6 +225,12 @@ class LLMAgent:
         if not weapon_text: weapon_text = "无 (只有拳头, 1点伤害)"
         
         state_text = "在世界中 (可以自由行动)" if obs["my_state"] == 0 else f"战斗中 (vs Boss, 剩余 HP: {obs['battle_boss_health']})"
+
+        # (新) 有合法动作掩码时只列出当前有效果的动作
+        valid_text = ""
+        if obs.get("valid_actions") is not None:
+            valid_text = "\n        ".join(["[当前可选的动作 (只能从这里面选)]"] +
+                                             [f"{i}: {self.action_labels[i]}" for i in obs["valid_actions"]])
         
         return f"""
         [你当前的状态]
@@ -94,54 +240,210 @@ class LLMAgent:
         背包: {inventory_text}
         武器: {weapon_text}
         
+        {valid_text}
+        
         [你的决定]
         根据你的目标和当前状态，做出你的下一步决定。请使用 JSON 格式回复。
         """
 
-    def _parse_llm_response(self, response_text):
-        """(不变) - 将 LLM 的“文本”回复“翻译”回环境能懂的“数字”"""
+    def _parse_llm_response(self, response_text, valid_actions=None):
+        """
+        (不变) - 将 LLM 的“文本”回复“翻译”回环境能懂的“数字”
+        返回 (动作ID, 是否有效): 回复解析不了、越界或者当前不可用时动作被强制改为 0, 有效为 False (不能写进缓存)
+        """
         try:
             data = json.loads(response_text)
             action_id = int(data.get("action_id", 0))
-            max_action = len(self.action_list_text.split('\n')) - 1
-            if 0 <= action_id <= max_action:
-                return action_id
-            else:
-                print(f"  > [LLM 错误]: LLM 选择了无效的动作ID {action_id}。已强制改为 0。")
-                return 0
         except json.JSONDecodeError:
             print(f"  > [LLM 错误]: LLM 返回了无效的 JSON。已强制改为 0。")
-            return 0
+            self._count("llm.fallback_0")
+            return 0, False
+        except (AttributeError, TypeError, ValueError):
+            print(f"  > [LLM 错误]: LLM 的回复里没有有效的动作ID。已强制改为 0。")
+            self._count("llm.fallback_0")
+            return 0, False
+        max_action = self.num_actions - 1
+        if valid_actions is not None and action_id not in valid_actions:
+            print(f"  > [LLM 错误]: LLM 选择了当前不可用的动作ID {action_id}。已强制改为 0。")
+            self._count("llm.fallback_0")
+            return 0, False
+        if 0 <= action_id <= max_action:
+            return action_id, True
+        else:
+            print(f"  > [LLM 错误]: LLM 选择了无效的动作ID {action_id}。已强制改为 0。")
+            self._count("llm.fallback_0")
+            return 0, False
+
+    def _build_prompt(self, obs, current_step, valid_actions=None):
+        """[system, user] 两段 Prompt (Gemini 的 API 格式)"""
+        obs = dict(obs, current_step=current_step, valid_actions=valid_actions) # 不修改调用方的 obs
+        user_prompt = self._build_user_prompt(obs)
+        return [self.system_prompt, user_prompt]
+
+    def _handle_response(self, response, valid_actions=None):
+        """从回复里解析出 (动作ID, 是否有效), 见 _parse_llm_response"""
+        # 3. (新) 从 Gemini 获取回复文本
+        response_text = response.text
+        
+        # 4. (不变) 解析 JSON
+        action_id, valid = self._parse_llm_response(response_text, valid_actions)
+        
+        # (新) Gemini 强制 JSON; 解析失败的回复上面已经报过错了, 不再打印思考
+        if valid:
+            print(f"  > [Gemini 思考]: {json.loads(response_text).get('thought', '...')}")
+        
+        return action_id, valid
 
-    def choose_action(self, obs, current_step):
+    def choose_action(self, obs, current_step, action_mask=None):
         """
         (新!) 这是“大脑”的主函数 (Gemini 版本)
+        action_mask: env 给的合法动作掩码 (infos[agent]["action_mask"]); 传了的话 Prompt 里只列出可选的动作,
+                     LLM 选了不可用的动作按无效动作处理
         """
+        # 0. (新) 先走规则, 再查决策缓存
+        action_id = self._route(obs, action_mask)
+        if action_id is not None:
+            return action_id
+        valid_actions = self.valid_actions(action_mask)
+        cache_key = self._cache_key(obs, current_step)
+        action_id = self._cached_action(cache_key, valid_actions)
+        if action_id is not None:
+            return action_id
+
         # 1. (不变) 准备 Prompt
-        obs['current_step'] = current_step
-        user_prompt = self._build_user_prompt(obs)
-        system_prompt = self._build_system_prompt()
-        
-        # (新) Gemini 的 API 格式是 [system, user]
-        full_prompt = [system_prompt, user_prompt]
+        full_prompt = self._build_prompt(obs, current_step, valid_actions)
 
         print(f"  > [Gemini]: Geminig 正在思考...")
         
         try:
             # 2. (新) 调用 Google Gemini API
-            response = self.model.generate_content(full_prompt)
-            
-            # 3. (新) 从 Gemini 获取回复文本
-            response_text = response.text
-            
-            # 4. (不变) 解析 JSON
-            action_id = self._parse_llm_response(response_text)
-            
-            # (新) Gemini 强制 JSON，所以我们可以更安全地加载它
-            print(f"  > [Gemini 思考]: {json.loads(response_text).get('thought', '...')}")
-            
+            start = time.perf_counter()
+            response = self._generate(full_prompt)
+            self._record_usage(full_prompt, response, time.perf_counter() - start)
+            action_id, valid = self._handle_response(response, valid_actions)
+            self._served("llm")
+            # 强制改成 0 的动作不写进缓存, 否则一次坏回复会让这个观察一直闲置 (sqlite 缓存还会跨运行保留)
+            if valid and cache_key is not None:
+                self.cache.put(cache_key, action_id)
             return action_id
 
         except Exception as e:
-            print(f"  > [Gemini API 错误]: {e}. 已强制改为 0。")
-            return 0
\ No newline at end of file
+            print(f"  > [Gemini API 错误]: {e}.")
+            return self._fallback(obs, current_step, action_mask)
+
+    async def choose_action_async(self, obs, current_step, timeout=None, action_mask=None):
+        """
+        choose_action 的异步版本, 让多个 agent 的请求可以同时在路上。
+        timeout: 单个请求的超时 (秒), 超时按 API 错误处理 (动作 0)。
+        """
+        action_id = self._route(obs, action_mask)
+        if action_id is not None:
+            return action_id
+        valid_actions = self.valid_actions(action_mask)
+        cache_key = self._cache_key(obs, current_step)
+        action_id = self._cached_action(cache_key, valid_actions)
+        if action_id is not None:
+            return action_id
+
+        full_prompt = self._build_prompt(obs, current_step, valid_actions)
+
+        print(f"  > [Gemini]: Geminig 正在思考...")
+
+        # asyncio 很重, 只在真正走异步路径时才导入 (这时事件循环已经把它加载好了)
+        import asyncio
+        try:
+            start = time.perf_counter()
+            response = await asyncio.wait_for(self._generate_async(full_prompt), timeout)
+            self._record_usage(full_prompt, response, time.perf_counter() - start)
+            action_id, valid = self._handle_response(response, valid_actions)
+            self._served("llm")
+            # 强制改成 0 的动作不写进缓存, 否则一次坏回复会让这个观察一直闲置 (sqlite 缓存还会跨运行保留)
+            if valid and cache_key is not None:
+                self.cache.put(cache_key, action_id)
+            return action_id
+
+        except asyncio.TimeoutError:
+            print(f"  > [Gemini API 超时]: 超过 {timeout} 秒.")
+            return self._fallback(obs, current_step, action_mask)
+        except Exception as e:
+            print(f"  > [Gemini API 错误]: {e}.")
+            return self._fallback(obs, current_step, action_mask)
+
+    def _fallback(self, obs, current_step, action_mask):
+        """API 调用失败时的动作: fallback 策略, 没有的话闲置"""
+        self.fallbacks += 1
+        self._count("llm.fallback")
+        self._served("fallback")
+        if self.fallback_policy is None:
+            print(f"  > [回退]: 已强制改为 0。")
+            return 0
+        action_id = self.fallback_policy(obs, current_step, action_mask)
+        print(f"  > [回退]: 使用回退策略, 动作 {action_id}。")
+        return action_id
+
+    def _cache_key(self, obs, current_step):
+        """没有缓存时返回 None"""
+        if self.cache is None:
+            return None
+        return self.cache.make_key(obs, current_step, self.model_name, self.prompt_version)
+
+    def _cached_action(self, cache_key, valid_actions):
+        """缓存里的动作 (没有缓存/没命中/当前不可用时为 None)"""
+        if cache_key is None:
+            return None
+        action_id = self.cache.get(cache_key)
+        if action_id is None or (valid_actions is not None and action_id not in valid_actions):
+            return None
+        self._count("llm.cache_hit")
+        self._served("cache")
+        return action_id
+
+    def _route(self, obs, action_mask):
+        """规则层的动作 (没有 router 或者状态需要推理时为 None)"""
+        if self.router is None:
+            return None
+        action_id = self.router.route(obs, action_mask)
+        if action_id is not None:
+            self._served("rule")
+        return action_id
+
+    def _served(self, tier, n=1):
+        self.routes[tier] += n
+        if self.profiler is not None:
+            self.profiler.count(f"route.{tier}", n)
+
+    def _record_usage(self, prompt, response, latency):
+        """记录一次调用的 token 用量 (优先用 API 返回的 usage_metadata, 否则估算)"""
+        usage = getattr(response, "usage_metadata", None)
+        prompt_tokens = getattr(usage, "prompt_token_count", None)
+        response_tokens = getattr(usage, "candidates_token_count", None)
+        estimated = prompt_tokens is None or response_tokens is None
+        if prompt_tokens is None:
+            prompt_tokens = sum(estimate_tokens(part) for part in prompt)
+        if response_tokens is None:
+            response_tokens = estimate_tokens(response.text)
+        self.usage.append({
+            "prompt_tokens": prompt_tokens,
+            "response_tokens": response_tokens,
+            "latency_s": latency,
+            "estimated": estimated,
+        })
+
+    def _count(self, name):
+        if self.profiler is not None:
+            self.profiler.count(name)
+
+    def _generate(self, prompt):
+        if self.client is not None:
+            return self.client.generate(prompt)
+        return self.model.generate_content(prompt)
+
+    async def _generate_async(self, prompt):
+        """优先用模型自带的异步接口, 没有的话放到线程池里跑同步接口"""
+        if self.client is not None:
+            return await self.client.generate_async(prompt)
+        generate_async = getattr(self.model, "generate_content_async", None)
+        if generate_async is not None:
+            return await generate_async(prompt)
+        import asyncio
+        return await asyncio.to_thread(self.model.generate_content, prompt)
\ No newline at end of file
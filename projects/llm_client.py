@@ -0,0 +1,365 @@
+import time
+import random
+import threading
+
+from .llm_agent import estimate_tokens
+
+"""
+LLMAgent 下面的调用层: 限流, 重试, 超时和熔断。
+
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=100000)   # 所有 agent 共用
+    breaker = CircuitBreaker(failure_threshold=5, recovery_s=30)
+    client = LLMClient(model, limiter=limiter, breaker=breaker, max_retries=3, deadline_s=30)
+    agent = LLMAgent(client=client, fallback=PlannerAgent().choose_action)
+
+每个请求:
+    1. 熔断器打开时直接失败 (LLMUnavailableError), 不占配额也不等待
+    2. 从令牌桶里预订 1 个请求和 (估算的) prompt token, 不够就等
+    3. 调用模型; 可重试的错误 (429 / 5xx / 超时 / 连接错误) 按带抖动的指数退避重试
+    4. 整个过程 (排队 + 所有尝试 + 退避) 不超过 deadline_s, 来不及就放弃
+放弃的请求抛出 LLMUnavailableError, LLMAgent 会改用 fallback 策略, 而不是悄悄变成闲置。
+"""
+
+# 可以重试的 HTTP 状态码 (google.api_core 的异常带 .code)
+RETRYABLE_CODES = (408, 429, 500, 502, 503, 504)
+
+
+class LLMUnavailableError(RuntimeError):
+    """后端暂时不可用 (熔断打开 / 重试用完 / 超过 deadline), 调用方应该走回退策略"""
+
+
+def is_retryable(error):
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    return getattr(error, "code", None) in RETRYABLE_CODES
+
+
+class TokenBucket:
+    """
+    rate:     每秒补充的令牌数
+    capacity: 桶的容量 (允许的突发量, 默认 = rate, 即 1 秒的量)
+    令牌可以预支: reserve(n) 直接扣掉 n 个, 返回要等多久才轮得到 (欠着的部分按 rate 还)。
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic):
+        if rate <= 0:
+            raise ValueError(f"rate 必须 > 0, 实际为 {rate}")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, n=1):
+        """扣掉 n 个令牌, 返回需要等待的秒数"""
+        self._refill()
+        self.tokens -= n
+        return max(0.0, -self.tokens / self.rate)
+
+    def refund(self, n=1):
+        """还回 n 个令牌 (预订之后没有真正发出请求时)"""
+        self.tokens = min(self.capacity, self.tokens + n)
+
+
+class RateLimiter:
+    """
+    请求数和 token 数两个令牌桶 (不限的那一项传 None), 按分钟配额设置, 和 API 的 RPM/TPM 配额对应。
+    同一个 RateLimiter 可以被多个 LLMClient (多个 agent) 共用; 线程安全。
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, burst_s=1.0, clock=time.monotonic):
+        """burst_s: 桶里最多攒多少秒的配额 (允许的突发量)"""
+        self.requests = None
+        self.tokens = None
+        if requests_per_minute:
+            rate = requests_per_minute / 60
+            self.requests = TokenBucket(rate, max(1.0, rate * burst_s), clock)
+        if tokens_per_minute:
+            rate = tokens_per_minute / 60
+            self.tokens = TokenBucket(rate, rate * burst_s, clock)
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens):
+        """预订一个请求和 tokens 个 token, 返回需要等待的秒数"""
+        wait = 0.0
+        with self._lock:
+            if self.requests is not None:
+                wait = max(wait, self.requests.reserve(1))
+            if self.tokens is not None:
+                wait = max(wait, self.tokens.reserve(tokens))
+        return wait
+
+    def refund(self, tokens):
+        with self._lock:
+            if self.requests is not None:
+                self.requests.refund(1)
+            if self.tokens is not None:
+                self.tokens.refund(tokens)
+
+    def settle(self, extra_tokens):
+        """请求结束后按实际用量补扣 (实际 token 比预订的多时; 欠下的量由后面的请求等待)"""
+        if self.tokens is not None and extra_tokens > 0:
+            with self._lock:
+                self.tokens.reserve(extra_tokens)
+
+
+class CircuitBreaker:
+    """
+    连续 failure_threshold 次失败之后打开: recovery_s 秒内所有请求直接失败 (调用方走回退策略)。
+    之后进入半开状态, 只放一个探测请求过去: 成功就关闭, 失败就再打开 recovery_s 秒。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, recovery_s=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.recovery_s = recovery_s
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.opens = 0
+        # 半开时正在进行的探测请求的通行证 (没有就是 None)
+        self._probe = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        这个请求能不能发出去: 不能返回 None, 能返回一个通行证 (请求没有发出去时交给 cancel)。
+        半开时放行的探测请求拿到的是一个独有的通行证。
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if self.clock() - self.opened_at < self.recovery_s:
+                    return None
+                self.state = self.HALF_OPEN
+                self._probe = None
+            # 半开: 同一时间只有一个探测请求
+            if self._probe is not None:
+                return None
+            self._probe = object()
+            return self._probe
+
+    def cancel(self, ticket):
+        """allow() 放行了但请求最终没有发出去: 如果它是半开时的探测请求, 把探测名额还回去"""
+        with self._lock:
+            if ticket is not None and ticket is self._probe:
+                self._probe = None
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opens += 1
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+                self._probe = None
+
+
+class LLMClient:
+    """
+    model:        实现了 generate_content (以及可选的 generate_content_async) 的对象
+    limiter:      RateLimiter (可选, 可以在多个 client 之间共用)
+    breaker:      CircuitBreaker (可选, 同上)
+    max_retries:  可重试错误最多重试几次 (不含第一次)
+    backoff_s:    第一次重试的退避上限, 之后每次翻倍, 最多 max_backoff_s; 实际等待在 [0, 上限] 里均匀随机
+    deadline_s:   单个请求 (排队 + 所有尝试 + 退避) 的时间上限; None = 不限
+    profiler:     Profiler (可选), 记录 llm.retry / llm.rate_limited / llm.breaker_open / llm.deadline 计数
+    """
+
+    def __init__(self, model, limiter=None, breaker=None, max_retries=3, backoff_s=0.5, max_backoff_s=8.0,
+                 deadline_s=30.0, profiler=None, seed=None):
+        self.model = model
+        self.model_name = getattr(model, "model_name", type(model).__name__)
+        self.limiter = limiter
+        self.breaker = breaker
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.deadline_s = deadline_s
+        self.profiler = profiler
+        self._rng = random.Random(seed)
+        self.stats = {
+            "requests": 0,       # generate 调用次数
+            "attempts": 0,       # 真正发给模型的次数
+            "retries": 0,
+            "rate_limited": 0,   # 因为限流而等待的请求数
+            "wait_s": 0.0,       # 限流等待的总秒数
+            "failures": 0,       # 最终失败 (LLMUnavailableError) 的请求数
+            "breaker_rejects": 0,
+            "deadline_exceeded": 0,
+        }
+
+    def _count(self, name, stat=None):
+        if stat is not None:
+            self.stats[stat] += 1
+        if self.profiler is not None:
+            self.profiler.count(name)
+
+    def _backoff(self, retry, error):
+        """第 retry 次重试前等待的秒数 (full jitter; 服务端给了 retry_after 时至少等这么久)"""
+        delay = self._rng.uniform(0, min(self.max_backoff_s, self.backoff_s * 2 ** retry))
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after:
+            delay = max(delay, retry_after)
+        return delay
+
+    def _admit(self, prompt, deadline):
+        """熔断检查和限流预订; 返回 (预订的 token 数, 需要等待的秒数, 熔断器的通行证)"""
+        self.stats["requests"] += 1
+        ticket = self.breaker.allow() if self.breaker is not None else True
+        if not ticket:
+            self._count("llm.breaker_open", "breaker_rejects")
+            self.stats["failures"] += 1
+            raise LLMUnavailableError("熔断器已打开, 后端暂时不可用")
+        tokens = sum(estimate_tokens(part) for part in prompt)
+        wait = self.limiter.reserve(tokens) if self.limiter is not None else 0.0
+        if wait > 0:
+            if deadline is not None and time.monotonic() + wait > deadline:
+                self.limiter.refund(tokens)
+                if self.breaker is not None:
+                    self.breaker.cancel(ticket)
+                self._give_up("llm.deadline", "deadline_exceeded", "限流排队会超过 deadline")
+            self._count("llm.rate_limited", "rate_limited")
+            self.stats["wait_s"] += wait
+        return tokens, wait, ticket
+
+    def _give_up(self, name, stat, reason, error=None):
+        self._count(name, stat)
+        self.stats["failures"] += 1
+        raise LLMUnavailableError(reason) from error
+
+    def _on_success(self, response, reserved_tokens):
+        if self.breaker is not None:
+            self.breaker.record_success()
+        if self.limiter is not None:
+            usage = getattr(response, "usage_metadata", None)
+            used = (getattr(usage, "prompt_token_count", None) or 0) + (getattr(usage, "candidates_token_count", None) or 0)
+            self.limiter.settle(used - reserved_tokens)
+        return response
+
+    def _on_error(self, error, retry, deadline):
+        """一次尝试失败: 不可重试就直接抛出原来的错误; 可以重试就返回退避秒数"""
+        if not is_retryable(error):
+            # 例如请求本身有问题 (400): 后端是通的, 不算熔断的失败
+            if self.breaker is not None:
+                self.breaker.record_success()
+            raise error
+        if self.breaker is not None:
+            self.breaker.record_failure()
+        if retry >= self.max_retries:
+            self._give_up("llm.retries_exhausted", None, f"重试 {retry} 次之后仍然失败: {error!r}", error)
+        if self.breaker is not None and self.breaker.state == CircuitBreaker.OPEN:
+            self._give_up("llm.breaker_open", None, f"熔断器已打开: {error!r}", error)
+        delay = self._backoff(retry, error)
+        if deadline is not None and time.monotonic() + delay > deadline:
+            self._give_up("llm.deadline", "deadline_exceeded", f"下一次重试会超过 deadline: {error!r}", error)
+        self._count("llm.retry", "retries")
+        return delay
+
+    def generate(self, prompt):
+        """
+        同步调用 (带限流/重试/熔断); 失败时抛出 LLMUnavailableError。
+        有 deadline 时每次尝试在一个后台线程里跑, 最多等到 deadline; 卡住的调用被丢下 (线程自己结束), 请求按超时放弃。
+        """
+        deadline = time.monotonic() + self.deadline_s if self.deadline_s is not None else None
+        tokens, wait, _ = self._admit(prompt, deadline)
+        if wait > 0:
+            time.sleep(wait)
+        retry = 0
+        while True:
+            self.stats["attempts"] += 1
+            if deadline is None:
+                try:
+                    return self._on_success(self.model.generate_content(prompt), tokens)
+                except Exception as e:
+                    delay = self._on_error(e, retry, deadline)
+            else:
+                done, response, error = self._call_until(prompt, deadline)
+                if not done:
+                    self._deadline_overrun()
+                if error is None:
+                    return self._on_success(response, tokens)
+                delay = self._on_error(error, retry, deadline)
+            time.sleep(delay)
+            retry += 1
+
+    def _call_until(self, prompt, deadline):
+        """在后台线程里调用模型, 最多等到 deadline; 返回 (是否完成, 回复, 异常)"""
+        result = {}
+
+        def call():
+            try:
+                result["response"] = self.model.generate_content(prompt)
+            except Exception as e:
+                result["error"] = e
+
+        thread = threading.Thread(target=call, daemon=True)
+        thread.start()
+        thread.join(max(0.0, deadline - time.monotonic()))
+        if thread.is_alive():
+            return False, None, None
+        return True, result.get("response"), result.get("error")
+
+    def _deadline_overrun(self):
+        """单次尝试用完了剩下的全部时间: 算一次失败, 放弃请求"""
+        if self.breaker is not None:
+            self.breaker.record_failure()
+        self._give_up("llm.deadline", "deadline_exceeded", "请求超过 deadline")
+
+    async def generate_async(self, prompt):
+        """异步调用; 每次尝试的超时是 deadline 剩下的时间。被取消时 (例如丢弃的推测请求) 把半开的探测名额还回去"""
+        import asyncio
+        deadline = time.monotonic() + self.deadline_s if self.deadline_s is not None else None
+        tokens, wait, ticket = self._admit(prompt, deadline)
+        try:
+            return await self._attempt_async(prompt, tokens, wait, deadline)
+        except asyncio.CancelledError:
+            if self.breaker is not None:
+                self.breaker.cancel(ticket)
+            raise
+
+    async def _attempt_async(self, prompt, tokens, wait, deadline):
+        import asyncio
+        if wait > 0:
+            await asyncio.sleep(wait)
+        generate_async = getattr(self.model, "generate_content_async", None)
+        retry = 0
+        while True:
+            self.stats["attempts"] += 1
+            if generate_async is not None:
+                call = generate_async(prompt)
+            else:
+                call = asyncio.to_thread(self.model.generate_content, prompt)
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            # 只有 deadline 到了调用还没结束才算超时; 模型/传输层自己抛出的 TimeoutError 和其它错误一样走重试
+            task = asyncio.ensure_future(call)
+            try:
+                done, _ = await asyncio.wait((task,), timeout=timeout)
+            finally:
+                if not task.done():
+                    task.cancel()
+            if not done:
+                self._deadline_overrun()
+            try:
+                return self._on_success(task.result(), tokens)
+            except Exception as e:
+                delay = self._on_error(e, retry, deadline)
+            await asyncio.sleep(delay)
+            retry += 1
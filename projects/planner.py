@@ -0,0 +1,404 @@
+import heapq
+import argparse
+import functools
+
+import numpy as np
+
+from config.config_globals import *
+
+from .config_tables import FIST_DAMAGE, get_config_tables
+from .rpg_env import REWARD_KILL, REWARD_FINAL_BOSS, REWARD_UPGRADE
+
+"""
+精确的计划求解器: 不调用任何 API 的基线策略 (也是性能上限)。
+
+每个 agent 的世界互不影响, 所以只对单个 agent 求解。把 config 编译成一张状态图:
+    节点  (武器等级, 背包, 血量), 都在“世界”里
+    边    env 的动作: 打某个 Boss (代价 = 1 步进入战斗 + 打死它需要的攻击次数, 奖励 REWARD_KILL),
+          制作/升级某把武器 (1 步, 奖励 REWARD_UPGRADE)
+    终点  打死 final_boss (奖励 REWARD_FINAL_BOSS, 回合结束)
+两种问题:
+    plan / next_action   在 max_steps (默认 AGENT_MAX_STEPS) 步之内总奖励最大的计划 (超时之前打不完的战斗没有奖励)。
+                         分支定界: 上界 = 已得奖励 + 剩下的步数 x 每步最多能拿的奖励 (+ 来得及时 final_boss 的奖励);
+                         同一个状态更早到达而且奖励不少的分支直接剪掉 (晚到的那个可以原地闲置追上)。
+    steps_to_goal        不限步数时打死 final_boss 的最少步数 (A*, 启发函数是可采纳的下界)。
+                         默认 config 下它比 AGENT_MAX_STEPS 长, 所以在时限内 final_boss 是打不到的, 计划只刷 Boss 和升级。
+沿途每个 (状态, 已用步数) 的下一步都记下来, 之后同一局里的查询都是 O(1) 的字典查找。
+
+伤害 / 反击 / “第一把等级 > 0 的武器生效” / final_boss 需要满级武器, 都和 RpgEnv 完全一致。
+掉落的概率都是 0 或 1 时计划是精确的; 否则按掉落期望值规划, PlannerAgent 每次看到偏离计划的状态就重新规划。
+计划里不会故意送死 (会打死自己的战斗不算可行的边)。
+
+运行: python -m projects.planner    (打印默认 config 的最短通关步数和时限内的最优计划)
+"""
+
+
+class Planner:
+    def __init__(self, tables=None, max_steps=AGENT_MAX_STEPS):
+        self.tables = tables if tables is not None else get_config_tables()
+        self.max_steps = max_steps
+        tables = self.tables
+        self.n_bosses = len(tables.boss_names)
+        self.n_weapons = len(tables.weapon_names)
+        self.max_level = tables.max_weapon_level
+
+        # 每个 Boss 每次击杀的期望掉落 (按 STONE_NAMES 顺序)
+        loot = np.zeros((self.n_bosses, len(tables.stone_names)))
+        for b, entries in enumerate(tables.loot):
+            for item, prob, amount in entries:
+                loot[b, item] += prob * amount
+        self.exact = all(prob in (0.0, 1.0) for entries in tables.loot for _, prob, _ in entries)
+        if self.exact:
+            loot = loot.astype(np.int64)
+        self._loot = [tuple(row) for row in loot.tolist()]
+        # cost[w][level] -> 升到这个等级的材料向量
+        self._cost = [[tuple(tables.cost[w, level].tolist()) for level in range(self.max_level + 1)]
+                      for w in range(self.n_weapons)]
+        # remaining[w][level] -> 从这个等级升到满级还需要的材料向量
+        self._remaining = [[tuple(tables.cost[w, level + 1:].sum(axis=0).tolist()) for level in range(self.max_level + 1)]
+                           for w in range(self.n_weapons)]
+
+        # --- 启发函数用的下界 ---
+        # 每次击杀的最少步数 (任何武器任何等级都算上)
+        self._min_kill_steps = min(
+            1 + _attacks(tables.boss_hp_list[b], max(FIST_DAMAGE, tables.damage[:, 1:, b].max()))
+            for b in range(self.n_bosses) if b != tables.final_boss
+        )
+        best_final = tables.damage[:, 1:, tables.final_boss].max()
+        self._min_final_steps = 1 + _attacks(tables.boss_hp_list[tables.final_boss], best_final) if best_final > 0 else None
+        # 每种材料每次击杀最多掉多少 (final_boss 是终点, 不算)
+        drops = np.array([self._loot[b] for b in range(self.n_bosses) if b != tables.final_boss])
+        self._max_drop = drops.max(axis=0).tolist()
+        # 除了 final_boss, 每一步最多能拿多少奖励 (分支定界的上界)
+        self._max_rate = max(REWARD_UPGRADE, REWARD_KILL / self._min_kill_steps)
+
+        self._attack_cache = {}
+        # 状态 -> 不限步数时到终点的最少步数 (到不了是 None)
+        self._shortest = {}
+        # (状态, 已用步数) -> (下一个动作, 它的步数, 时限内还能拿的奖励); 动作为 None 表示剩下的时间什么都不做
+        self._policy = {}
+
+    # --- 和 RpgEnv 一致的战斗规则 ---
+    def _damage(self, weapons, boss_idx):
+        if self.tables.requires_max_weapon[boss_idx] and self.max_level not in weapons:
+            return 0
+        for weapon_idx, level in enumerate(weapons):
+            if level > 0:
+                return self.tables.damage_list[weapon_idx][level][boss_idx]
+        return FIST_DAMAGE
+
+    def _fight(self, weapons, boss_idx):
+        """(攻击次数, 这场战斗受到的反击伤害); 打不动返回 None"""
+        key = (weapons, boss_idx)
+        if key not in self._attack_cache:
+            damage = self._damage(weapons, boss_idx)
+            if damage <= 0:
+                self._attack_cache[key] = None
+            else:
+                attacks = _attacks(self.tables.boss_hp_list[boss_idx], damage)
+                # 最后一击打死 Boss 之后不会再被反击
+                self._attack_cache[key] = (attacks, (attacks - 1) * self.tables.boss_retaliation_list[boss_idx])
+        return self._attack_cache[key]
+
+    def _key(self, weapons, inventory, health):
+        """背包里超过剩余需求的材料没有用, 截断之后等价的状态合并成一个"""
+        need = [0] * len(inventory)
+        for w, level in enumerate(weapons):
+            for s, amount in enumerate(self._remaining[w][level]):
+                need[s] += amount
+        inventory = tuple(min(have, cap) for have, cap in zip(inventory, need))
+        return weapons, inventory, health
+
+    def _heuristic(self, state):
+        """到终点的步数下界: 把某一把武器升到满级所需的最少击杀和升级, 再加上打 final_boss"""
+        weapons, inventory, _ = state
+        if self._min_final_steps is None:
+            return None
+        best = None
+        for w, level in enumerate(weapons):
+            kills = 0
+            for need, have, drop in zip(self._remaining[w][level], inventory, self._max_drop):
+                if need > have:
+                    if drop <= 0:
+                        kills = None
+                        break
+                    kills = max(kills, -(-(need - have) // drop))
+            if kills is None:
+                continue
+            estimate = (self.max_level - level) + int(kills) * self._min_kill_steps
+            if best is None or estimate < best:
+                best = estimate
+        if best is None:
+            return None
+        return best + self._min_final_steps
+
+    def _edges(self, state):
+        """(动作, 步数, 下一个状态); 下一个状态为 None 表示打死了 final_boss (奖励见 _reward)"""
+        weapons, inventory, health = state
+        tables = self.tables
+        for b in range(self.n_bosses):
+            fight = self._fight(weapons, b)
+            if fight is None or fight[1] >= health:
+                continue
+            attacks, damage_taken = fight
+            action = 1 + b
+            if b == tables.final_boss:
+                yield action, 1 + attacks, None
+            else:
+                loot = self._loot[b]
+                new_inventory = tuple(have + amount for have, amount in zip(inventory, loot))
+                yield action, 1 + attacks, self._key(weapons, new_inventory, health - damage_taken)
+        for w, level in enumerate(weapons):
+            if level == self.max_level:
+                continue
+            cost = self._cost[w][level + 1]
+            if all(have >= amount for have, amount in zip(inventory, cost)):
+                new_inventory = tuple(have - amount for have, amount in zip(inventory, cost))
+                new_weapons = weapons[:w] + (level + 1,) + weapons[w + 1:]
+                yield 1 + self.n_bosses + w, 1, self._key(new_weapons, new_inventory, health)
+
+    def _reward(self, action, nxt):
+        if nxt is None:
+            return REWARD_FINAL_BOSS
+        return REWARD_UPGRADE if action > self.n_bosses else REWARD_KILL
+
+    def _search(self, start):
+        """A*: 返回步数最少的通关路径 [(状态, 动作, 这一步的步数), ...] (到不了终点返回 None)"""
+        h = self._heuristic(start)
+        if h is None:
+            return None
+        counter = 0
+        # (f, -g, 计数, g, 状态); 同样的 f 优先展开走得更远的
+        frontier = [(h, 0, counter, 0, start)]
+        best_g = {start: 0}
+        parent = {start: None}
+        while frontier:
+            _, _, _, g, state = heapq.heappop(frontier)
+            if state is None:
+                return self._path(parent, g)
+            if g > best_g.get(state, g):
+                continue
+            for action, steps, nxt in self._edges(state):
+                new_g = g + steps
+                if nxt is None:
+                    counter += 1
+                    parent[("goal", new_g)] = (state, action, steps)
+                    heapq.heappush(frontier, (new_g, -new_g, counter, new_g, None))
+                    continue
+                if new_g >= best_g.get(nxt, new_g + 1):
+                    continue
+                h = self._heuristic(nxt)
+                if h is None:
+                    continue
+                best_g[nxt] = new_g
+                parent[nxt] = (state, action, steps)
+                counter += 1
+                heapq.heappush(frontier, (new_g + h, -new_g, counter, new_g, nxt))
+        return None
+
+    def _path(self, parent, g):
+        node = ("goal", g)
+        path = []
+        while parent[node] is not None:
+            prev, action, steps = parent[node]
+            path.append((prev, action, steps))
+            node = prev
+        path.reverse()
+        return path
+
+    def _upper_bound(self, state, remaining):
+        """剩下 remaining 步最多还能拿多少奖励"""
+        bound = self._max_rate * remaining
+        h = self._heuristic(state)
+        if h is not None and h <= remaining:
+            # 来得及打 final_boss: 最后那场战斗至少占 _min_final_steps 步
+            bound = max(bound, REWARD_FINAL_BOSS + self._max_rate * max(remaining - self._min_final_steps, 0))
+        return bound
+
+    def _best_within(self, start, used):
+        """
+        分支定界: 从 start (已经用了 used 步) 出发, max_steps 之内总奖励最大的路径。
+        返回 (奖励, [(状态, 已用步数, 动作, 这一步的步数, 下一个状态), ...])。
+        """
+        horizon = self.max_steps
+        best = [0, []]
+        # 不限步数的最短通关路径来得及走完的话, 先拿它当下界
+        shortest = self._search(start)
+        if shortest is not None and used + sum(steps for _, _, steps in shortest) <= horizon:
+            t = used
+            next_states = [state for state, _, _ in shortest[1:]] + [None]
+            for (state, action, steps), nxt in zip(shortest, next_states):
+                best[0] += self._reward(action, nxt)
+                best[1].append((state, t, action, steps, nxt))
+                t += steps
+        # 状态 -> [(已用步数, 奖励), ...]: 更早到达而且奖励不少的标签支配后来的
+        labels = {}
+        path = []
+
+        def visit(state, t, reward):
+            if reward + self._upper_bound(state, horizon - t) <= best[0]:
+                return
+            seen = labels.setdefault(state, [])
+            for t_seen, reward_seen in seen:
+                if t_seen <= t and reward_seen >= reward:
+                    return
+            seen.append((t, reward))
+            # 每步奖励高的边先走, 尽早找到好的下界
+            edges = [(action, steps, nxt) for action, steps, nxt in self._edges(state) if t + steps <= horizon]
+            edges.sort(key=lambda edge: -self._reward(edge[0], edge[2]) / edge[1])
+            for action, steps, nxt in edges:
+                path.append((state, t, action, steps, nxt))
+                gained = reward + self._reward(action, nxt)
+                if gained > best[0]:
+                    best[0] = gained
+                    best[1] = list(path)
+                if nxt is not None:
+                    visit(nxt, t + steps, gained)
+                path.pop()
+
+        visit(start, used, 0)
+        return best[0], best[1]
+
+    def _lookup(self, weapons, inventory, health, used):
+        """(状态, 已用步数) 的记忆键; 第一次遇到时求解并把整条最优路径记下来"""
+        key = (self._key(tuple(weapons), tuple(inventory), health), used)
+        if key not in self._policy:
+            total, path = self._best_within(*key)
+            for state, t, action, steps, nxt in path:
+                self._policy[(state, t)] = (action, steps, total)
+                total -= self._reward(action, nxt)
+            if path and path[-1][4] is not None:
+                # 计划走完之后剩下的时间什么都做不成
+                _, t, _, steps, nxt = path[-1]
+                self._policy.setdefault((nxt, t + steps), (None, 0, 0))
+            self._policy.setdefault(key, (None, 0, 0))
+        return key
+
+    def plan(self, weapons, inventory, health=AGENT_MAX_HEALTH, used=0):
+        """
+        从 (武器等级, 背包, 血量) 出发、已经用了 used 步时, max_steps 之内总奖励最大的计划: [(动作, 步数), ...]。
+        weapons / inventory 是按 WEAPON_DATA / STONE_NAMES 顺序的序列; 最后一个动作是打 final_boss 说明时限内能通关。
+        """
+        state, t = self._lookup(weapons, inventory, health, used)
+        plan = []
+        while state is not None:
+            action, steps, _ = self._policy[(state, t)]
+            if action is None:
+                break
+            plan.append((action, steps))
+            state = next(nxt for edge_action, _, nxt in self._edges(state) if edge_action == action)
+            t += steps
+        return plan
+
+    def next_action(self, weapons, inventory, health=AGENT_MAX_HEALTH, used=0):
+        """时限内最优计划的第一个动作 (按 (状态, 已用步数) 记忆); 剩下的时间什么都做不成时返回 None"""
+        return self._policy[self._lookup(weapons, inventory, health, used)][0]
+
+    def best_reward(self, weapons, inventory, health=AGENT_MAX_HEALTH, used=0):
+        """时限内最优计划的总奖励 (掉落不确定时按期望值算)"""
+        return self._policy[self._lookup(weapons, inventory, health, used)][2]
+
+    def steps_to_goal(self, weapons, inventory, health=AGENT_MAX_HEALTH):
+        """不限步数时打死 final_boss 的最少步数 (到不了终点返回 None)"""
+        start = self._key(tuple(weapons), tuple(inventory), health)
+        if start not in self._shortest:
+            path = self._search(start)
+            self._shortest[start] = None if path is None else sum(steps for _, _, steps in path)
+        return self._shortest[start]
+
+    def describe(self, action):
+        if 1 <= action <= self.n_bosses:
+            return f"打 {self.tables.boss_names[action - 1]}"
+        return f"制作/升级 {self.tables.weapon_names[action - 1 - self.n_bosses]}"
+
+
+def _attacks(hp, damage):
+    """和 env 一样逐次扣血, 避免浮点数 ceil 的误差"""
+    attacks = 0
+    while hp > 0:
+        hp -= damage
+        attacks += 1
+    return attacks
+
+
+@functools.lru_cache(maxsize=None)
+def get_planner(tables):
+    """每份 config 表共用一个 Planner (记忆的计划在所有 agent / 回合之间共享)"""
+    return Planner(tables)
+
+
+class PlannerAgent:
+    """
+    不调用 API 的“大脑”: 接口同 LLMAgent.choose_action, 也可以当 rollout_farm 的策略。
+    战斗中一直攻击; 在世界里按 AGENT_MAX_STEPS 之内奖励最大的计划走 (状态偏离计划时自动重新规划)。
+    """
+
+    def __init__(self, env=None, seed=None, planner=None):
+        if planner is None:
+            planner = get_planner(env.tables if env is not None else get_config_tables())
+        self.planner = planner
+        self.stone_names = self.planner.tables.stone_names
+        self.weapon_names = self.planner.tables.weapon_names
+
+    def choose_action(self, obs, current_step, action_mask=None):
+        if isinstance(obs, np.ndarray):
+            # obs_format="array" (布局见 rpg_env.OBS_INDEX)
+            from .rpg_env import OBS_HEALTH, OBS_STATE, OBS_INVENTORY, OBS_WEAPONS
+            in_battle = obs[OBS_STATE] == 1
+            health = int(obs[OBS_HEALTH])
+            inventory = obs[OBS_INVENTORY].tolist()
+            weapons = obs[OBS_WEAPONS].tolist()
+        else:
+            in_battle = obs["my_state"] == 1
+            health = obs["my_health"]
+            inventory = [obs["my_inventory"][stone] for stone in self.stone_names]
+            weapons = [obs["my_weapons"][weapon] for weapon in self.weapon_names]
+
+        if in_battle:
+            # 战斗中任何非闲置动作都是攻击 (有合法动作掩码时用掩码里的那一个)
+            return 1 if action_mask is None else int(np.flatnonzero(action_mask)[-1])
+        action = self.planner.next_action(weapons, inventory, health, used=current_step)
+        return 0 if action is None else action
+
+    def __call__(self, agent, obs, current_step):
+        return self.choose_action(obs, current_step)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="默认 config 的最短通关步数和 AGENT_MAX_STEPS 之内的最优计划")
+    parser.parse_args()
+
+    planner = get_planner(get_config_tables())
+    weapons = [0] * planner.n_weapons
+    inventory = [0] * len(planner.tables.stone_names)
+    loot = "确定" if planner.exact else "按期望值"
+
+    shortest = planner.steps_to_goal(weapons, inventory)
+    if shortest is None:
+        print("--- [Planner] 从初始状态打不死 final_boss ---")
+    elif shortest > planner.max_steps:
+        print(f"--- [Planner] 最短通关计划 {shortest} 步 > AGENT_MAX_STEPS = {planner.max_steps}: "
+              f"时限内打不到 final_boss ---")
+    else:
+        print(f"--- [Planner] 最短通关计划 {shortest} 步 (AGENT_MAX_STEPS = {planner.max_steps}) ---")
+
+    plan = planner.plan(weapons, inventory)
+    total = sum(steps for _, steps in plan)
+    reaches_final = bool(plan) and plan[-1][0] == 1 + planner.tables.final_boss
+    print(f"--- [Planner] {planner.max_steps} 步之内的最优计划: 奖励 {planner.best_reward(weapons, inventory)}, "
+          f"用 {total} 步, {'打死' if reaches_final else '没有打到'} final_boss (掉落{loot}) ---")
+    # 连续相同的动作合并成一行
+    step = 0
+    i = 0
+    while i < len(plan):
+        action, _ = plan[i]
+        j = i
+        while j < len(plan) and plan[j][0] == action:
+            j += 1
+        steps = sum(s for _, s in plan[i:j])
+        print(f"  步 {step + 1:>3}-{step + steps:>3}: {planner.describe(action)} x{j - i}")
+        step += steps
+        i = j
+
+if __name__ == "__main__":
+    main()
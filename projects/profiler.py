@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import inspect
+import functools
+from collections import defaultdict
+
+"""
+热路径的分阶段计时和计数 (默认关闭)。
+
+不传 profiler 时 RpgEnv / LLMAgent 完全没有额外开销; 传入之后, instrument() 会把要测的方法
+换成带计时的包装 (只替换这个实例上的属性, 类本身不变):
+
+    profiler = Profiler()
+    env = RpgEnv(profiler=profiler)
+    agent = LLMAgent(profiler=profiler)
+    ...
+    print(profiler.format_breakdown())
+    profiler.write_prometheus("rpg.prom")
+
+每个阶段记录 调用次数 / 总耗时 / 自身耗时 (去掉嵌套在里面的其它阶段) / 最大耗时。
+"env.step_other" 是 env.step 的自身耗时: step 里所有没有单独计时的部分 (动作分派、状态机、奖励汇总等)。
+异步方法 (例如网络等待) 只记总耗时, 因为多个协程会交错执行。
+"""
+
+
+class Profiler:
+    def __init__(self):
+        self.hooks = []
+        self.counters = defaultdict(int)
+        # 阶段名 -> [调用次数, 总纳秒, 自身纳秒, 最大纳秒]
+        self.timings = {}
+        # 正在执行的阶段, 每层累计它的子阶段用掉的纳秒
+        self._children = []
+        self._started = time.perf_counter_ns()
+
+    def reset(self):
+        """清零 (原地清零, 已经包装好的方法继续有效)"""
+        self.counters.clear()
+        for timing in self.timings.values():
+            timing[:] = [0, 0, 0, 0]
+        self._started = time.perf_counter_ns()
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def _timing(self, name):
+        if name not in self.timings:
+            self.timings[name] = [0, 0, 0, 0]
+        return self.timings[name]
+
+    def timed(self, name, fn):
+        """返回 fn 的计时版本"""
+        timing = self._timing(name)
+        children = self._children
+        perf_counter_ns = time.perf_counter_ns
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                start = perf_counter_ns()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    elapsed = perf_counter_ns() - start
+                    timing[0] += 1
+                    timing[1] += elapsed
+                    timing[2] += elapsed
+                    if elapsed > timing[3]: timing[3] = elapsed
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            children.append(0)
+            start = perf_counter_ns()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = perf_counter_ns() - start
+                child = children.pop()
+                if children:
+                    children[-1] += elapsed
+                timing[0] += 1
+                timing[1] += elapsed
+                timing[2] += elapsed - child
+                if elapsed > timing[3]: timing[3] = elapsed
+        return wrapper
+
+    def instrument(self, obj, phases):
+        """phases: {方法名: 阶段名}; 把 obj 上的这些方法换成计时版本"""
+        for method, name in phases.items():
+            setattr(obj, method, self.timed(name, getattr(obj, method)))
+
+    # --- 导出 ---
+    def snapshot(self):
+        """当前所有计数和计时的快照 (普通 dict, 可以直接 json.dumps)"""
+        timings = {}
+        for name, (calls, total_ns, self_ns, max_ns) in self.timings.items():
+            if calls == 0:
+                continue
+            timings[name] = {
+                "calls": calls,
+                "total_s": total_ns / 1e9,
+                "self_s": self_ns / 1e9,
+                "mean_us": total_ns / calls / 1e3,
+                "max_us": max_ns / 1e3,
+            }
+        if "env.step" in timings:
+            step = timings["env.step"]
+            timings["env.step_other"] = {
+                "calls": step["calls"],
+                "total_s": step["self_s"],
+                "self_s": step["self_s"],
+                "mean_us": step["self_s"] / step["calls"] * 1e6,
+                "max_us": None,
+            }
+        return {
+            "wall_s": (time.perf_counter_ns() - self._started) / 1e9,
+            "counters": dict(self.counters),
+            "timings": timings,
+        }
+
+    def add_hook(self, hook):
+        """hook(snapshot) 会在每次 export() 时被调用 (例如 jsonl_hook / prometheus_hook)"""
+        self.hooks.append(hook)
+        return hook
+
+    def export(self):
+        """把当前快照交给所有 hook, 并返回它"""
+        snapshot = self.snapshot()
+        for hook in self.hooks:
+            hook(snapshot)
+        return snapshot
+
+    def format_breakdown(self, title="Profile"):
+        """人类可读的分阶段表格 (占比 = 阶段自身耗时 / 墙钟时间)"""
+        snapshot = self.snapshot()
+        wall = snapshot["wall_s"] or 1e-9
+        lines = [f"--- [{title}] 墙钟 {snapshot['wall_s']:.3f}s ---",
+                 f"  {'phase':<20} {'calls':>8} {'total ms':>10} {'self ms':>10} {'mean us':>9} {'self %':>7}"]
+        rows = sorted(snapshot["timings"].items(), key=lambda item: -item[1]["self_s"])
+        for name, t in rows:
+            if name == "env.step":
+                continue # 自身耗时就是 env.step_other
+            lines.append(f"  {name:<20} {t['calls']:>8} {t['total_s'] * 1e3:>10.2f} {t['self_s'] * 1e3:>10.2f} "
+                         f"{t['mean_us']:>9.1f} {t['self_s'] / wall:>7.1%}")
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f"  {name:<20} {value:>8}")
+        return "\n".join(lines)
+
+    def write_jsonl(self, path, **labels):
+        """在 path 末尾追加一行 JSON 快照 (labels 会一起写进去)"""
+        return jsonl_hook(path, **labels)(self.snapshot())
+
+    def write_prometheus(self, path, prefix="rpg"):
+        """把快照写成 Prometheus 文本格式 (node_exporter textfile collector 可以直接读)"""
+        return prometheus_hook(path, prefix)(self.snapshot())
+
+
+def jsonl_hook(path, **labels):
+    def hook(snapshot):
+        record = dict(labels, timestamp=time.time(), **snapshot)
+        with open(path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+    return hook
+
+
+def prometheus_hook(path, prefix="rpg"):
+    def hook(snapshot):
+        timings = sorted(snapshot["timings"].items())
+        lines = []
+        # 同一个指标的样本要连在一起, 写在它的 TYPE 行后面
+        for metric, field in (("phase_calls_total", "calls"), ("phase_seconds_total", "total_s"),
+                              ("phase_self_seconds_total", "self_s")):
+            lines.append(f"# TYPE {prefix}_{metric} counter")
+            for name, t in timings:
+                lines.append(f'{prefix}_{metric}{{phase="{name}"}} {t[field]}')
+        lines.append(f"# TYPE {prefix}_events_total counter")
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f'{prefix}_events_total{{name="{name}"}} {value}')
+        # 先写临时文件再替换, 采集方不会读到写了一半的文件
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp, path)
+    return hook
+
+
+def export_profile(profiler, path):
+    """按扩展名导出: .prom = Prometheus 文本, 其它 = 追加一行 JSON"""
+    if path.endswith(".prom"):
+        profiler.write_prometheus(path)
+    else:
+        profiler.write_jsonl(path)
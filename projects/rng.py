@@ -0,0 +1,155 @@
+import numpy as np
+
+"""
+按块预先抽取的随机数流 (给掉落判定用)。
+
+每个 env (批量版里是每个子世界) 拥有自己的 numpy.random.Generator, 由 reset(seed) 播种。
+[0, 1) 均匀数按块批量抽取, 用完再惰性补充, 热路径上不会每个物品调用一次 RNG。
+同一个 Generator 不管分几次抽, 得到的数列都一样, 所以块大小不影响结果:
+种子相同, 掉落就逐位一致, 与旁边同时跑了多少个 env 无关。
+"""
+
+DEFAULT_BLOCK_SIZE = 256
+
+# 生成器 (PCG64) 状态打包成 6 个 uint64: state 高/低 64 位, inc 高/低 64 位, has_uint32, uinteger
+RNG_STATE_WORDS = 6
+_MASK64 = (1 << 64) - 1
+
+
+def pack_generator_state(generator, out):
+    """把 generator 的状态写进 out (长度 RNG_STATE_WORDS 的 uint64 数组)"""
+    state = generator.bit_generator.state
+    if state["bit_generator"] != "PCG64":
+        raise ValueError(f"只支持 PCG64 生成器, 实际为 {state['bit_generator']}")
+    out[0] = state["state"]["state"] >> 64
+    out[1] = state["state"]["state"] & _MASK64
+    out[2] = state["state"]["inc"] >> 64
+    out[3] = state["state"]["inc"] & _MASK64
+    out[4] = state["has_uint32"]
+    out[5] = state["uinteger"]
+
+
+def unpack_generator_state(words, generator):
+    """pack_generator_state 的逆操作: 把 words 里的状态原地装回 generator"""
+    hi, lo, inc_hi, inc_lo, has_uint32, uinteger = (int(w) for w in words)
+    generator.bit_generator.state = {
+        "bit_generator": "PCG64",
+        "state": {"state": (hi << 64) | lo, "inc": (inc_hi << 64) | inc_lo},
+        "has_uint32": has_uint32,
+        "uinteger": uinteger,
+    }
+
+
+class BlockUniforms:
+    """单条随机数流 (RpgEnv 用)"""
+
+    def __init__(self, seed=None, block_size=DEFAULT_BLOCK_SIZE):
+        self.generator = np.random.default_rng(seed)
+        self.block_size = block_size
+        self._block = []  # Python float 列表, 取用比 NumPy 标量快
+        self._pos = 0
+
+    def take(self, n):
+        """取出接下来的 n 个均匀数 (list)"""
+        end = self._pos + n
+        if end > len(self._block):
+            self._refill(n)
+            end = n
+        values = self._block[self._pos:end]
+        self._pos = end
+        return values
+
+    def _refill(self, n):
+        remaining = self._block[self._pos:]
+        fresh = self.generator.random(max(self.block_size, n) - len(remaining)).tolist()
+        self._block = remaining + fresh
+        self._pos = 0
+
+    def get_state(self, block_out, words_out):
+        """
+        把流的状态写进 block_out (长度 block_size) 和 words_out, 返回 pos:
+        还没用掉的数放在 block_out[pos:], 用完之后接着从生成器抽。
+        """
+        remaining = self._block[self._pos:]
+        pos = self.block_size - len(remaining)
+        if pos < 0:
+            raise ValueError(f"块里剩下 {len(remaining)} 个数, 超过了 block_size={self.block_size}")
+        block_out[pos:] = remaining
+        pack_generator_state(self.generator, words_out)
+        return pos
+
+    def set_state(self, block, pos, words):
+        """get_state 的逆操作"""
+        self._block = block[pos:].tolist()
+        self._pos = 0
+        unpack_generator_state(words, self.generator)
+
+
+class BatchedBlockUniforms:
+    """
+    n 条相互独立的随机数流 (VecRpgEnv 用), 块存成一个 (n, block_size) 数组,
+    一次调用就能为很多个 (流, 数量) 请求取数。
+
+    blocks / pos / words 可以由调用方提供 (例如 env 状态缓冲区里的视图),
+    这样整个随机数状态就在那块缓冲区里, 快照/恢复只是一次内存拷贝:
+    恢复之后调用 invalidate(), 生成器会在下一次补充时才从 words 读回状态。
+    """
+
+    def __init__(self, seeds, block_size=DEFAULT_BLOCK_SIZE, blocks=None, pos=None, words=None):
+        n = len(seeds)
+        self.block_size = block_size
+        self.blocks = blocks if blocks is not None else np.empty((n, block_size), dtype=np.float64)
+        self.pos = pos if pos is not None else np.empty(n, dtype=np.int64)
+        self.words = words if words is not None else np.empty((n, RNG_STATE_WORDS), dtype=np.uint64)
+        self.stale = np.zeros(n, dtype=bool)
+        self.reseed(seeds)
+
+    def reseed(self, seeds):
+        """用新的种子重建所有流 (存储原地复用)"""
+        self.generators = [np.random.default_rng(seed) for seed in seeds]
+        for s, generator in enumerate(self.generators):
+            self.blocks[s] = generator.random(self.block_size)
+            pack_generator_state(generator, self.words[s])
+        self.pos[:] = 0
+        self.stale[:] = False
+
+    def invalidate(self):
+        """blocks / pos / words 被整体改写 (恢复快照) 之后调用"""
+        self.stale[:] = True
+
+    def take(self, stream_idx, counts, width):
+        """
+        stream_idx: 每个请求用哪条流 (必须升序; 同一条流的请求按消费顺序排列)
+        counts:     每个请求要几个数 (<= width)
+        返回 (len(stream_idx), width) 的数组, 第 i 行前 counts[i] 个是这个请求的均匀数, 其余无意义。
+        """
+        n_streams = len(self.generators)
+        need = np.bincount(stream_idx, weights=counts, minlength=n_streams).astype(np.int64)
+        if need.max(initial=0) > self.block_size:
+            raise ValueError(f"一次最多从每条流取 block_size={self.block_size} 个数, 实际需要 {need.max()}")
+        for s in np.flatnonzero(self.pos + need > self.block_size):
+            self._refill(s)
+
+        # 每个请求在自己那条流里的起始位置 = 流当前位置 + 同一条流里排在它前面的请求数量之和
+        cumulative = np.cumsum(counts) - counts
+        first = np.searchsorted(stream_idx, stream_idx)
+        start = self.pos[stream_idx] + cumulative - cumulative[first]
+
+        columns = start[:, None] + np.arange(width)
+        np.minimum(columns, self.block_size - 1, out=columns)
+        values = self.blocks[stream_idx[:, None], columns]
+
+        self.pos += need
+        return values
+
+    def _refill(self, s):
+        """把流 s 剩下的数挪到块的开头, 后面补上新数"""
+        generator = self.generators[s]
+        if self.stale[s]:
+            unpack_generator_state(self.words[s], generator)
+            self.stale[s] = False
+        remaining = self.blocks[s, self.pos[s]:].copy()
+        self.blocks[s, :len(remaining)] = remaining
+        self.blocks[s, len(remaining):] = generator.random(self.block_size - len(remaining))
+        pack_generator_state(generator, self.words[s])
+        self.pos[s] = 0
@@ -0,0 +1,198 @@
+import os
+import json
+import math
+import time
+import random
+import argparse
+import multiprocessing
+
+from .rpg_env import RpgEnv
+from .event_log import EventLog
+from .planner import PlannerAgent
+
+"""
+多进程 rollout: 把 N 个带种子的 RpgEnv 回合分给进程池, 每个回合跑完就把结果流式传回,
+主进程边收边合并成汇总统计 (不保存轨迹)。
+
+同一个种子的回合结果完全确定 (env 和策略都用这个种子), 汇总只用整数求和,
+所以对同一组种子, 不管多少个 worker、结果按什么顺序回来, 统计都完全一样。
+
+运行: python -m projects.rollout_farm --episodes 1000 --workers 8
+"""
+
+
+class RandomPolicy:
+    """带种子的随机策略 (和 run_rpg_test.py 里的“AI”一样, 但可复现)"""
+
+    def __init__(self, env, seed):
+        self._rng = random.Random(seed)
+        self._num_actions = {agent: env.action_spaces[agent].n for agent in env.possible_agents}
+
+    def __call__(self, agent, obs, current_step):
+        return self._rng.randrange(self._num_actions[agent])
+
+
+# 策略名 -> 构造函数 policy(env, seed); 用名字传给 worker, 避免 pickle 策略对象
+POLICIES = {
+    "random": RandomPolicy,
+    "planner": PlannerAgent, # 最优计划 (见 planner.py), 不调用 API
+}
+
+
+class _EpisodeCounter:
+    """从结构化事件里数死亡次数、武器制作次数和击败 final_boss 的步数"""
+
+    def __init__(self, agents):
+        self.deaths = {agent: 0 for agent in agents}
+        self.weapons_crafted = {agent: 0 for agent in agents}
+        self.final_boss_step = {agent: None for agent in agents}
+
+    def __call__(self, event):
+        kind = event.kind
+        if kind == "death":
+            self.deaths[event.data["agent"]] += 1
+        elif kind == "upgrade":
+            if event.data["level"] == 1: # 等级 0 -> 1 是“制作”
+                self.weapons_crafted[event.data["agent"]] += 1
+        elif kind == "final_victory":
+            self.final_boss_step[event.data["agent"]] = event.step
+
+
+def run_episode(seed, policy_name="random"):
+    """跑一个带种子的回合, 返回这个回合的结果 (只包含汇总需要的数字)"""
+    # 事件只交给计数器, 不保留 (capacity=0)
+    event_log = EventLog(capacity=0)
+    env = RpgEnv(verbosity="events", event_log=event_log)
+    counter = event_log.callback = _EpisodeCounter(env.possible_agents)
+    policy = POLICIES[policy_name](env, seed)
+
+    observations, infos = env.reset(seed=seed)
+    returns = {agent: 0 for agent in env.possible_agents}
+    while env.agents:
+        actions = {agent: policy(agent, observations[agent], env.current_step) for agent in env.agents}
+        observations, rewards, terminations, truncations, infos = env.step(actions)
+        for agent, reward in rewards.items():
+            returns[agent] += int(reward)
+    env.close()
+
+    return {
+        "seed": seed,
+        "steps": env.current_step,
+        "returns": returns,
+        "final_boss_step": counter.final_boss_step,
+        "deaths": counter.deaths,
+        "weapons_crafted": counter.weapons_crafted,
+    }
+
+
+def _run_episode_star(args):
+    return run_episode(*args)
+
+
+class RolloutStats:
+    """流式合并回合结果 (只用整数累加, 和合并顺序无关)"""
+
+    def __init__(self):
+        self.episodes = 0
+        self.env_steps = 0
+        self.agent_episodes = 0
+        self.return_sum = 0
+        self.return_sq_sum = 0
+        self.return_min = None
+        self.return_max = None
+        self.final_boss_wins = 0
+        self.final_boss_step_sum = 0
+        self.deaths = 0
+        self.weapons_crafted = 0
+
+    def add(self, result):
+        self.episodes += 1
+        self.env_steps += result["steps"]
+        for agent, ret in result["returns"].items():
+            self.agent_episodes += 1
+            self.return_sum += ret
+            self.return_sq_sum += ret * ret
+            self.return_min = ret if self.return_min is None else min(self.return_min, ret)
+            self.return_max = ret if self.return_max is None else max(self.return_max, ret)
+            step = result["final_boss_step"][agent]
+            if step is not None:
+                self.final_boss_wins += 1
+                self.final_boss_step_sum += step
+            self.deaths += result["deaths"][agent]
+            self.weapons_crafted += result["weapons_crafted"][agent]
+
+    def summary(self):
+        n = self.agent_episodes
+        mean = self.return_sum / n if n else 0.0
+        variance = (self.return_sq_sum - self.return_sum * self.return_sum / n) / n if n else 0.0
+        return {
+            "episodes": self.episodes,
+            "env_steps": self.env_steps,
+            "return_mean": mean,
+            "return_std": math.sqrt(max(variance, 0.0)),
+            "return_min": self.return_min,
+            "return_max": self.return_max,
+            "final_boss_rate": self.final_boss_wins / n if n else 0.0,
+            "final_boss_step_mean": self.final_boss_step_sum / self.final_boss_wins if self.final_boss_wins else None,
+            "deaths_mean": self.deaths / n if n else 0.0,
+            "weapons_crafted_mean": self.weapons_crafted / n if n else 0.0,
+        }
+
+
+def run_rollouts(seeds, workers=None, policy_name="random", on_result=None, chunksize=None):
+    """
+    把 seeds 里的每个种子跑一个回合, 返回 (RolloutStats, 用时秒)。
+    workers: 进程数 (默认等于 CPU 核数; 1 = 在当前进程里跑)
+    on_result: 每收到一个回合结果就调用 on_result(result) (例如写 JSONL)
+    """
+    seeds = list(seeds)
+    workers = workers or os.cpu_count() or 1
+    stats = RolloutStats()
+    start = time.perf_counter()
+
+    tasks = [(seed, policy_name) for seed in seeds]
+    if workers == 1:
+        results = map(_run_episode_star, tasks)
+        _merge(results, stats, on_result)
+    else:
+        if chunksize is None:
+            chunksize = max(1, len(tasks) // (workers * 8))
+        with multiprocessing.Pool(processes=workers) as pool:
+            _merge(pool.imap_unordered(_run_episode_star, tasks, chunksize=chunksize), stats, on_result)
+
+    return stats, time.perf_counter() - start
+
+
+def _merge(results, stats, on_result):
+    for result in results:
+        stats.add(result)
+        if on_result is not None:
+            on_result(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多进程 RpgEnv rollout")
+    parser.add_argument("--episodes", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0, help="第一个种子 (种子为 seed .. seed+episodes-1)")
+    parser.add_argument("--workers", type=int, default=None, help="进程数 (默认 = CPU 核数)")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="random")
+    parser.add_argument("--jsonl", default=None, help="把每个回合的结果流式写进这个 JSONL 文件")
+    args = parser.parse_args()
+
+    seeds = range(args.seed, args.seed + args.episodes)
+    out = open(args.jsonl, "w") if args.jsonl else None
+    on_result = (lambda result: out.write(json.dumps(result) + "\n")) if out else None
+    try:
+        stats, elapsed = run_rollouts(seeds, workers=args.workers, policy_name=args.policy, on_result=on_result)
+    finally:
+        if out:
+            out.close()
+
+    print(f"--- [Rollout] {args.episodes} 回合, {args.workers or os.cpu_count()} 个进程, "
+          f"{elapsed:.2f}s ({args.episodes / elapsed:.1f} 回合/秒) ---")
+    for key, value in stats.summary().items():
+        print(f"  {key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+from pettingzoo import AECEnv
+
+from .rpg_env import RpgEnv
+
+"""
+RpgEnv 的原生 AEC (Agent-Environment-Cycle) 视图, 给只认 AEC 接口的工具用。
+
+和 PettingZoo 通用的 parallel_to_aec 转换相比:
+    - 直接用 RpgEnv 的观察 (不复制字典; "array" 格式就是 env 缓冲区里的那一行) 和合法动作掩码
+    - 轮转只记一个下标, 不建 AgentSelector; 一轮里的动作先攒在一个字典里, 最后一个 agent 行动时一次 env.step 结算
+    - 奖励只更新这一轮拿到奖励的 agent, terminations / truncations 只在有 agent 结束时改
+
+    env = RpgAECEnv(RpgEnv(verbosity="silent"))
+    env.reset(seed=0)
+    for agent in env.agent_iter():
+        obs, reward, terminated, truncated, info = env.last()
+        env.step(None if terminated or truncated else policy(obs, info["action_mask"]))
+
+结束的 agent (打死 final_boss 或者超时) 在下一轮开始前先轮到它们各一次 (动作为 None), 然后被移出 agents。
+"""
+
+
+class RpgAECEnv(AECEnv):
+    def __init__(self, env=None, **env_kwargs):
+        """env: 要包装的 RpgEnv (不传则用 env_kwargs 新建一个); 不支持 delta_obs"""
+        if env is None:
+            env = RpgEnv(**env_kwargs)
+        elif env_kwargs:
+            raise ValueError("传了 env 就不能再传 env_kwargs")
+        if env.delta_obs:
+            raise ValueError("RpgAECEnv 不支持 delta_obs (observe() 要返回完整的观察)")
+        self.env = env
+        self.metadata = dict(env.metadata, is_parallelizable=True)
+        self.render_mode = env.render_mode
+        self.possible_agents = env.possible_agents
+        self.observation_spaces = env.observation_spaces
+        self.action_spaces = env.action_spaces
+        self.agents = []
+
+    def observation_space(self, agent):
+        return self.observation_spaces[agent]
+
+    def action_space(self, agent):
+        return self.action_spaces[agent]
+
+    @property
+    def unwrapped(self):
+        return self.env
+
+    def reset(self, seed=None, options=None):
+        self._observations, self.infos = self.env.reset(seed=seed, options=options)
+        self.agents = list(self.env.agents)
+        self.rewards = dict.fromkeys(self.agents, 0)
+        self._cumulative_rewards = dict.fromkeys(self.agents, 0)
+        self.terminations = dict.fromkeys(self.agents, False)
+        self.truncations = dict.fromkeys(self.agents, False)
+        # 这一轮已经提交的动作; 上一次结算时拿到奖励的 agent (下一步把它们的单步奖励清零)
+        self._actions = {}
+        self._rewarded = []
+        # 等着被移出去的 agent (已经结束, 还没轮到它的 None 动作)
+        self._finished = []
+        self._agent_index = 0
+        self.agent_selection = self.agents[0]
+
+    def observe(self, agent):
+        obs = self._observations.get(agent)
+        return obs if obs is not None else self.env.observe(agent)
+
+    def step(self, action):
+        agent = self.agent_selection
+        self._cumulative_rewards[agent] = 0
+        if self._rewarded:
+            for rewarded in self._rewarded:
+                self.rewards[rewarded] = 0
+            self._rewarded = []
+
+        if self._finished:
+            # 结束的 agent 先轮完 (动作必须是 None), 再开始下一轮
+            if action is not None:
+                raise ValueError(f"{agent} 已经结束, 动作必须是 None (实际为 {action})")
+            self._finished.pop(0)
+            self._remove(agent)
+            if self._finished:
+                self.agent_selection = self._finished[0]
+            elif self.agents:
+                self.agent_selection = self.agents[0]
+            return
+
+        self._actions[agent] = action
+        self._agent_index += 1
+        if self._agent_index < len(self.agents):
+            self.agent_selection = self.agents[self._agent_index]
+            return
+        self._resolve()
+
+    def _resolve(self):
+        """一轮的动作都齐了: 一次 env.step 结算"""
+        actions = self._actions
+        self._actions = {}
+        self._agent_index = 0
+        observations, rewards, terminations, _, infos = self.env.step(actions)
+        self._observations = observations
+        self.infos.update(infos)
+
+        cumulative = self._cumulative_rewards
+        for agent, reward in rewards.items():
+            if reward:
+                self.rewards[agent] = reward
+                cumulative[agent] += reward
+                self._rewarded.append(agent)
+
+        # 行动了 (在 terminations 里) 但不在 observations 里的 agent 结束了: 不是打死了 final_boss 就是超时
+        if len(observations) < len(actions):
+            for agent in actions:
+                if agent in observations or agent not in terminations:
+                    continue
+                if terminations.get(agent):
+                    self.terminations[agent] = True
+                else:
+                    self.truncations[agent] = True
+                self._finished.append(agent)
+        if self._finished:
+            self.agent_selection = self._finished[0]
+        else:
+            self.agent_selection = self.agents[0]
+
+    def _remove(self, agent):
+        self.agents.remove(agent)
+        del self.rewards[agent], self._cumulative_rewards[agent], self.infos[agent]
+        del self.terminations[agent], self.truncations[agent]
+
+    def render(self):
+        # render_mode="human" 时 env.step 结算之后已经自己 render 过了
+        self.env.render()
+
+    def close(self):
+        self.env.close()
@@ -1,44 +1,160 @@
-import gymnasium
-from gymnasium.spaces import Discrete, Dict
+from gymnasium.spaces import Discrete, Dict, Box
 from pettingzoo import ParallelEnv
-from pettingzoo.utils import wrappers
 import numpy as np
-import random
-import os
+import math
 
 from config.config_globals import *
 from config.config_bosses import *
 from config.config_weapons import *
 
+from .event_log import VERBOSITY_LEVELS, EVENT_TEMPLATES, Event, EventLog
+from .config_tables import FIST_DAMAGE, get_config_tables
+from .rng import BlockUniforms
+from .env_state import StateLayout
+
+# --- obs_format="array" 的观察布局: 每个 agent 一行 int32 ---
+#   [0]      my_health
+#   [1]      my_state (0 = 在世界, 1 = 在战斗)
+#   [2:8]    my_inventory, 顺序同 STONE_NAMES
+#   [8:13]   my_weapons (等级), 顺序同 WEAPON_DATA
+#   [13]     battle_boss_health (向上取整; 不在战斗中为 0)
+OBS_HEALTH = 0
+OBS_STATE = 1
+OBS_INVENTORY = slice(2, 2 + len(STONE_NAMES))
+OBS_WEAPONS = slice(OBS_INVENTORY.stop, OBS_INVENTORY.stop + len(WEAPON_DATA))
+OBS_BOSS_HEALTH = OBS_WEAPONS.stop
+OBS_SIZE = OBS_BOSS_HEALTH + 1
+OBS_INDEX = {
+    "my_health": OBS_HEALTH,
+    "my_state": OBS_STATE,
+    "my_inventory": OBS_INVENTORY,
+    "my_weapons": OBS_WEAPONS,
+    "battle_boss_health": OBS_BOSS_HEALTH,
+}
+OBS_FORMATS = ("dict", "array")
+
+# --- 增量观察: step 里记录每个 agent 被改过的字段 (位掩码), 只重建这些字段 ---
+OBS_FIELDS = ("my_health", "my_state", "my_inventory", "my_weapons", "battle_boss_health")
+DIRTY_HEALTH = 1
+DIRTY_STATE = 2
+DIRTY_INVENTORY = 4
+DIRTY_WEAPONS = 8
+DIRTY_BOSS_HEALTH = 16
+DIRTY_ALL = 31
+# 合法动作掩码只依赖状态, 背包和武器: 这几个字段变化时才重算
+DIRTY_MASK = DIRTY_STATE | DIRTY_INVENTORY | DIRTY_WEAPONS
+
+# 奖励: 打死普通 Boss / 打死 final_boss / 成功制作或升级一次武器
+REWARD_KILL = 100
+REWARD_FINAL_BOSS = 10000
+REWARD_UPGRADE = 50
+
+# profiler 打开时被计时的方法 -> 阶段名 (见 profiler.py)
+PROFILED_PHASES = {
+    "reset": "env.reset",
+    "step": "env.step",
+    "_create_battle_instance": "env.battle_create",
+    "_calculate_damage": "env.damage_calc",
+    "_roll_loot": "env.loot_roll",
+    "_handle_craft_or_upgrade": "env.craft",
+    # _step_obs 在缓存作废时会调用 _get_obs: 两者用不同的阶段名, 调用次数和耗时才不会重复计算
+    "_get_obs": "env.obs_full",
+    "_step_obs": "env.obs",
+    "_update_mask": "env.action_mask",
+    "render": "env.render",
+    "_begin_record": "env.record",
+    "_end_record": "env.record",
+}
+
+class BattleInstance:
+    """一个 agent 的战斗副本; 用完放回 env 的对象池, 下一场战斗直接复用"""
+    __slots__ = ("type", "boss", "health")
+
+    def __repr__(self):
+        return f"BattleInstance(type={self.type!r}, boss={self.boss}, health={self.health})"
+
+
 class RpgEnv(ParallelEnv): # ParallelEnv
     metadata = {"render_modes": ["human"], "name": "rpg_env_v0"}
 
-    def __init__(self, render_mode=None):
+    def __init__(self, render_mode=None, verbosity="human", event_log=None, config_tables=None, obs_format="dict",
+                 fast_forward=False, recorder=None, profiler=None, n_agents=5, delta_obs=False, obs_buffer=None,
+                 mask_buffer=None):
+        """
+        delta_obs: step 只返回这一步变化了的字段 {字段名: 值} (值同 "dict" 格式; 没有变化就是空字典),
+                   reset 返回全部字段; 完整观察随时可以用 observe(agent) 取
+        n_agents: 世界里的 agent 数量 (默认 5); step 的开销只和这一步提交了动作的 agent 数有关
+        obs_format: "dict" (嵌套字典) 或 "array" (预分配的 int32 缓冲区, 布局见 OBS_INDEX)
+        obs_buffer: (可选) "array" 模式下观察直接写进这块 (n_agents, OBS_SIZE) 的 int32 数组 (例如共享内存)
+        mask_buffer: (可选) 合法动作掩码同时写进这块 (n_agents, 动作数) 的 int8 数组 (例如共享内存), 见 action_mask()
+        fast_forward: 进入战斗的 agent 在同一次 step 里直接打到结束 (胜利/死亡/超时), 见 _step_fast_forward
+        recorder: TrajectoryRecorder (可选), 每一步行动的 agent 都记一行 (见 trajectory.py), close() 时关闭它
+        profiler: Profiler (可选), 分阶段计时 (见 profiler.py 和 PROFILED_PHASES); 不传没有任何开销
+        verbosity: "silent" (不输出, 不格式化), "events" (结构化事件写进 event_log), "human" (print 文本)
+        event_log: "events" 模式下的 EventLog (不传则新建一个默认的环形缓冲区)
+        config_tables: 编译好的 ConfigTables (不传则使用默认 config 的编译结果)
+        """
         
-        self.possible_agents = [f"player_{i}" for i in range(5)] # (新) 5 个 Agent
-        self.agents = self.possible_agents[:]
+        if n_agents < 1:
+            raise ValueError(f"n_agents 必须 >= 1, 实际为 {n_agents}")
+        self.n_agents = n_agents
+        self.possible_agents = [f"player_{i}" for i in range(n_agents)]
+        self.agents = self.possible_agents
         
-        self.boss_names = list(BOSS_DATA.keys())
-        self.weapon_names = list(WEAPON_DATA.keys())
+        # 伤害/升级都查编译好的表 (配置错误在这里就会报错)
+        self.tables = config_tables if config_tables is not None else get_config_tables()
+        self.boss_names = self.tables.boss_names
+        self.weapon_names = self.tables.weapon_names
+        self._boss_index = self.tables.boss_index
+        self._weapon_index = self.tables.weapon_index
+        self.stone_names = self.tables.stone_names
+        self.max_weapon_level = self.tables.max_weapon_level
+
+        if obs_format not in OBS_FORMATS:
+            raise ValueError(f"未知的 obs_format: {obs_format} (可选: {OBS_FORMATS})")
+        self.obs_format = obs_format
+        self.delta_obs = delta_obs
+        if (obs_format == "array" and (len(self.stone_names), len(self.weapon_names))
+                != (OBS_INVENTORY.stop - OBS_INVENTORY.start, OBS_WEAPONS.stop - OBS_WEAPONS.start)):
+            raise ValueError("obs_format=\"array\" 的布局 (OBS_INDEX) 按默认 config 的材料/武器数量固定, "
+                             "config_tables 的材料/武器数量不同时请用 obs_format=\"dict\"")
 
-        # PettingZoo Parallel API
-        self.observation_spaces = {
-            agent: Dict({
+        # PettingZoo Parallel API (所有 agent 共用同一个空间对象, 上万个 agent 也只建一次)
+        if obs_format == "array":
+            observation_space = self._array_obs_space()
+        else:
+            observation_space = Dict({
                 "my_health": Discrete(AGENT_MAX_HEALTH + 1),
                 "my_state": Discrete(2), # 0 = 在世界, 1 = 在战斗
-                "my_inventory": Dict({stone: Discrete(100) for stone in STONE_NAMES}),
-                "my_weapons": Dict({weapon: Discrete(MAX_WEAPON_LEVEL + 1) for weapon in self.weapon_names}),
+                "my_inventory": Dict({stone: Discrete(100) for stone in self.stone_names}),
+                "my_weapons": Dict({weapon: Discrete(self.max_weapon_level + 1) for weapon in self.weapon_names}),
                 # (简化) agent 不再能看到所有 Boss 血量, 只能看到自己战斗中的 Boss
-                "battle_boss_health": Discrete(BOSS_DATA["final_boss"][0] + 1) # (取一个最大值)
+                "battle_boss_health": Discrete(math.ceil(max(self.tables.boss_hp_list)) + 1) # (取所有 Boss 的最大值)
             })
-            for agent in self.possible_agents
-        }
-        
+        self.observation_spaces = dict.fromkeys(self.possible_agents, observation_space)
+
         num_actions = 1 + len(self.boss_names) + len(self.weapon_names)
-        self.action_spaces = {agent: Discrete(num_actions) for agent in self.possible_agents}
+        self.action_spaces = dict.fromkeys(self.possible_agents, Discrete(num_actions))
         
         self.render_mode = render_mode
         self.current_step = 0
+        self.fast_forward = fast_forward
+        if recorder is not None and n_agents > recorder.max_agents:
+            raise ValueError(f"recorder 的 agent 列最多存 {recorder.max_agents} 个 agent, 实际为 {n_agents} "
+                             f"(创建 TrajectoryRecorder 时传 n_agents)")
+        self.recorder = recorder
+        self._agent_index = {agent: i for i, agent in enumerate(self.possible_agents)}
+        # fast_forward 模式下每个 agent 自己的步数时钟 (普通模式下都等于 current_step)
+        self.agent_steps = {}
+
+        if verbosity not in VERBOSITY_LEVELS:
+            raise ValueError(f"未知的 verbosity: {verbosity} (可选: {VERBOSITY_LEVELS})")
+        self.verbosity = verbosity
+        # 热路径上只检查这个布尔值, silent 模式下连事件参数都不会构造
+        self._verbose = verbosity != "silent"
+        if verbosity == "events" and event_log is None:
+            event_log = EventLog()
+        self.event_log = event_log
         
         # --- 核心逻辑：状态机 ---
         self.agent_healths = {}
@@ -47,132 +163,423 @@ class RpgEnv(ParallelEnv): # ParallelEnv
         # 追踪 Agent 在干什么: "WORLD" 或 "BATTLE"
         self.agent_states = {agent: "WORLD" for agent in self.possible_agents}
         # 追踪 Agent 的独立战斗 "副本"
-        self.battle_instances = {} # e.g. {"player_0": {"type": "fire_boss", "health": 1000}}
+        self.battle_instances = {} # e.g. {"player_0": BattleInstance(type="fire_boss", boss=0, health=1000)}
+        # 打完的副本放回这里复用
+        self._battle_pool = []
+        # 这一步里被改过的字段: {agent: DIRTY_* 位掩码}, step 结束时清空
+        self._dirty = {}
+        # 每个 agent 上一次观察的字段值 (顺序同 OBS_FIELDS), step 里只刷新 dirty 的字段
+        self._obs_cache = {}
+        # 每个 env 独立的随机数流 (reset(seed) 时重新播种), 掉落判定按块预先抽取
+        self._loot_rng = BlockUniforms()
+        self.np_random = self._loot_rng.generator
+
+        # "array" 模式: 所有 agent 的观察写进同一块预分配缓冲区, 每个 agent 拿到的是其中一行的视图
+        if obs_buffer is None:
+            obs_buffer = np.zeros((n_agents, OBS_SIZE), dtype=np.int32)
+        elif obs_buffer.shape != (n_agents, OBS_SIZE) or obs_buffer.dtype != np.int32:
+            raise ValueError(f"obs_buffer 必须是 ({n_agents}, {OBS_SIZE}) 的 int32 数组, "
+                             f"实际为 {obs_buffer.shape} {obs_buffer.dtype}")
+        self.obs_buffer = obs_buffer
+        self._obs_rows = {agent: self.obs_buffer[i] for i, agent in enumerate(self.possible_agents)}
+
+        # 合法动作掩码 (1 = 这个动作在当前状态下有效果), 只在状态/背包/武器变化时重算。
+        # 两种 obs_format 下都通过 infos[agent]["action_mask"] 返回。
+        # 不同的掩码没有几种: 按位编码成整数, 每种只建一个只读数组, 状态变化时 agent 换一个引用就行
+        self._masks = {}
+        # 每个 agent 在世界中的掩码 (进出战斗不变, 背包/武器变化时才重算)
+        self._world_masks = {}
+        self._mask_arrays = {}
+        n_bosses = len(self.boss_names)
+        # 世界中: 闲置 + 不需要满级武器的 Boss / 有满级武器时所有 Boss
+        self._world_mask_base = [1, 1]
+        for boss_idx, required in enumerate(self.tables.requires_max_weapon.tolist()):
+            self._world_mask_base[1] |= 1 << (1 + boss_idx)
+            if not required: self._world_mask_base[0] |= 1 << (1 + boss_idx)
+        # next_recipes[武器][当前等级] -> 升一级的成本 (满级为 None)
+        self._next_recipes = [recipes[1:] + [None] for recipes in self.tables.recipes]
+        self._upgrade_bits = [1 << (1 + n_bosses + weapon_idx) for weapon_idx in range(len(self.weapon_names))]
+        self._battle_masks = [self._intern_mask(1 | 1 << (1 + boss_idx)) for boss_idx in range(n_bosses)]
+        if mask_buffer is not None and (mask_buffer.shape != (n_agents, num_actions) or mask_buffer.dtype != np.int8):
+            raise ValueError(f"mask_buffer 必须是 ({n_agents}, {num_actions}) 的 int8 数组, "
+                             f"实际为 {mask_buffer.shape} {mask_buffer.dtype}")
+        self.mask_buffer = mask_buffer
+        self._mask_rows = None
+        if mask_buffer is not None:
+            self._mask_rows = {agent: mask_buffer[i] for i, agent in enumerate(self.possible_agents)}
+
+        # get_state / set_state 的快照格式 (和 n_envs=1 的 VecRpgEnv 相同)
+        self._state_layout = StateLayout(1, len(self.possible_agents), len(self.stone_names),
+                                         len(self.weapon_names), self._loot_rng.block_size)
+        # 打包/解包用的暂存缓冲区 (字段视图只建一次)
+        self._state = self._state_layout.allocate()
+        self._state_views = self._state_layout.views(self._state)
+
+        self.profiler = profiler
+        if profiler is not None:
+            profiler.instrument(self, PROFILED_PHASES)
+
+    @property
+    def agents(self):
+        """还没有结束的 agent (按 possible_agents 的顺序)。只有在有 agent 结束之后才会重建这个列表"""
+        if self._agents is None:
+            self._agents = list(self._active)
+        return self._agents
+
+    @agents.setter
+    def agents(self, agents):
+        # 存活集合是一个 dict (保持顺序, 删除 O(1)); 列表按需生成
+        self._active = dict.fromkeys(agents)
+        self._agents = None
+
+    @property
+    def num_agents(self):
+        return len(self._active)
+
+    def _remove_agents(self, agents):
+        for agent in agents:
+            del self._active[agent]
+        if agents:
+            self._agents = None
+
+    def _array_obs_space(self):
+        """和 OBS_INDEX 布局对应的 Box 空间"""
+        low = np.zeros(OBS_SIZE, dtype=np.int32)
+        high = np.empty(OBS_SIZE, dtype=np.int32)
+        high[OBS_HEALTH] = AGENT_MAX_HEALTH
+        high[OBS_STATE] = 1
+        high[OBS_INVENTORY] = np.iinfo(np.int32).max # 背包没有上限
+        high[OBS_WEAPONS] = self.max_weapon_level
+        high[OBS_BOSS_HEALTH] = math.ceil(max(self.tables.boss_hp_list))
+        return Box(low=low, high=high, shape=(OBS_SIZE,), dtype=np.int32)
 
     def _get_obs(self, agent):
-        """ParallelEnv 的观察函数"""
-        battle_hp = 0
-        if self.agent_states[agent] == "BATTLE":
-            battle_hp = self.battle_instances[agent]["health"]
+        """ParallelEnv 的观察函数 (所有字段完整重建, 同时刷新增量观察的缓存)"""
+        in_battle = self.agent_states[agent] == "BATTLE"
+        # 背包/武器存的是副本, 避免调用方拿到 (并修改) env 内部的字典
+        fields = [
+            self.agent_healths[agent],
+            1 if in_battle else 0,
+            dict(self.agent_inventories[agent]),
+            dict(self.agent_weapons[agent]),
+            self.battle_instances[agent].health if in_battle else 0,
+        ]
+        self._obs_cache[agent] = fields
+        self._update_mask(agent)
+        return self._format_obs(agent, fields, DIRTY_ALL)
 
+    def _step_obs(self, agent):
+        """
+        step 返回的观察: 只重建这一步 dirty 的字段, 没变的字段沿用上一次的值。
+        注意: 没有变化的背包/武器字典和上一步观察里的是同一个对象, 请不要原地修改。
+        """
+        dirty = self._dirty.get(agent, 0)
+        fields = self._obs_cache.get(agent)
+        if fields is None: # set_state 之后第一次
+            self._get_obs(agent)
+            fields = self._obs_cache[agent]
+            dirty = DIRTY_ALL
+        elif dirty:
+            if dirty & DIRTY_HEALTH: fields[0] = self.agent_healths[agent]
+            if dirty & DIRTY_STATE: fields[1] = 1 if self.agent_states[agent] == "BATTLE" else 0
+            if dirty & DIRTY_INVENTORY: fields[2] = dict(self.agent_inventories[agent])
+            if dirty & DIRTY_WEAPONS: fields[3] = dict(self.agent_weapons[agent])
+            if dirty & DIRTY_BOSS_HEALTH:
+                fields[4] = self.battle_instances[agent].health if self.agent_states[agent] == "BATTLE" else 0
+            if dirty & DIRTY_MASK: self._update_mask(agent, dirty)
+        if self.delta_obs:
+            return self._delta(agent, dirty)
+        if self.obs_format == "array":
+            return self._write_obs_row(agent, fields, dirty)
         return {
-            "my_health": self.agent_healths[agent],
-            "my_state": 1 if self.agent_states[agent] == "BATTLE" else 0,
-            "my_inventory": self.agent_inventories[agent],
-            "my_weapons": self.agent_weapons[agent],
-            "battle_boss_health": battle_hp
+            "my_health": fields[0],
+            "my_state": fields[1],
+            "my_inventory": fields[2],
+            "my_weapons": fields[3],
+            "battle_boss_health": fields[4]
         }
 
+    def _delta(self, agent, dirty):
+        """dirty 的字段 {字段名: 值}"""
+        fields = self._obs_cache[agent]
+        return {name: fields[i] for i, name in enumerate(OBS_FIELDS) if dirty >> i & 1}
+
+    def _format_obs(self, agent, fields, dirty):
+        if self.obs_format == "array":
+            return self._write_obs_row(agent, fields, dirty)
+        return {
+            "my_health": fields[0],
+            "my_state": fields[1],
+            "my_inventory": fields[2],
+            "my_weapons": fields[3],
+            "battle_boss_health": fields[4]
+        }
+
+    def _write_obs_row(self, agent, fields, dirty):
+        """
+        把 agent 观察里 dirty 的字段写进 obs_buffer 的对应行, 并返回这一行 (零拷贝视图)。
+        注意: 下一次 step/reset 会原地覆盖这一行, 需要保留的话请自行 .copy()。
+        """
+        row = self._obs_rows[agent]
+        if dirty & DIRTY_HEALTH: row[OBS_HEALTH] = fields[0]
+        if dirty & DIRTY_STATE: row[OBS_STATE] = fields[1]
+        if dirty & DIRTY_INVENTORY: row[OBS_INVENTORY] = list(fields[2].values())
+        if dirty & DIRTY_WEAPONS: row[OBS_WEAPONS] = list(fields[3].values())
+        if dirty & DIRTY_BOSS_HEALTH: row[OBS_BOSS_HEALTH] = math.ceil(fields[4])
+        return row
+
+    def _intern_mask(self, bits):
+        """按位编码的掩码 (第 i 位 = 动作 i) -> 共用的只读 int8 数组"""
+        array = self._mask_arrays.get(bits)
+        if array is None:
+            n_actions = self.action_spaces[self.possible_agents[0]].n
+            array = np.array([bits >> i & 1 for i in range(n_actions)], dtype=np.int8)
+            array.flags.writeable = False
+            self._mask_arrays[bits] = array
+        return array
+
+    def _update_mask(self, agent, dirty=DIRTY_ALL):
+        """
+        按 agent 现在的状态更新它的合法动作掩码 (dirty: 这一步改过的字段, 没改背包/武器就不用重算世界中的掩码):
+          世界中: 闲置; 打得动的 Boss (final_boss 需要一把满级武器, 否则 0 伤害); 材料够而且没满级的升级
+          战斗中: 闲置和攻击 (任何非 0 动作都是攻击, 只保留这场战斗的 Boss 对应的那一个)
+        """
+        if self.agent_states[agent] == "BATTLE":
+            mask = self._battle_masks[self.battle_instances[agent].boss]
+        elif dirty & (DIRTY_INVENTORY | DIRTY_WEAPONS) or agent not in self._world_masks:
+            levels = self.agent_weapons[agent].values()
+            inventory = self.agent_inventories[agent]
+            bits = self._world_mask_base[self.max_weapon_level in levels]
+            for recipes, level, bit in zip(self._next_recipes, levels, self._upgrade_bits):
+                recipe = recipes[level]
+                if recipe is None: continue
+                for stone, amount in recipe:
+                    if inventory[stone] < amount: break
+                else:
+                    bits |= bit
+            mask = self._world_masks[agent] = self._intern_mask(bits)
+        else:
+            mask = self._world_masks[agent]
+        self._masks[agent] = mask
+        if self._mask_rows is not None:
+            self._mask_rows[agent][:] = mask
+        return mask
+
+    def action_mask(self, agent):
+        """agent 当前的合法动作掩码 (只读的 int8 数组, 长度 = 动作数; 1 = 这个动作在当前状态下有效果)"""
+        return self._masks[agent]
+
+    def observe(self, agent):
+        """
+        agent 当前的完整观察 (格式同 obs_format; delta_obs 模式下用来重新同步)。
+        按当前状态完整重建, 所以这一步刚结束 (不在 agents 里) 的 agent 也能拿到最后的观察。
+        """
+        return self._get_obs(agent)
+
     def reset(self, seed=None, options=None):
         # 重置所有 Agent
-        self.agents = self.possible_agents[:]
-        self.agent_healths = {agent: AGENT_MAX_HEALTH for agent in self.agents}
-        self.agent_inventories = {agent: {stone: 0 for stone in STONE_NAMES} for agent in self.agents}
-        self.agent_weapons = {agent: {weapon: 0 for weapon in self.weapon_names} for agent in self.agents}
-        self.agent_states = {agent: "WORLD" for agent in self.agents}
-        self.battle_instances = {}
+        agents = self.possible_agents
+        self.agents = agents
+        self.agent_healths = dict.fromkeys(agents, AGENT_MAX_HEALTH)
+        self.agent_inventories = {agent: dict.fromkeys(self.stone_names, 0) for agent in agents}
+        self.agent_weapons = {agent: dict.fromkeys(self.weapon_names, 0) for agent in agents}
+        self.agent_states = dict.fromkeys(agents, "WORLD")
+        self._release_battles()
+        self._dirty.clear()
+        self._obs_cache.clear()
+        self._world_masks.clear()
         self.current_step = 0
+        self.agent_steps = dict.fromkeys(agents, 0)
+        self._loot_rng = BlockUniforms(seed)
+        self.np_random = self._loot_rng.generator
 
         # ParallelEnv reset 返回一个 obs 字典
         observations = {agent: self._get_obs(agent) for agent in self.agents}
-        infos = {agent: {} for agent in self.agents}
+        if self.delta_obs:
+            observations = {agent: self._delta(agent, DIRTY_ALL) for agent in observations}
+        infos = {agent: {"action_mask": self._masks[agent]} for agent in self.agents}
+        if self.recorder is not None:
+            self.recorder.start_episode()
         return observations, infos
 
+    def get_state(self):
+        """
+        整个世界的快照: 一维 uint8 数组, 格式见 env_state.py。
+        可以直接写进文件当 checkpoint, 之后用 set_state 恢复 (结果逐步一致)。
+        """
+        views = self._state_views
+        agents = self.possible_agents
+        alive = self._active
+        battles = [self.battle_instances[agent] if self.agent_states[agent] == "BATTLE" else None for agent in agents]
+
+        # 先拼成 Python 列表, 每个字段只写一次
+        views["current_step"][0] = self.current_step
+        views["agent_steps"][0] = [self.agent_steps[agent] if self.fast_forward else self.current_step for agent in agents]
+        views["active"][0] = [agent in alive for agent in agents]
+        views["agent_healths"][0] = [self.agent_healths[agent] for agent in agents]
+        views["agent_inventories"][0] = [list(self.agent_inventories[agent].values()) for agent in agents]
+        views["agent_weapons"][0] = [list(self.agent_weapons[agent].values()) for agent in agents]
+        views["agent_states"][0] = [battle is not None for battle in battles]
+        views["battle_boss"][0] = [-1 if battle is None else battle.boss for battle in battles]
+        views["battle_health"][0] = [0 if battle is None else battle.health for battle in battles]
+        views["rng_block"][0] = 0
+        views["rng_pos"][0] = self._loot_rng.get_state(views["rng_block"][0], views["rng_words"][0])
+        return self._state.copy()
+
+    def set_state(self, state):
+        """恢复 get_state() 的结果 (state 也可以是它的 bytes)"""
+        self._state[:] = self._state_layout.check(state)
+        views = self._state_views
+        agents = self.possible_agents
+        # 每个字段一次 tolist(), 再一次性重建字典
+        active = views["active"][0].tolist()
+        in_battle = views["agent_states"][0].tolist()
+        battle_boss = views["battle_boss"][0].tolist()
+        battle_health = views["battle_health"][0].tolist()
+
+        self.current_step = int(views["current_step"][0])
+        self.agent_steps = dict(zip(agents, views["agent_steps"][0].tolist()))
+        self.agents = [agent for agent, alive in zip(agents, active) if alive]
+        self.agent_healths = dict(zip(agents, views["agent_healths"][0].tolist()))
+        self.agent_inventories = {agent: dict(zip(self.stone_names, inventory))
+                                  for agent, inventory in zip(agents, views["agent_inventories"][0].tolist())}
+        self.agent_weapons = {agent: dict(zip(self.weapon_names, weapons))
+                              for agent, weapons in zip(agents, views["agent_weapons"][0].tolist())}
+        self.agent_states = {agent: "BATTLE" if battle else "WORLD" for agent, battle in zip(agents, in_battle)}
+        self._release_battles()
+        # 缓存的观察全部作废, 下一次 step 时重建
+        self._dirty.clear()
+        self._obs_cache.clear()
+        self._world_masks.clear()
+        for agent, battle, boss_idx, health in zip(agents, in_battle, battle_boss, battle_health):
+            if battle:
+                # 快照里血量是 float64; 整数值还原成 int, 和刚创建的副本一致 (数值本身不变)
+                if health.is_integer(): health = int(health)
+                self._acquire_battle(agent, boss_idx, health)
+        for agent in agents:
+            self._update_mask(agent)
+        self._loot_rng.set_state(views["rng_block"][0], int(views["rng_pos"][0]), views["rng_words"][0])
+
+    def _emit(self, kind, **data):
+        """记录一个事件 (调用方先检查 self._verbose)"""
+        if self.verbosity == "human":
+            print(EVENT_TEMPLATES[kind].format(**data))
+        else:
+            self.event_log.append(Event(self.current_step, kind, data))
+
+    # --- 战斗副本对象池 ---
+    def _acquire_battle(self, agent, boss_idx, health):
+        battle = self._battle_pool.pop() if self._battle_pool else BattleInstance()
+        battle.type = self.boss_names[boss_idx]
+        battle.boss = boss_idx
+        battle.health = health
+        self.battle_instances[agent] = battle
+        return battle
+
+    def _release_battle(self, agent):
+        self._battle_pool.append(self.battle_instances.pop(agent))
+
+    def _release_battles(self):
+        self._battle_pool.extend(self.battle_instances.values())
+        self.battle_instances.clear()
+
     # --- Boss 战斗的核心逻辑 ---
     def _create_battle_instance(self, agent, boss_name):
         """创建一个崭新的 '副本' Boss"""
         if self.agent_states[agent] == "WORLD":
-            print(f"  > {agent} 开始挑战 {boss_name}!")
+            if self._verbose: self._emit("battle_start", agent=agent, boss=boss_name)
             self.agent_states[agent] = "BATTLE"
-            self.battle_instances[agent] = {
-                "type": boss_name,
-                "health": BOSS_DATA[boss_name][0]
-            }
+            self._dirty[agent] = self._dirty.get(agent, 0) | DIRTY_STATE | DIRTY_BOSS_HEALTH
+            boss_idx = self._boss_index[boss_name]
+            self._acquire_battle(agent, boss_idx, self.tables.boss_hp_list[boss_idx])
     
     def _resolve_battle_loss(self, agent):
-        """Agent 死亡，满血复活，Boss 副本被删除"""
-        print(f"--- {agent} 死亡! 满血复活. ---")
+        """Agent 死亡，满血复活，Boss 副本被回收"""
+        if self._verbose: self._emit("death", agent=agent)
         self.agent_healths[agent] = AGENT_MAX_HEALTH
         self.agent_states[agent] = "WORLD"
-        del self.battle_instances[agent]
+        self._dirty[agent] = self._dirty.get(agent, 0) | DIRTY_HEALTH | DIRTY_STATE | DIRTY_BOSS_HEALTH
+        self._release_battle(agent)
         return 0 # 死亡没有奖励
         
     def _resolve_battle_win(self, agent, battle):
-        """Boss 死亡，掉落，Boss 副本被删除"""
-        boss_name = battle["type"]
-        print(f"*** {boss_name} 被 {agent} 击败! ***")
+        """Boss 死亡，掉落，Boss 副本被回收"""
+        boss_idx = battle.boss
+        if self._verbose: self._emit("boss_defeated", agent=agent, boss=battle.type)
         
         # 1. 获得战利品
-        loot = self._roll_loot(boss_name)
+        loot = self._roll_loot(boss_idx)
         for item, amount in loot.items():
             self.agent_inventories[agent][item] += amount
         
         # 2. 离开战斗
         self.agent_states[agent] = "WORLD"
-        del self.battle_instances[agent]
+        self._dirty[agent] = self._dirty.get(agent, 0) | DIRTY_STATE | DIRTY_INVENTORY | DIRTY_BOSS_HEALTH
+        self._release_battle(agent)
         
         # 3. 检查是否是最终胜利
-        if boss_name == "final_boss":
-            return 10000 # 巨大胜利奖励
+        if boss_idx == self.tables.final_boss:
+            return REWARD_FINAL_BOSS # 巨大胜利奖励
         else:
-            return 100 # 普通击杀奖励
+            return REWARD_KILL # 普通击杀奖励
 
     # --- 战斗计算 ---
-    def _roll_loot(self, boss_name):
-        loot = {stone: 0 for stone in STONE_NAMES}
-        for item, prob, amount in LOOT_TABLES[boss_name]:
-            if random.random() < prob: loot[item] += amount
-        print(f"  > Boss {boss_name} 掉落了: {loot}")
+    def _roll_loot(self, boss_idx):
+        stone_names = self.tables.stone_names
+        loot = {stone: 0 for stone in stone_names}
+        entries = self.tables.loot[boss_idx]
+        # 每次击杀只取一次随机数: 掉落表的每个条目用一个均匀数
+        for (item, prob, amount), u in zip(entries, self._loot_rng.take(len(entries))):
+            if u < prob: loot[stone_names[item]] += amount
+        if self._verbose: self._emit("loot", boss=self.boss_names[boss_idx], loot=loot)
         return loot
 
-    def _calculate_damage(self, agent, boss_name):
-        agent_weapon_levels = self.agent_weapons[agent]
-        total_damage = 1 
-        if boss_name == "final_boss":
-            has_max_weapon = any(level == MAX_WEAPON_LEVEL for level in agent_weapon_levels.values())
-            if not has_max_weapon: return 0 
-        
-        active_weapons = [(name, lvl) for name, lvl in agent_weapon_levels.items() if lvl > 0]
-        if not active_weapons: return total_damage
-        
-        weapon_name, level = active_weapons[0]
-        base_dmg = WEAPON_DATA[weapon_name][0]
-        upgrade_dmg = UPGRADE_DAMAGE[level]
+    def _calculate_damage(self, agent, boss_idx):
+        agent_weapon_levels = self.agent_weapons[agent].values()
+        if self.tables.requires_max_weapon[boss_idx]:
+            if self.max_weapon_level not in agent_weapon_levels: return 0
 
-        weapon_attr = WEAPON_DATA[weapon_name][1]
-        boss_attr = BOSS_DATA[boss_name][1]
-        attr_multiplier = ATTR_MATRIX[weapon_attr][boss_attr]
-        total_damage = (base_dmg + upgrade_dmg) * attr_multiplier
-        return total_damage
+        # 只有第一把等级 > 0 的武器生效: 直接查伤害表 [武器, 等级, Boss]
+        for weapon_idx, level in enumerate(agent_weapon_levels):
+            if level > 0:
+                return self.tables.damage_list[weapon_idx][level][boss_idx]
+        return FIST_DAMAGE
 
     def _handle_craft_or_upgrade(self, agent, weapon_name):
         current_level = self.agent_weapons[agent][weapon_name]
-        if current_level == MAX_WEAPON_LEVEL: return 0 
+        if current_level == self.max_weapon_level: return 0 
         next_level = current_level + 1
-        costs = UPGRADE_COSTS[next_level]
-        can_afford = True
+        # 成本表已经把 "attribute_stone" 展开成了具体的石头
+        recipe = self.tables.recipes[self._weapon_index[weapon_name]][next_level]
         inventory = self.agent_inventories[agent]
-        weapon_attr = WEAPON_DATA[weapon_name][1]
-        for material, amount in costs.items():
-            if material == "attribute_stone":
-                attr_stone_name = f"{weapon_attr}_stone"
-                if inventory[attr_stone_name] < amount: can_afford = False; break
-            elif inventory[material] < amount: can_afford = False; break
+        can_afford = True
+        for stone, amount in recipe:
+            if inventory[stone] < amount: can_afford = False; break
         if can_afford:
-            for material, amount in costs.items():
-                if material == "attribute_stone":
-                    attr_stone_name = f"{weapon_attr}_stone"
-                    inventory[attr_stone_name] -= amount
-                else: inventory[material] -= amount
+            for stone, amount in recipe:
+                inventory[stone] -= amount
             self.agent_weapons[agent][weapon_name] = next_level
-            print(f"  > {agent} 成功将 {weapon_name} 升级到 Lv.{next_level}!")
-            return 50 
+            self._dirty[agent] = self._dirty.get(agent, 0) | DIRTY_INVENTORY | DIRTY_WEAPONS
+            if self._verbose: self._emit("upgrade", agent=agent, weapon=weapon_name, level=next_level)
+            return REWARD_UPGRADE
         else:
-            print(f"  > {agent} 尝试升级 {weapon_name}, 但材料不足.")
+            if self._verbose: self._emit("upgrade_failed", agent=agent, weapon=weapon_name)
             return 0 
 
     # --- 并行 Step 函数 ---
     def step(self, actions):
+        if self.recorder is None:
+            return self._step_fast_forward(actions) if self.fast_forward else self._step(actions)
+        acting, steps, rows = self._begin_record(actions)
+        result = self._step_fast_forward(actions) if self.fast_forward else self._step(actions)
+        self._end_record(acting, steps, rows, actions, result[1], result[2])
+        return result
+
+    def _step(self, actions):
+        """
+        只处理 actions 里的 agent (按 actions 的顺序), 返回的字典也只包含它们:
+        没有提交动作的 agent 这一步什么都不做, 开销和它们的数量无关。
+        """
         
         # ParallelEnv 接收一个动作字典, 返回四个字典
         observations = {}
@@ -180,13 +587,15 @@ class RpgEnv(ParallelEnv): # ParallelEnv
         terminations = {}
         truncations = {}
         infos = {}
+        active = self._active
+        dirty = self._dirty
+        finished = []
 
         self.current_step += 1
 
-        # 1. 循环处理每个 agent 的动作
-        for agent in self.agents:
-            action = actions.get(agent) # 获取这个 agent 的动作
-            if action is None:
+        # 1. 循环处理每个提交了动作的 agent
+        for agent, action in actions.items():
+            if action is None or agent not in active:
                 continue # Agent 已经结束, 跳过
 
             step_reward = 0
@@ -199,7 +608,7 @@ class RpgEnv(ParallelEnv): # ParallelEnv
             if self.agent_states[agent] == "WORLD":
                 # --- Agent 在“世界”中 ---
                 if action == 0: # 闲置
-                    print(f"  > {agent} [World] 闲置...")
+                    if self._verbose: self._emit("idle", agent=agent)
                     
                 elif 1 <= action <= len(self.boss_names): # 尝试开始战斗
                     boss_name = self.boss_names[action - 1]
@@ -212,33 +621,37 @@ class RpgEnv(ParallelEnv): # ParallelEnv
             elif self.agent_states[agent] == "BATTLE":
                 # --- Agent 在“战斗”中 ---
                 battle = self.battle_instances[agent]
-                boss_name = battle["type"]
+                boss_name = battle.type
+                boss_idx = battle.boss
                 
                 if action > 0: # 简化：任何非闲置动作都是“攻击”
                     # 1. Agent 攻击 Boss
-                    damage = self._calculate_damage(agent, boss_name)
-                    battle["health"] -= damage
-                    print(f"  > {agent} [Battle] 攻击 {boss_name}, 造成 {damage:.0f} 伤害. 剩余 HP: {battle['health']:.0f}")
+                    damage = self._calculate_damage(agent, boss_idx)
+                    battle.health -= damage
+                    dirty[agent] = dirty.get(agent, 0) | DIRTY_BOSS_HEALTH
+                    if self._verbose: self._emit("attack", agent=agent, boss=boss_name, damage=damage, boss_health=battle.health)
                     
-                    if battle["health"] <= 0:
+                    if battle.health <= 0:
                         # --- 胜利逻辑在这里！ ---
                         step_reward = self._resolve_battle_win(agent, battle)
                         
                         # 检查这是否是最终的胜利
-                        if boss_name == "final_boss":
-                            print(f"*** {agent} 击败了最终Boss! ***")
+                        if boss_idx == self.tables.final_boss:
+                            if self._verbose: self._emit("final_victory", agent=agent)
                             terminations[agent] = True # 在这里设置
+                            finished.append(agent)
                     else:
                         # 2. Boss 反击 (如果会反击)
-                        boss_retaliation_dmg = BOSS_DATA[boss_name][2]
+                        boss_retaliation_dmg = self.tables.boss_retaliation_list[boss_idx]
                         if boss_retaliation_dmg > 0:
                             self.agent_healths[agent] -= boss_retaliation_dmg
-                            print(f"  > {boss_name} 反击 {agent}, 造成 {boss_retaliation_dmg} 伤害.")
+                            dirty[agent] |= DIRTY_HEALTH
+                            if self._verbose: self._emit("retaliation", agent=agent, boss=boss_name, damage=boss_retaliation_dmg)
                             if self.agent_healths[agent] <= 0:
                                 # 失败
                                 step_reward = self._resolve_battle_loss(agent)
                 else: # Action == 0 (闲置/逃跑)
-                    print(f"  > {agent} [Battle] 闲置...")
+                    if self._verbose: self._emit("battle_idle", agent=agent)
             
             # --- 3. 奖励和胜利检查 ---
             rewards[agent] = step_reward
@@ -246,19 +659,20 @@ class RpgEnv(ParallelEnv): # ParallelEnv
         # --- 4. 检查超时 ---
         truncated = self.current_step >= AGENT_MAX_STEPS
         if truncated:
-            print(f"--- 达到最大步数 {AGENT_MAX_STEPS}, 游戏超时 ---")
-            self.agents = [] # 超时后, 移除所有 agents
-        
-        # 5. ParallelEnv: 移除 "dead" (terminated) agents
-        for agent in list(self.agents): # (迭代一个副本)
-            if terminations.get(agent, False):
-                self.agents.remove(agent)
-
-        # 6. 为所有 *仍然存活* 的 agent 准备返回值
-        for agent in self.agents:
-            observations[agent] = self._get_obs(agent)
+            if self._verbose: self._emit("truncated", max_steps=AGENT_MAX_STEPS)
+            self._remove_agents(list(active)) # 超时后, 移除所有 agents
+        else:
+            # 5. ParallelEnv: 移除 "dead" (terminated) agents (O(1) 删除)
+            self._remove_agents(finished)
+
+        # 6. 为这一步行动过且 *仍然存活* 的 agent 准备返回值 (只重建改过的字段)
+        for agent in rewards:
+            if agent not in active:
+                continue
+            observations[agent] = self._step_obs(agent)
             truncations[agent] = truncated # (新) 广播 truncated 状态
-            infos[agent] = {}
+            infos[agent] = {"action_mask": self._masks[agent]}
+        dirty.clear()
         
         if self.render_mode == "human":
             self.render()
@@ -266,11 +680,165 @@ class RpgEnv(ParallelEnv): # ParallelEnv
         # ParallelEnv 返回 5 个字典
         return observations, rewards, terminations, truncations, infos
 
+    def _step_fast_forward(self, actions):
+        """
+        fast_forward 模式的 step: 和普通 step 规则相同, 但开始战斗的 agent 会在这一次调用里一直攻击,
+        直到战斗结束 (胜利 / 死亡 / 超时), 攻击次数按公式直接算出来。
+        和 _step 一样只处理 (也只返回) actions 里的 agent。
+
+        每个 agent 有自己的步数时钟 agent_steps: 一个动作 1 步, 战斗再加上攻击次数,
+        超过 AGENT_MAX_STEPS 的 agent 单独超时 (current_step = 所有 agent 时钟的最大值)。
+        奖励和掉落与逐步攻击完全相同; 非 silent 模式下每一次攻击的事件也照常记录 (带各自的步数)。
+        """
+        observations = {}
+        rewards = {}
+        terminations = {}
+        truncations = {}
+        infos = {}
+        n_bosses = len(self.boss_names)
+        active = self._active
+        acting = []
+        # 时钟只会往前走, current_step 可以边走边取最大值
+        latest = self.current_step
+
+        for agent, action in actions.items():
+            if action is None or agent not in active:
+                continue
+            acting.append(agent)
+
+            # 事件按这个 agent 自己的时钟记录; 已经在战斗中 (例如从快照恢复) 的 agent 这一步就是下一次攻击
+            in_battle = self.agent_states[agent] == "BATTLE"
+            self.current_step = self.agent_steps[agent] + (0 if in_battle and action > 0 else 1)
+            step_reward = 0
+            terminations[agent] = False
+
+            if in_battle:
+                # 和 _step 一样: 战斗中任何非 0 动作都是攻击 (接着打到结束), 0 是战斗中闲置
+                if action > 0:
+                    step_reward, terminations[agent] = self._fight_to_resolution(agent)
+                elif self._verbose:
+                    self._emit("battle_idle", agent=agent)
+            elif action == 0: # 闲置
+                if self._verbose: self._emit("idle", agent=agent)
+            elif 1 <= action <= n_bosses: # 开始战斗, 直接打到结束
+                self._create_battle_instance(agent, self.boss_names[action - 1])
+                step_reward, terminations[agent] = self._fight_to_resolution(agent)
+            elif action < n_bosses + 1 + len(self.weapon_names):
+                weapon_name = self.weapon_names[action - (n_bosses + 1)]
+                step_reward = self._handle_craft_or_upgrade(agent, weapon_name)
+
+            self.agent_steps[agent] = self.current_step
+            if self.current_step > latest: latest = self.current_step
+            rewards[agent] = step_reward
+
+        self.current_step = latest
+
+        truncated = [agent for agent in acting
+                     if not terminations[agent] and self.agent_steps[agent] >= AGENT_MAX_STEPS]
+        if truncated and self._verbose: self._emit("truncated", max_steps=AGENT_MAX_STEPS)
+        for agent in truncated:
+            observations[agent] = self._step_obs(agent)
+            truncations[agent] = True
+            infos[agent] = {"action_mask": self._masks[agent]}
+        self._remove_agents(truncated)
+        self._remove_agents([agent for agent in acting if terminations[agent]])
+
+        for agent in acting:
+            if agent not in active:
+                continue
+            observations[agent] = self._step_obs(agent)
+            truncations[agent] = False
+            infos[agent] = {"action_mask": self._masks[agent]}
+        self._dirty.clear()
+
+        if self.render_mode == "human":
+            self.render()
+
+        return observations, rewards, terminations, truncations, infos
+
+    def _fight_to_resolution(self, agent):
+        """
+        从 self.current_step (进入战斗的那一步) 开始一直攻击, 返回 (奖励, 是否 terminated)。
+        第 i 次攻击发生在 current_step + i; 打死 Boss 的那一击之后没有反击。
+        """
+        battle = self.battle_instances[agent]
+        boss_idx = battle.boss
+        boss_name = battle.type
+        damage = self._calculate_damage(agent, boss_idx)
+        retaliation = self.tables.boss_retaliation_list[boss_idx]
+        available = AGENT_MAX_STEPS - self.current_step # 超时之前还能攻击几次
+        self._dirty[agent] = self._dirty.get(agent, 0) | DIRTY_HEALTH | DIRTY_BOSS_HEALTH
+
+        hits_to_win = math.ceil(battle.health / damage) if damage > 0 else None
+        hits_to_die = math.ceil(self.agent_healths[agent] / retaliation) if retaliation > 0 else None
+
+        if hits_to_win is not None and hits_to_win <= available and (hits_to_die is None or hits_to_win <= hits_to_die):
+            outcome, hits = "win", hits_to_win
+        elif hits_to_die is not None and hits_to_die <= available:
+            outcome, hits = "death", hits_to_die
+        else:
+            outcome, hits = "truncated", available
+
+        if self._verbose or outcome == "truncated":
+            # 逐次攻击 (记录事件 / 超时时留下和逐步攻击一样的 Boss 血量)
+            for _ in range(hits):
+                self.current_step += 1
+                battle.health -= damage
+                if self._verbose: self._emit("attack", agent=agent, boss=boss_name, damage=damage, boss_health=battle.health)
+                if battle.health > 0 and retaliation > 0:
+                    self.agent_healths[agent] -= retaliation
+                    if self._verbose: self._emit("retaliation", agent=agent, boss=boss_name, damage=retaliation)
+        else:
+            self.current_step += hits
+            # 胜利的那一击之后没有反击
+            self.agent_healths[agent] -= (hits - 1 if outcome == "win" else hits) * retaliation
+
+        if outcome == "win":
+            reward = self._resolve_battle_win(agent, battle)
+            if boss_idx == self.tables.final_boss:
+                if self._verbose: self._emit("final_victory", agent=agent)
+                return reward, True
+            return reward, False
+        if outcome == "death":
+            return self._resolve_battle_loss(agent), False
+        return 0, False
+
+    def _begin_record(self, actions):
+        """记下这一步要行动的 agent, 它们的步数和行动前的观察 (obs_format="array" 的布局)"""
+        active = self._active
+        acting = [agent for agent, action in actions.items() if action is not None and agent in active]
+        # 布局同 OBS_INDEX (Python 列表, 记录器 flush 时才整段转换成数组)
+        rows = []
+        for agent in acting:
+            in_battle = self.agent_states[agent] == "BATTLE"
+            rows.append([self.agent_healths[agent], 1 if in_battle else 0,
+                         *self.agent_inventories[agent].values(), *self.agent_weapons[agent].values(),
+                         math.ceil(self.battle_instances[agent].health) if in_battle else 0])
+        if self.fast_forward:
+            steps = [self.agent_steps[agent] + 1 for agent in acting]
+        else:
+            steps = [self.current_step + 1] * len(acting)
+        return acting, steps, rows
+
+    def _end_record(self, acting, steps, rows, actions, rewards, terminations):
+        alive = self._active
+        terminated = [terminations.get(agent, False) for agent in acting]
+        self.recorder.append(
+            step=steps,
+            agent=[self._agent_index[agent] for agent in acting],
+            obs=rows,
+            action=[actions[agent] for agent in acting],
+            reward=[rewards.get(agent, 0) for agent in acting],
+            terminated=terminated,
+            # 没有 terminated 但已经不在 agents 里 = 这一步超时
+            truncated=[agent not in alive and not done for agent, done in zip(acting, terminated)],
+        )
+
     def render(self):
         if self.render_mode == "human":
             print(f"--- 步骤: {self.current_step} ---")
             for agent in self.possible_agents:
-                if agent not in self.agents: 
+                if agent not in self._active: 
                     print(f"  Agent: {agent} (已结束)")
                     continue
                 
@@ -280,7 +848,7 @@ class RpgEnv(ParallelEnv): # ParallelEnv
                 # 打印战斗信息
                 if self.agent_states[agent] == "BATTLE":
                     battle = self.battle_instances[agent]
-                    print(f"    IN BATTLE vs {battle['type']} (HP: {battle['health']:.0f})")
+                    print(f"    IN BATTLE vs {battle.type} (HP: {battle.health:.0f})")
                 
                 # 打印背包
                 inv = {k:v for k,v in self.agent_inventories[agent].items() if v > 0}
@@ -297,13 +865,13 @@ class RpgEnv(ParallelEnv): # ParallelEnv
                     # 循环 agent 拥有的所有武器
                     for weapon_name, level in agent_weps.items():
                         if level > 0:
-                            # 从导入的 WEAPON_DATA 中查询属性
-                            # WEAPON_DATA[weapon_name] -> (基础伤害, 属性)
-                            attribute = WEAPON_DATA[weapon_name][1]
+                            # 从编译好的 config 表中查询属性
+                            attribute = self.tables.weapon_attrs[self._weapon_index[weapon_name]]
                             
                             # 打印详细信息
                             print(f"      - {weapon_name}: (Level {level}, Attr: {attribute})")
                 # --- 详细打印结束 ---
 
     def close(self):
-        pass # 日志记录功能已被移除
\ No newline at end of file
+        if self.recorder is not None:
+            self.recorder.close()
\ No newline at end of file
@@ -1,8 +1,81 @@
 import os
+import time
+import asyncio
+import argparse
+import itertools
 from .rpg_env import RpgEnv
-from .llm_agent import LLMAgent # (新) 导入我们的 LLM 大脑
+from .llm_agent import LLMAgent, PROMPT_PROFILES, summarize_usage # (新) 导入我们的 LLM 大脑
+from .fake_llm import FakeGenerativeModel
+from .llm_client import LLMClient, RateLimiter, CircuitBreaker
+from .planner import PlannerAgent
+from .decision_router import RuleRouter, summarize_routes
+from .speculation import ShadowPredictor, same_observation
+from .decision_cache import DecisionCache
+from .joint_llm_controller import JointLLMController
+from .trajectory import TrajectoryRecorder
+from .profiler import Profiler, export_profile
 
-def run_llm_simulation():
+def _create_brains(env, model_factory=None, cache=None, agent_kwargs=None, client_factory=None):
+    """
+    为每个 agent 创建一个“大脑” (model_factory() 返回模型对象, 不传则用 Gemini)
+    cache: 所有大脑共享的 DecisionCache (可选)
+    agent_kwargs: 传给 LLMAgent 的其它参数 (例如 prompt_profile, include_thought, fallback)
+    client_factory: client_factory(model) -> LLMClient (可选, 见 make_client_factory)
+    """
+    agent_kwargs = agent_kwargs or {}
+    if model_factory is None:
+        if client_factory is None:
+            return {agent_id: LLMAgent(cache=cache, **agent_kwargs) for agent_id in env.possible_agents}
+        model_factory = LLMAgent._create_gemini_model
+    brains = {}
+    for agent_id in env.possible_agents:
+        model = model_factory()
+        client = client_factory(model) if client_factory is not None else None
+        brains[agent_id] = LLMAgent(model=model, cache=cache, client=client, **agent_kwargs)
+    return brains
+
+def make_client_factory(requests_per_minute=None, tokens_per_minute=None, max_retries=3, deadline_s=30.0,
+                        breaker_threshold=5, breaker_recovery_s=30.0, profiler=None):
+    """每个模型一个 LLMClient, 所有 client 共用同一个限流器 (配额是整个 API Key 的) 和熔断器"""
+    limiter = RateLimiter(requests_per_minute, tokens_per_minute) if requests_per_minute or tokens_per_minute else None
+    breaker = CircuitBreaker(breaker_threshold, breaker_recovery_s)
+    return lambda model: LLMClient(model, limiter=limiter, breaker=breaker, max_retries=max_retries,
+                                   deadline_s=deadline_s, profiler=profiler)
+
+def _print_client_stats(clients, fallbacks):
+    """打印所有 LLMClient 的重试/限流/熔断计数 (汇总) 和回退次数"""
+    clients = [client for client in clients if client is not None]
+    if not clients:
+        return
+    stats = {name: sum(client.stats[name] for client in clients) for name in clients[0].stats}
+    stats["wait_s"] = round(stats["wait_s"], 3)
+    breaker = clients[0].breaker
+    if breaker is not None:
+        stats["breaker_opens"] = breaker.opens
+    print(f"--- [LLM 调用层] {stats}, 回退 {fallbacks} 次 ---")
+
+def _print_route_stats(brains):
+    """打印每个决策层级 (规则 / 决策缓存 / LLM / fallback) 做出的决策占比"""
+    summary = summarize_routes([brain.routes for brain in brains])
+    fractions = ", ".join(f"{tier} {fraction:.1%}" for tier, fraction in summary["fractions"].items())
+    print(f"--- [决策分层] {summary['decisions']} 次决策: {fractions} ---")
+    router = brains[0].router
+    if router is not None:
+        print(f"--- [规则命中] {router.counts} ---")
+
+def _print_run_stats(brains, cache):
+    """打印 token 用量 (所有大脑汇总) 和缓存命中情况, 返回用量汇总"""
+    profile = next(iter(brains.values())).prompt_version
+    usage = summarize_usage([record for brain in brains.values() for record in brain.usage])
+    print(f"--- [Token 用量 {profile}] {usage} ---")
+    if cache is not None:
+        print(f"--- [决策缓存] {cache.stats()} ---")
+    _print_client_stats([brain.client for brain in brains.values()], sum(brain.fallbacks for brain in brains.values()))
+    _print_route_stats(list(brains.values()))
+    return usage
+
+def run_llm_simulation(model_factory=None, cache=None, agent_kwargs=None, recorder=None, profiler=None,
+                       client_factory=None):
     """
     (新) 运行一个由 LLM Agent 驱动的并行模拟
     """
@@ -10,11 +83,11 @@ def run_llm_simulation():
     print(f"--- [LLM Agent 模拟] 开始 ---")
     
     # 1. 创建环境 (它自动包含了 5 个 agent)
-    env = RpgEnv(render_mode="human")
+    env = RpgEnv(render_mode="human", recorder=recorder, profiler=profiler)
     
     # 2. (新) 为每个 agent 创建一个“大脑”
     #    (我们这里创建一个字典, key 是 agent_id, value 是大脑)
-    brains = {agent_id: LLMAgent() for agent_id in env.possible_agents}
+    brains = _create_brains(env, model_factory, cache, agent_kwargs, client_factory)
     
     # 3. 重置环境
     observations, infos = env.reset()
@@ -34,8 +107,8 @@ def run_llm_simulation():
             # 2. 获取这个 agent 的当前观察
             current_obs = observations[agent_id]
             
-            # 3. 让“大脑”根据“观察”选择一个“动作”
-            action_id = agent_brain.choose_action(current_obs, env.current_step)
+            # 3. 让“大脑”根据“观察”选择一个“动作” (只在 env 给的合法动作里选)
+            action_id = agent_brain.choose_action(current_obs, env.current_step, infos[agent_id]["action_mask"])
             
             actions[agent_id] = action_id
 
@@ -43,13 +116,280 @@ def run_llm_simulation():
         observations, rewards, terminations, truncations, infos = env.step(actions)
 
     print(f"--- [LLM Agent 模拟] 结束 (所有 Agent 已 Terminated 或 Truncated) ---")
+    usage = _print_run_stats(brains, cache)
     env.close()
+    return {"steps": env.current_step, "usage": usage}
 
-if __name__ == "__main__":
+async def decide_actions_async(brains, observations, agent_ids, current_step, semaphore, timeout=None, infos=None):
+    """
+    同时为所有存活的 agent 发出请求, 返回 {agent_id: action_id}。
+    semaphore 限制同时在路上的请求数, timeout 是单个请求的超时 (秒)。
+    infos: env 返回的 infos (可选), 里面的合法动作掩码会传给每个大脑
+    """
+    async def decide(agent_id):
+        action_mask = infos[agent_id]["action_mask"] if infos is not None else None
+        async with semaphore:
+            return await brains[agent_id].choose_action_async(observations[agent_id], current_step, timeout=timeout,
+                                                              action_mask=action_mask)
+
+    action_ids = await asyncio.gather(*(decide(agent_id) for agent_id in agent_ids))
+    return dict(zip(agent_ids, action_ids))
+
+async def run_llm_simulation_async(model_factory=None, max_concurrency=5, request_timeout=30.0, cache=None,
+                                   agent_kwargs=None, recorder=None, profiler=None, client_factory=None):
+    """
+    (新) 异步版的 run_llm_simulation: 每一步所有 agent 的 LLM 请求并发发出,
+    一步的耗时接近一次调用的延迟, 而不是 5 次延迟之和。
+    """
+    print(f"--- [LLM Agent 异步模拟] 开始 (并发上限 {max_concurrency}, 超时 {request_timeout}s) ---")
+
+    env = RpgEnv(render_mode="human", recorder=recorder, profiler=profiler)
+    brains = _create_brains(env, model_factory, cache, agent_kwargs, client_factory)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    observations, infos = env.reset()
+    decide_seconds = 0.0
+    steps = 0
+
+    while env.agents:
+        start = time.perf_counter()
+        actions = await decide_actions_async(brains, observations, list(env.agents), env.current_step,
+                                             semaphore, timeout=request_timeout, infos=infos)
+        decide_seconds += time.perf_counter() - start
+        steps += 1
+
+        observations, rewards, terminations, truncations, infos = env.step(actions)
+
+    print(f"--- [LLM Agent 异步模拟] 结束: {steps} 步, 平均每步决策耗时 {decide_seconds / max(steps, 1):.3f}s ---")
+    _print_run_stats(brains, cache)
+    env.close()
+
+async def run_llm_simulation_pipelined(model_factory=None, max_concurrency=5, request_timeout=30.0, cache=None,
+                                       agent_kwargs=None, recorder=None, profiler=None, client_factory=None):
+    """
+    (新) 流水线版的异步模拟: 某个 agent 的动作一确定, 就用影子 env 预测它的下一步观察 (见 speculation.py),
+    马上发出下一步的请求; 这段推理和其它 agent 还没返回的请求、env.step、渲染重叠在一起。
+    真正的观察出来之后和预测比对: 一样就直接用在路上的请求 (命中), 不一样就取消它重新发 (未命中)。
+    """
+    print(f"--- [LLM Agent 流水线模拟] 开始 (并发上限 {max_concurrency}, 超时 {request_timeout}s) ---")
+
+    env = RpgEnv(render_mode="human", recorder=recorder, profiler=profiler)
+    brains = _create_brains(env, model_factory, cache, agent_kwargs, client_factory)
+    predictor = ShadowPredictor(env)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def decide(agent_id, obs, step, action_mask):
+        """返回 (动作ID, 请求耗时); 耗时用来估算不推测时这一步要等多久 (跟着任务走, 丢掉的推测不会留下记录)"""
+        start = time.perf_counter()
+        async with semaphore:
+            action_id = await brains[agent_id].choose_action_async(obs, step, timeout=request_timeout,
+                                                                   action_mask=action_mask)
+        return action_id, time.perf_counter() - start
+
+    stats = {"hits": 0, "misses": 0, "unused": 0}
+    decide_seconds = 0.0
+    serial_seconds = 0.0
+    steps = 0
+    episode_start = time.perf_counter()
+    # agent_id -> (预测的观察, 已经在路上的请求)
+    speculations = {}
+
+    observations, infos = env.reset()
+
+    while env.agents:
+        start = time.perf_counter()
+        predictor.snapshot()
+        step = env.current_step
+        owners = {}
+        for agent_id in env.agents:
+            speculation = speculations.pop(agent_id, None)
+            if speculation is not None and same_observation(speculation[0], observations[agent_id]):
+                stats["hits"] += 1
+                task = speculation[1]
+            else:
+                if speculation is not None:
+                    stats["misses"] += 1
+                    speculation[1].cancel()
+                task = asyncio.create_task(decide(agent_id, observations[agent_id], step,
+                                                  infos[agent_id]["action_mask"]))
+            owners[task] = agent_id
+        # 已经结束的 agent 的推测用不上了
+        for _, task in speculations.values():
+            stats["unused"] += 1
+            task.cancel()
+        speculations.clear()
+
+        decided = {}
+        pending = set(owners)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                agent_id = owners[task]
+                action_id = decided[agent_id] = task.result()[0]
+                prediction = predictor.predict(agent_id, action_id)
+                if prediction is not None:
+                    next_obs, next_mask = prediction
+                    speculations[agent_id] = (next_obs, asyncio.create_task(decide(agent_id, next_obs, step + 1, next_mask)))
+        decide_seconds += time.perf_counter() - start
+        # 不推测的话, 这一步的每个请求都要从现在才开始: 等待时间是最慢的那个请求的完整耗时
+        serial_seconds += max(task.result()[1] for task in owners)
+        steps += 1
+
+        # env 按 agent 的顺序结算 (而不是请求返回的顺序), 结果和其它模式一致
+        actions = {agent_id: decided[agent_id] for agent_id in env.agents}
+        observations, rewards, terminations, truncations, infos = env.step(actions)
+
+    for _, task in speculations.values():
+        stats["unused"] += 1
+        task.cancel()
+    wall = time.perf_counter() - episode_start
+    checked = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / checked if checked else 0.0
+    stats["saved_s"] = max(serial_seconds - decide_seconds, 0.0)
+    print(f"--- [LLM Agent 流水线模拟] 结束: {steps} 步, 墙钟 {wall:.3f}s, "
+          f"平均每步决策等待 {decide_seconds / max(steps, 1):.3f}s (不推测估计 {serial_seconds / max(steps, 1):.3f}s) ---")
+    print(f"--- [推测执行] 命中 {stats['hits']}, 未命中 {stats['misses']}, 没用上 {stats['unused']}, "
+          f"命中率 {stats['hit_rate']:.1%}, 这一局省下 {stats['saved_s']:.3f}s ---")
+    # 推测请求在被丢弃之前已经返回的话, 也计入用量和决策分层 (它们真的发出去了)
+    usage = _print_run_stats(brains, cache)
+    env.close()
+    return {"steps": steps, "wall_s": wall, "usage": usage, "speculation": stats}
+
+def run_joint_llm_simulation(model_factory=None, agent_kwargs=None, recorder=None, profiler=None, client_factory=None):
+    """
+    (新) 联合决策模式: 每一步只发一个请求, 同时为所有存活的 agent 选动作
+    """
+    print(f"--- [LLM 联合决策模拟] 开始 ---")
+
+    env = RpgEnv(render_mode="human", recorder=recorder, profiler=profiler)
+    model = model_factory() if model_factory is not None else None
+    if model is None and client_factory is not None:
+        model = LLMAgent._create_gemini_model()
+    client = client_factory(model) if client_factory is not None else None
+    controller = JointLLMController(env.action_spaces, model=model, client=client, **(agent_kwargs or {}))
+
+    observations, infos = env.reset()
+
+    while env.agents:
+        action_masks = {agent_id: infos[agent_id]["action_mask"] for agent_id in env.agents}
+        actions = controller.choose_actions(observations, list(env.agents), env.current_step, action_masks)
+        observations, rewards, terminations, truncations, infos = env.step(actions)
+
+    usage = summarize_usage(controller.usage)
+    print(f"--- [LLM 联合决策模拟] 结束 (回退 {controller.fallbacks} 次) ---")
+    print(f"--- [Token 用量 {controller.prompt_version}] {usage} ---")
+    _print_client_stats([controller.client], controller.fallbacks)
+    _print_route_stats([controller])
+    env.close()
+    return {"steps": env.current_step, "usage": usage}
+
+def compare_decision_modes(model_factory=None, agent_kwargs=None, profiler=None, client_factory=None):
+    """分别跑一遍逐 agent 模式和联合模式, 对比每一步的请求数、token 和延迟"""
+    results = {
+        "per-agent": run_llm_simulation(model_factory, agent_kwargs=agent_kwargs, profiler=profiler,
+                                        client_factory=client_factory),
+        "joint": run_joint_llm_simulation(model_factory, agent_kwargs, profiler=profiler, client_factory=client_factory),
+    }
+    print("--- [逐 agent vs 联合决策] 每步平均 ---")
+    print(f"  {'模式':<10} {'请求数':>8} {'prompt tokens':>14} {'response tokens':>16} {'LLM 延迟(s)':>12}")
+    for mode, result in results.items():
+        steps = max(result["steps"], 1)
+        usage = result["usage"]
+        latency = usage["mean_latency_s"] * usage["calls"]
+        print(f"  {mode:<10} {usage['calls'] / steps:>8.2f} {usage['prompt_tokens'] / steps:>14.1f} "
+              f"{usage['response_tokens'] / steps:>16.1f} {latency / steps:>12.3f}")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="运行 LLM 驱动的并行模拟")
+    parser.add_argument("--mode", choices=("per-agent", "joint", "compare"), default="per-agent",
+                        help="逐 agent 请求, 联合请求, 或者两种都跑并对比")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="并发发出每一步的 LLM 请求")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="(异步) 流水线: 用影子 env 预测下一步观察, 提前发出下一步的请求 (见 speculation.py)")
+    parser.add_argument("--max-concurrency", type=int, default=5, help="(异步) 同时在路上的请求数上限")
+    parser.add_argument("--timeout", type=float, default=30.0, help="(异步) 单个请求的超时秒数")
+    parser.add_argument("--fake", action="store_true", help="使用本地的假 LLM 后端 (不需要 API Key)")
+    parser.add_argument("--fake-latency", type=float, default=0.2, help="假后端每次调用的延迟秒数")
+    parser.add_argument("--fake-latency-jitter", type=float, default=0.0, help="假后端额外的随机延迟上限 (秒)")
+    parser.add_argument("--fake-error-rate", type=float, default=0.0, help="假后端每次调用返回 429 的概率")
+    parser.add_argument("--fake-outage", default=None, metavar="START:STOP",
+                        help="假后端在启动后第 START 到 STOP 秒之间全部返回 503 (模拟宕机)")
+    parser.add_argument("--rpm", type=float, default=None, help="每分钟请求数上限 (所有 agent 共用的令牌桶)")
+    parser.add_argument("--tpm", type=float, default=None, help="每分钟 token 数上限 (同上)")
+    parser.add_argument("--max-retries", type=int, default=3, help="429/5xx/超时 的最多重试次数 (指数退避 + 抖动)")
+    parser.add_argument("--deadline", type=float, default=30.0, help="单个请求 (排队 + 重试) 的时间上限, 秒")
+    parser.add_argument("--breaker-threshold", type=int, default=5, help="连续失败多少次后熔断")
+    parser.add_argument("--breaker-recovery", type=float, default=30.0, help="熔断之后多少秒再试探后端")
+    parser.add_argument("--fallback", choices=("planner", "idle"), default="planner",
+                        help="API 调用失败 (或熔断) 时的回退策略")
+    parser.add_argument("--no-router", action="store_true",
+                        help="关掉规则层 (默认简单的状态直接按规则决策, 只有需要推理的状态才调用 LLM)")
+    parser.add_argument("--cache", action="store_true", help="启用 LLM 决策缓存")
+    parser.add_argument("--cache-path", default=None, help="决策缓存的 sqlite 文件 (跨运行共享)")
+    parser.add_argument("--cache-size", type=int, default=10000, help="内存 LRU 缓存的容量")
+    parser.add_argument("--cache-step-bucket", type=int, default=1, help="缓存 key 的步数分桶大小 (0 = 不看步数)")
+    parser.add_argument("--prompt-profile", choices=PROMPT_PROFILES, default="verbose", help="Prompt 风格")
+    parser.add_argument("--no-thought", action="store_true", help="不要求 LLM 在回复里写 thought")
+    parser.add_argument("--record", default=None, help="把轨迹记录到这个目录 (见 trajectory.py)")
+    parser.add_argument("--profile", action="store_true", help="分阶段计时, 结束时打印耗时分布 (见 profiler.py)")
+    parser.add_argument("--profile-export", default=None,
+                        help="把计时结果导出到这个文件 (.prom = Prometheus 文本, 其它 = 追加一行 JSON); 隐含 --profile")
+    args = parser.parse_args()
+
+    model_factory = None
+    if args.fake:
+        outage = tuple(float(x) for x in args.fake_outage.split(":")) if args.fake_outage else None
+        # 每个模型一个种子: 各个 agent 的延迟抖动和故障互相独立
+        seeds = itertools.count()
+        model_factory = lambda: FakeGenerativeModel(latency=args.fake_latency, latency_jitter=args.fake_latency_jitter,
+                                                    error_rate=args.fake_error_rate, outage=outage, seed=next(seeds))
     # (新) 检查 API Key 是否已设置
-    if not os.environ.get("OPENAI_API_KEY"):
-        print("错误: OPENAI_API_KEY 环境变量未设置。")
-        print("请运行: export OPENAI_API_KEY='sk-...'")
+    elif not os.environ.get("GOOGLE_API_KEY"):
+        print("错误: GOOGLE_API_KEY 环境变量未设置。")
+        print("请运行: export GOOGLE_API_KEY='...'  (或者使用 --fake)")
+        return
+
+    cache = None
+    if args.cache or args.cache_path:
+        cache = DecisionCache(max_entries=args.cache_size, path=args.cache_path,
+                              step_bucket=args.cache_step_bucket or None)
+
+    agent_kwargs = {"prompt_profile": args.prompt_profile, "include_thought": not args.no_thought}
+    recorder = TrajectoryRecorder(args.record, metadata={"runner": "run_llm_test", "mode": args.mode}) if args.record else None
+    profiler = Profiler() if args.profile or args.profile_export else None
+    if profiler is not None:
+        agent_kwargs["profiler"] = profiler
+    if args.fallback == "planner":
+        agent_kwargs["fallback"] = PlannerAgent().choose_action
+    if not args.no_router:
+        agent_kwargs["router"] = RuleRouter()
+    client_factory = make_client_factory(args.rpm, args.tpm, args.max_retries, args.deadline,
+                                         args.breaker_threshold, args.breaker_recovery, profiler)
+
+    print("--- 运行 LLM 驱动的并行模拟 ---")
+    if args.mode == "joint":
+        run_joint_llm_simulation(model_factory, agent_kwargs, recorder, profiler, client_factory)
+    elif args.mode == "compare":
+        compare_decision_modes(model_factory, agent_kwargs, profiler, client_factory)
+    elif args.pipeline:
+        asyncio.run(run_llm_simulation_pipelined(model_factory, args.max_concurrency, args.timeout, cache, agent_kwargs,
+                                                 recorder, profiler, client_factory))
+    elif args.use_async:
+        asyncio.run(run_llm_simulation_async(model_factory, args.max_concurrency, args.timeout, cache, agent_kwargs,
+                                             recorder, profiler, client_factory))
     else:
-        print("--- 运行 LLM 驱动的并行模拟 ---")
-        run_llm_simulation()
\ No newline at end of file
+        run_llm_simulation(model_factory, cache, agent_kwargs, recorder, profiler, client_factory)
+    if cache is not None:
+        cache.close()
+    if recorder is not None:
+        recorder.close()
+        print(f"--- [轨迹] {recorder.rows_written} 行已写入 {args.record} ---")
+    if profiler is not None:
+        print(profiler.format_breakdown(f"Profile {args.mode}"))
+        if args.profile_export:
+            export_profile(profiler, args.profile_export)
+            print(f"--- [Profile] 已导出到 {args.profile_export} ---")
+
+if __name__ == "__main__":
+    main()
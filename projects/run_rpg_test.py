@@ -1,18 +1,21 @@
 import os
+import argparse
 from .rpg_env import RpgEnv # ParallelEnv
+from .profiler import Profiler, export_profile
 import random
 
 # LOG_DIRECTORY = "simulation_logs" 
 
-def run_simulation():
+def run_simulation(profiler=None):
     """
     运行一个包含 5 个并行 Agent 的模拟
+    profiler: 可选的 Profiler, 给 env 的每个阶段计时
     """
     
     print(f"--- [并行模拟] 开始 ---")
     
     # 创建一个环境 (它自动包含了 5 个 agent)
-    env = RpgEnv(render_mode="human")
+    env = RpgEnv(render_mode="human", profiler=profiler)
     
     # 重置环境 (Gymnasium 循环)
     observations, infos = env.reset()
@@ -38,7 +41,22 @@ def run_simulation():
     print(f"--- [并行模拟] 结束 (所有 Agent 已 Terminated 或 Truncated) ---")
     env.close()
 
-if __name__ == "__main__":
-    
+def main():
+    parser = argparse.ArgumentParser(description="运行随机动作的并行模拟")
+    parser.add_argument("--profile", action="store_true", help="分阶段计时, 结束时打印耗时分布 (见 profiler.py)")
+    parser.add_argument("--profile-export", default=None,
+                        help="把计时结果导出到这个文件 (.prom = Prometheus 文本, 其它 = 追加一行 JSON); 隐含 --profile")
+    args = parser.parse_args()
+
+    profiler = Profiler() if args.profile or args.profile_export else None
+
     print("--- 运行并行模拟 ---")
-    run_simulation()
\ No newline at end of file
+    run_simulation(profiler)
+    if profiler is not None:
+        print(profiler.format_breakdown("Profile 随机动作"))
+        if args.profile_export:
+            export_profile(profiler, args.profile_export)
+            print(f"--- [Profile] 已导出到 {args.profile_export} ---")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
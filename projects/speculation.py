@@ -0,0 +1,58 @@
+import numpy as np
+
+from .rpg_env import RpgEnv
+
+"""
+推测执行: 用一个静默的影子 env 提前算出 agent 的下一步观察, 在真正的 step 还没做完时就开始下一步的推理。
+
+每个 agent 的世界互不影响, 所以某个 agent 的动作一旦确定, 就可以从这一步开始时的 get_state() 快照出发,
+在影子 env 里只让它一个人走一步, 得到它下一步 (很可能) 的观察和合法动作掩码。
+战斗伤害、反击、升级成本都是确定的; 掉落的概率都是 0 或 1 时预测是准的。
+掉落是随机的时候, 真正的 step 里其它 agent 会先用掉随机数, 预测可能不准: 调用方拿真正的观察比对, 不一样就丢掉推测。
+
+    predictor = ShadowPredictor(env)
+    predictor.snapshot()                       # 每一步开始时 (决策之前)
+    prediction = predictor.predict(agent, action_id)
+    if prediction is not None:
+        next_obs, next_mask = prediction
+"""
+
+
+class ShadowPredictor:
+    def __init__(self, env):
+        """env: 要预测的 RpgEnv ("dict" 或 "array" 观察; 不支持 delta_obs)"""
+        if env.delta_obs:
+            raise ValueError("ShadowPredictor 不支持 delta_obs (需要完整的观察才能和真正的结果比对)")
+        self.env = env
+        # 影子 env 不打印、不记录, 规则和真正的 env 完全一样
+        self.shadow = RpgEnv(verbosity="silent", config_tables=env.tables, obs_format=env.obs_format,
+                             fast_forward=env.fast_forward, n_agents=env.n_agents)
+        self._state = None
+
+    def snapshot(self):
+        """记下真正的 env 现在的状态 (这一步的所有预测都从这里出发)"""
+        self._state = self.env.get_state()
+
+    def predict(self, agent, action_id):
+        """
+        agent 执行 action_id 之后的 (观察, 合法动作掩码); 这一步之后 agent 就结束了 (不需要再决策) 返回 None。
+        "array" 格式的观察会复制一份 (影子 env 的缓冲区下一次预测时会被覆盖)。
+        """
+        if self._state is None:
+            raise ValueError("先调用 snapshot() 再 predict()")
+        shadow = self.shadow
+        shadow.set_state(self._state)
+        observations, _, _, _, infos = shadow.step({agent: action_id})
+        if agent not in observations: # 打死了 final_boss 或者超时: env 已经把它移除了
+            return None
+        obs = observations[agent]
+        if self.env.obs_format == "array":
+            obs = obs.copy()
+        return obs, infos[agent]["action_mask"]
+
+
+def same_observation(a, b):
+    """两个观察是否相同 ("dict" 或 "array" 格式)"""
+    if isinstance(a, np.ndarray):
+        return np.array_equal(a, b)
+    return a == b
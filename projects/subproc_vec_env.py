@@ -0,0 +1,331 @@
+import time
+import argparse
+import traceback
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+from gymnasium.spaces import Discrete
+from gymnasium.vector import VectorEnv, AutoresetMode
+from gymnasium.vector.utils import batch_space
+
+from .rpg_env import RpgEnv, OBS_SIZE
+
+"""
+多进程 + 共享内存的向量环境, 实现 Gymnasium 的 VectorEnv 接口 (可以直接接 SB3 / CleanRL 一类的训练代码)。
+
+每个 (世界, agent) 是向量里的一个槽位: num_envs = n_worlds * n_agents, 第 w 个世界的 agent i 是槽位 w * n_agents + i。
+观察是 obs_format="array" 的一行 (布局见 rpg_env.OBS_INDEX), 动作是 Discrete。
+合法动作掩码 (见 RpgEnv.action_mask) 在 infos["action_mask"] 里, 也可以用 action_masks() 取。
+
+    envs = SubprocRpgVecEnv(n_worlds=8, n_workers=4)
+    obs, infos = envs.reset(seed=0)                    # obs: (num_envs, OBS_SIZE) int32
+    obs, rewards, terminations, truncations, infos = envs.step(envs.action_space.sample())
+    envs.close()
+
+worker 进程把观察、奖励和结束标志直接写进共享内存 (RpgEnv 的 obs_buffer 就是共享内存的视图),
+管道上每一步每个 worker 只有一条很短的命令和一条确认, 所以 IPC 开销和观察大小无关。
+
+自动重置 (AutoresetMode.SAME_STEP): 一个世界的所有 agent 都结束后, 世界在同一次 step 里 reset,
+返回的是新回合的观察, 结束时的观察在 infos["final_obs"] (掩码 infos["_final_obs"]) 里。
+一个 agent 比同世界的其它 agent 先结束时, 它的槽位按 "black death" 处理: 报告一次 terminated/truncated 之后,
+直到世界重置前观察全 0、奖励 0、动作被忽略 (infos["active"] 为 False, 掩码只有闲置), 世界重置时再报告一次 truncated。
+
+reset(seed=s) 时第 w 个世界用种子 s + w; 之后第 k 次自动重置用 s + w + k * n_worlds, 整个过程可复现。
+"""
+
+_ALIGN = 8
+
+
+class SharedArrays:
+    """共享内存里几个固定形状的数组 (布局同 env_state.StateLayout 的思路: 每个字段一段对齐的连续内存)"""
+
+    def __init__(self, num_envs, n_actions):
+        fields = [
+            ("obs", np.int32, (num_envs, OBS_SIZE)),
+            ("final_obs", np.int32, (num_envs, OBS_SIZE)),
+            ("actions", np.int64, (num_envs,)),
+            ("rewards", np.float64, (num_envs,)),
+            ("terminations", np.bool_, (num_envs,)),
+            ("truncations", np.bool_, (num_envs,)),
+            ("active", np.bool_, (num_envs,)),
+            ("action_masks", np.int8, (num_envs, n_actions)),
+        ]
+        self.fields = []
+        offset = 0
+        for name, dtype, shape in fields:
+            dtype = np.dtype(dtype)
+            self.fields.append((name, dtype, shape, offset))
+            offset += dtype.itemsize * int(np.prod(shape))
+            offset = -(-offset // _ALIGN) * _ALIGN
+        self.nbytes = offset
+
+    def views(self, buffer):
+        return {
+            name: np.ndarray(shape, dtype=dtype, buffer=buffer, offset=offset)
+            for name, dtype, shape, offset in self.fields
+        }
+
+
+class _WorldRunner:
+    """worker 进程里的一组世界 (槽位 [start, stop))"""
+
+    def __init__(self, views, worlds, n_worlds, n_agents, env_kwargs):
+        self.views = views
+        self.worlds = worlds
+        self.n_worlds = n_worlds
+        self.n_agents = n_agents
+        self.envs = []
+        self.slots = []
+        for w in worlds:
+            lo = w * n_agents
+            self.slots.append(slice(lo, lo + n_agents))
+            self.envs.append(RpgEnv(n_agents=n_agents, obs_format="array", obs_buffer=views["obs"][lo:lo + n_agents],
+                                    mask_buffer=views["action_masks"][lo:lo + n_agents], **env_kwargs))
+        self.seeds = [None] * len(self.envs)
+        self.episodes = [0] * len(self.envs)
+
+    def _reset_world(self, k):
+        seed = self.seeds[k]
+        if seed is not None:
+            seed += self.episodes[k] * self.n_worlds
+        self.episodes[k] += 1
+        self.envs[k].reset(seed=seed)
+        self.views["active"][self.slots[k]] = True
+
+    def reset(self, seed):
+        for k, w in enumerate(self.worlds):
+            self.seeds[k] = None if seed is None else seed + w
+            self.episodes[k] = 0
+            self._reset_world(k)
+        views = self.views
+        for slot in self.slots:
+            views["rewards"][slot] = 0
+            views["terminations"][slot] = False
+            views["truncations"][slot] = False
+
+    def step(self):
+        views = self.views
+        for k, env in enumerate(self.envs):
+            slot = self.slots[k]
+            alive = env.agents
+            agent_actions = views["actions"][slot].tolist()
+            actions = {agent: agent_actions[i] for i, agent in enumerate(env.possible_agents) if agent in alive}
+            _, rewards, terminations, _, _ = env.step(actions)
+
+            possible = env.possible_agents
+            views["rewards"][slot] = [rewards.get(agent, 0) for agent in possible]
+            terminated = [False] * self.n_agents
+            truncated = [False] * self.n_agents
+            active = views["active"][slot]
+            obs = views["obs"][slot]
+            final_obs = views["final_obs"][slot]
+            masks = views["action_masks"][slot]
+            world_done = env.num_agents == 0
+            for i, agent in enumerate(possible):
+                if agent in actions:
+                    if agent in env.agents:
+                        continue
+                    # 这一步刚结束: 记下最后的观察 (RpgEnv 不会为刚结束的 agent 返回观察, 用 observe 重建)
+                    final_obs[i] = env.observe(agent)
+                    if terminations.get(agent, False):
+                        terminated[i] = True
+                    else:
+                        truncated[i] = True
+                    active[i] = False
+                    obs[i] = 0
+                    masks[i] = 0
+                    masks[i, 0] = 1
+                elif world_done:
+                    # 更早结束的 (black death) 槽位: 随世界一起截断
+                    final_obs[i] = obs[i]
+                    truncated[i] = True
+            views["terminations"][slot] = terminated
+            views["truncations"][slot] = truncated
+            if world_done:
+                self._reset_world(k)
+
+    def close(self):
+        for env in self.envs:
+            env.close()
+
+
+def _worker(remote, parent_remote, shm_name, num_envs, n_actions, worlds, n_worlds, n_agents, env_kwargs):
+    parent_remote.close()
+    shm = shared_memory.SharedMemory(name=shm_name)
+    runner = None
+    try:
+        runner = _WorldRunner(SharedArrays(num_envs, n_actions).views(shm.buf), worlds, n_worlds, n_agents, env_kwargs)
+        remote.send(("ok", None))
+        while True:
+            command, data = remote.recv()
+            if command == "step":
+                runner.step()
+            elif command == "reset":
+                runner.reset(data)
+            elif command == "close":
+                break
+            else:
+                raise ValueError(f"未知的命令: {command}")
+            remote.send(("ok", None))
+    except (KeyboardInterrupt, EOFError):
+        pass
+    except Exception:
+        remote.send(("error", traceback.format_exc()))
+    finally:
+        if runner is not None:
+            runner.close()
+            del runner # 释放共享内存的视图之后才能 close
+        shm.close()
+        remote.close()
+
+
+class SubprocRpgVecEnv(VectorEnv):
+    metadata = {"autoreset_mode": AutoresetMode.SAME_STEP}
+
+    def __init__(self, n_worlds, n_agents=5, n_workers=None, env_kwargs=None, copy=True, context=None):
+        """
+        n_worlds:   RpgEnv 世界的数量 (每个世界 n_agents 个 agent, 一个 agent 一个槽位)
+        n_workers:  worker 进程数 (默认 min(n_worlds, CPU 数)); 世界尽量平均地分给各个 worker
+        env_kwargs: 传给每个 RpgEnv 的其它参数 (例如 fast_forward=True); 默认 verbosity="silent"
+        copy:       step/reset 返回观察的副本; False 时直接返回共享内存的视图 (下一次 step 会被覆盖)
+        context:    multiprocessing 的启动方式 ("fork" / "spawn" / "forkserver", 默认用平台的默认值)
+        """
+        env_kwargs = dict(env_kwargs or {})
+        for key in ("obs_format", "obs_buffer", "mask_buffer", "n_agents", "delta_obs", "recorder", "render_mode"):
+            if key in env_kwargs:
+                raise ValueError(f"SubprocRpgVecEnv 不支持设置 env_kwargs[{key!r}]")
+        env_kwargs.setdefault("verbosity", "silent")
+        if n_workers is None:
+            n_workers = min(n_worlds, multiprocessing.cpu_count())
+        if not 1 <= n_workers <= n_worlds:
+            raise ValueError(f"n_workers 必须在 1 和 n_worlds={n_worlds} 之间, 实际为 {n_workers}")
+
+        self.n_worlds = n_worlds
+        self.n_agents = n_agents
+        self.num_envs = n_worlds * n_agents
+        self.copy = copy
+
+        probe = RpgEnv(n_agents=1, obs_format="array", **env_kwargs)
+        self.single_observation_space = probe.observation_spaces["player_0"]
+        self.single_action_space = Discrete(probe.action_spaces["player_0"].n)
+        self.observation_space = batch_space(self.single_observation_space, self.num_envs)
+        self.action_space = batch_space(self.single_action_space, self.num_envs)
+        self.autoreset_mode = AutoresetMode.SAME_STEP
+
+        layout = SharedArrays(self.num_envs, self.single_action_space.n)
+        self._shm = shared_memory.SharedMemory(create=True, size=layout.nbytes)
+        self._views = layout.views(self._shm.buf)
+        self._views["active"][:] = False
+
+        ctx = multiprocessing.get_context(context)
+        self._remotes = []
+        self._processes = []
+        try:
+            for worlds in np.array_split(np.arange(n_worlds), n_workers):
+                remote, work_remote = ctx.Pipe()
+                process = ctx.Process(target=_worker, daemon=True,
+                                      args=(work_remote, remote, self._shm.name, self.num_envs,
+                                            self.single_action_space.n, worlds.tolist(), n_worlds, n_agents, env_kwargs))
+                process.start()
+                work_remote.close()
+                self._remotes.append(remote)
+                self._processes.append(process)
+            self._wait()
+        except BaseException:
+            self.close()
+            raise
+
+    def _send(self, command, data=None):
+        for remote in self._remotes:
+            remote.send((command, data))
+
+    def _wait(self):
+        errors = []
+        for i, remote in enumerate(self._remotes):
+            try:
+                status, message = remote.recv()
+            except EOFError:
+                status, message = "error", "进程意外退出"
+            if status == "error":
+                errors.append(f"worker {i}:\n{message}")
+        if errors:
+            raise RuntimeError("SubprocRpgVecEnv 的 worker 出错:\n" + "\n".join(errors))
+
+    def _observations(self):
+        obs = self._views["obs"]
+        return obs.copy() if self.copy else obs
+
+    def action_masks(self):
+        """所有槽位当前的合法动作掩码 (num_envs, 动作数) int8"""
+        return self._views["action_masks"].copy()
+
+    def reset(self, *, seed=None, options=None):
+        self._send("reset", seed)
+        self._wait()
+        return self._observations(), {"active": self._views["active"].copy(), "action_mask": self.action_masks()}
+
+    def step(self, actions):
+        views = self._views
+        views["actions"][:] = actions
+        self._send("step")
+        self._wait()
+
+        terminations = views["terminations"].copy()
+        truncations = views["truncations"].copy()
+        infos = {"active": views["active"].copy(), "action_mask": self.action_masks()}
+        done = terminations | truncations
+        if done.any():
+            final_obs = np.full(self.num_envs, None, dtype=object)
+            for i in np.flatnonzero(done).tolist():
+                final_obs[i] = views["final_obs"][i].copy()
+            infos["final_obs"] = final_obs
+            infos["_final_obs"] = done
+        return self._observations(), views["rewards"].copy(), terminations, truncations, infos
+
+    def close_extras(self, **kwargs):
+        for remote in self._remotes:
+            try:
+                remote.send(("close", None))
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for remote in self._remotes:
+            remote.close()
+        self._views = None
+        try:
+            self._shm.close()
+        except BufferError:
+            pass # copy=False 时调用方可能还拿着共享内存的视图; unlink 之后内存会在视图释放时回收
+        self._shm.unlink()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SubprocRpgVecEnv 吞吐量 (随机动作)")
+    parser.add_argument("--worlds", type=int, default=8)
+    parser.add_argument("--agents", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--steps", type=int, default=1000)
+    parser.add_argument("--fast-forward", action="store_true", help="RpgEnv 的 fast_forward 模式")
+    args = parser.parse_args()
+
+    envs = SubprocRpgVecEnv(args.worlds, args.agents, args.workers, env_kwargs={"fast_forward": args.fast_forward})
+    envs.action_space.seed(0)
+    envs.reset(seed=0)
+    episodes = 0
+    start = time.perf_counter()
+    for _ in range(args.steps):
+        _, _, terminations, truncations, _ = envs.step(envs.action_space.sample())
+        episodes += int((terminations | truncations).sum())
+    elapsed = time.perf_counter() - start
+    envs.close()
+    print(f"--- [SubprocRpgVecEnv] {args.worlds} 个世界 x {args.agents} 个 agent, {len(envs._processes)} 个 worker ---")
+    print(f"  {args.steps / elapsed:,.0f} 次 step/s, {args.steps * envs.num_envs / elapsed:,.0f} agent-steps/s, "
+          f"结束的槽位回合: {episodes}")
+
+
+if __name__ == "__main__":
+    main()
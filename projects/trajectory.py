@@ -0,0 +1,216 @@
+import os
+import json
+import argparse
+
+import numpy as np
+
+"""
+轨迹记录: 把 RpgEnv.step 的每一条 (回合, 步数, agent, 观察, 动作, 奖励, terminated, truncated)
+按列写进分段的 .npy 文件, 读的时候用内存映射, 几百万步也不需要整个读进内存。
+
+目录布局 (只追加):
+    index.json                  列的 dtype/形状, 已经写完的分段和各自的行数
+    <列名>.<分段号>.npy          每个分段每一列一个文件
+每个分段的所有列都写完之后才更新 index.json (先写临时文件再 os.replace),
+所以中途崩溃也只会丢掉还没 flush 的那一段, 读者永远看不到写了一半的分段。
+
+obs 是 obs_format="array" 的布局 (见 rpg_env.OBS_INDEX), 记录的是 agent 做出这个动作时看到的观察。
+
+    recorder = TrajectoryRecorder("runs/traj")
+    env = RpgEnv(recorder=recorder)           # env.close() 时 close (写出剩下的行和 index.json)
+    reader = TrajectoryReader("runs/traj")
+    batch = reader.sample(256)                 # {"obs": (256, 14), "action": (256,), ...}
+"""
+
+INDEX_FILE = "index.json"
+FORMAT_VERSION = 1
+
+
+def trajectory_columns(obs_size, n_agents=None):
+    """列名 -> (dtype, 每一行的形状); agent 列默认 int16, n_agents 放不下时用 int32"""
+    agent_dtype = np.int16 if n_agents is None or n_agents <= np.iinfo(np.int16).max + 1 else np.int32
+    return {
+        "episode": (np.int32, ()),
+        "step": (np.int32, ()),
+        "agent": (agent_dtype, ()),
+        "obs": (np.int32, (obs_size,)),
+        "action": (np.int16, ()),
+        "reward": (np.float32, ()),
+        "terminated": (np.bool_, ()),
+        "truncated": (np.bool_, ()),
+    }
+
+
+class TrajectoryRecorder:
+    """
+    path:       输出目录 (已经有 index.json 的话就接着追加)
+    chunk_size: 每个分段的行数; 内存里最多只保留一个分段的行, 攒满就整段写出
+    n_agents:   env 的 agent 数量 (决定 agent 列的 dtype, 不传按 int16); 接着追加时沿用已有的 dtype
+    """
+
+    def __init__(self, path, obs_size=None, chunk_size=65536, metadata=None, n_agents=None):
+        if obs_size is None:
+            from .rpg_env import OBS_SIZE
+            obs_size = OBS_SIZE
+        self.path = path
+        self.chunk_size = chunk_size
+        os.makedirs(path, exist_ok=True)
+
+        index_path = os.path.join(path, INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                self.index = json.load(f)
+            if self.index["columns"]["obs"][1] != [obs_size]:
+                raise ValueError(f"{path} 里的 obs 宽度是 {self.index['columns']['obs'][1]}, 不是 {obs_size}")
+        else:
+            self.index = {
+                "version": FORMAT_VERSION,
+                "columns": {name: [np.dtype(dtype).str, list(shape)]
+                            for name, (dtype, shape) in trajectory_columns(obs_size, n_agents).items()},
+                "segments": [],
+                "episodes": 0,
+                "metadata": metadata or {},
+            }
+
+        self._dtypes = {name: np.dtype(dtype) for name, (dtype, _) in self.index["columns"].items()}
+        # agent 列能存下的 agent 数量
+        self.max_agents = int(np.iinfo(self._dtypes["agent"]).max) + 1
+        # 缓冲区是每列一个 Python 列表: 每一步只做 list.extend, flush 时整段一次转换成数组
+        self._buffers = {name: [] for name in self._dtypes}
+        # 接着已有的回合编号往下数 (第一次 start_episode 之后是 episodes)
+        self.episode = self.index["episodes"] - 1
+        self.rows_written = sum(segment["rows"] for segment in self.index["segments"])
+
+    def start_episode(self):
+        """env.reset() 时调用"""
+        self.episode += 1
+        self.index["episodes"] = self.episode + 1
+
+    def append(self, step, agent, obs, action, reward, terminated, truncated):
+        """
+        追加一批行 (一次 env.step 里所有行动的 agent)。
+        每个参数都是长度 n 的序列 (obs 的每个元素是一行 obs_size 个整数)。
+        """
+        buffers = self._buffers
+        buffers["episode"].extend([self.episode] * len(agent))
+        buffers["step"].extend(step)
+        buffers["agent"].extend(agent)
+        buffers["obs"].extend(obs)
+        buffers["action"].extend(action)
+        buffers["reward"].extend(reward)
+        buffers["terminated"].extend(terminated)
+        buffers["truncated"].extend(truncated)
+        while len(buffers["episode"]) >= self.chunk_size:
+            self._write_segment(self.chunk_size)
+
+    def flush(self):
+        """把缓冲区里剩下的行写成一个新分段 (没有行就什么都不做)"""
+        if self._buffers["episode"]:
+            self._write_segment(len(self._buffers["episode"]))
+
+    def _write_segment(self, rows):
+        segment = len(self.index["segments"])
+        for name, buffer in self._buffers.items():
+            np.save(os.path.join(self.path, f"{name}.{segment:05d}.npy"), np.array(buffer[:rows], dtype=self._dtypes[name]))
+            del buffer[:rows]
+        self.index["segments"].append({"id": segment, "rows": rows})
+        self.rows_written += rows
+        self._write_index()
+
+    def _write_index(self):
+        tmp = os.path.join(self.path, INDEX_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.index, f, indent=1)
+        os.replace(tmp, os.path.join(self.path, INDEX_FILE))
+
+    def close(self):
+        self.flush()
+        # 只有回合但还没有任何行的时候也要把回合数写下来
+        self._write_index()
+
+
+class TrajectoryReader:
+    """内存映射的只读视图: 按顺序回放, 或者随机抽 mini-batch"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE)) as f:
+            self.index = json.load(f)
+        if self.index["version"] != FORMAT_VERSION:
+            raise ValueError(f"不支持的轨迹格式版本: {self.index['version']}")
+        self.columns = list(self.index["columns"])
+        self.segment_rows = np.array([segment["rows"] for segment in self.index["segments"]], dtype=np.int64)
+        # offsets[i] = 第 i 个分段第一行的全局行号
+        self.offsets = np.concatenate([[0], np.cumsum(self.segment_rows)])
+        self._segments = [None] * len(self.segment_rows)
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    @property
+    def episodes(self):
+        return self.index["episodes"]
+
+    def segment(self, i):
+        """第 i 个分段: {列名: np.memmap} (第一次访问时才打开文件)"""
+        if self._segments[i] is None:
+            self._segments[i] = {
+                name: np.load(os.path.join(self.path, f"{name}.{i:05d}.npy"), mmap_mode="r")
+                for name in self.columns
+            }
+        return self._segments[i]
+
+    def replay(self, batch_size=4096, columns=None):
+        """按写入顺序产生 {列名: 数组} 的批次 (每批最多 batch_size 行, 不跨分段)"""
+        columns = columns or self.columns
+        for i, rows in enumerate(self.segment_rows.tolist()):
+            segment = self.segment(i)
+            for start in range(0, rows, batch_size):
+                yield {name: np.asarray(segment[name][start:start + batch_size]) for name in columns}
+
+    def sample(self, batch_size, rng=None, columns=None):
+        """均匀随机抽 batch_size 行 (有放回), 只读取被抽到的行"""
+        if len(self) == 0:
+            raise ValueError("轨迹是空的")
+        rng = rng if rng is not None else np.random.default_rng()
+        columns = columns or self.columns
+        rows = np.sort(rng.integers(0, len(self), size=batch_size))
+        return self.take(rows, columns)
+
+    def take(self, rows, columns=None):
+        """按全局行号取行 (rows 升序时每个分段都是顺序读取)"""
+        columns = columns or self.columns
+        rows = np.asarray(rows, dtype=np.int64)
+        segment_idx = np.searchsorted(self.offsets, rows, side="right") - 1
+        out = {}
+        for name in columns:
+            dtype, shape = self.index["columns"][name]
+            out[name] = np.empty((len(rows),) + tuple(shape), dtype=np.dtype(dtype))
+        for i in np.unique(segment_idx).tolist():
+            mask = segment_idx == i
+            local = rows[mask] - self.offsets[i]
+            segment = self.segment(i)
+            for name in columns:
+                out[name][mask] = segment[name][local]
+        return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查看一个轨迹目录")
+    parser.add_argument("path")
+    args = parser.parse_args()
+
+    reader = TrajectoryReader(args.path)
+    print(f"--- [轨迹] {args.path}: {len(reader)} 行, {reader.episodes} 个回合, {len(reader.segment_rows)} 个分段 ---")
+    total_reward = 0.0
+    terminated = 0
+    truncated = 0
+    for batch in reader.replay(columns=["reward", "terminated", "truncated"]):
+        total_reward += float(batch["reward"].sum())
+        terminated += int(batch["terminated"].sum())
+        truncated += int(batch["truncated"].sum())
+    print(f"  总奖励: {total_reward:.0f}, terminated: {terminated}, truncated: {truncated}")
+
+
+if __name__ == "__main__":
+    main()
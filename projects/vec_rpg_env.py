@@ -0,0 +1,243 @@
+import numpy as np
+
+from config.config_globals import *
+from config.config_bosses import *
+from config.config_weapons import *
+
+from .config_tables import FIST_DAMAGE, get_config_tables
+from .rng import DEFAULT_BLOCK_SIZE, BatchedBlockUniforms
+from .env_state import StateLayout
+
+"""
+批量版的 RpgEnv: 同时推进 n_envs 个相互独立的世界。
+
+所有 agent 状态都放在 "结构数组" (struct-of-arrays) 里, 第 0 维是 env, 第 1 维是 agent:
+    agent_healths     (n_envs, n_agents)                 血量
+    agent_inventories (n_envs, n_agents, len(STONE_NAMES)) 背包, 顺序同 STONE_NAMES
+    agent_weapons     (n_envs, n_agents, len(WEAPON_DATA)) 武器等级, 顺序同 WEAPON_DATA
+    agent_states      (n_envs, n_agents)                 0 = WORLD, 1 = BATTLE
+    battle_boss       (n_envs, n_agents)                 战斗中的 Boss 下标 (-1 = 没有副本)
+    battle_health     (n_envs, n_agents)                 战斗中的 Boss 剩余血量
+(battle_boss + battle_health 就是 RpgEnv.battle_instances)
+这些数组 (连同随机数流) 都是同一块状态缓冲区 (见 env_state.py) 里的视图,
+所以 get_state / set_state 只是一次内存拷贝。
+
+对同样的种子, 每个子世界的结果和 RpgEnv 逐步一致:
+VecRpgEnv.reset(seed=s) 的第 i 个世界 == RpgEnv.reset(seed=s + i)。
+每个世界有自己的 numpy 随机数流 (见 rng.py), 所以掉落和一起跑了多少个世界无关。
+"""
+
+WORLD = 0
+BATTLE = 1
+
+
+class VecRpgEnv:
+    metadata = {"name": "vec_rpg_env_v0"}
+
+    def __init__(self, n_envs, n_agents=5, config_tables=None):
+        self.n_envs = n_envs
+        self.n_agents = n_agents
+        self.possible_agents = [f"player_{i}" for i in range(n_agents)]
+
+        self.tables = config_tables if config_tables is not None else get_config_tables()
+        self.boss_names = self.tables.boss_names
+        self.weapon_names = self.tables.weapon_names
+        self.num_actions = 1 + len(self.boss_names) + len(self.weapon_names)
+
+        self._bind_tables()
+
+        # 一块至少要够所有 agent 同一步都击杀一次
+        self._block_size = max(DEFAULT_BLOCK_SIZE, n_agents * self._loot_prob.shape[1])
+        self._state_layout = StateLayout(n_envs, n_agents, len(self.tables.stone_names), len(self.weapon_names), self._block_size)
+        self._state = self._state_layout.allocate()
+        views = self._state_layout.views(self._state)
+
+        self.agent_healths = views["agent_healths"]
+        self.agent_inventories = views["agent_inventories"]
+        self.agent_weapons = views["agent_weapons"]
+        self.agent_states = views["agent_states"]
+        self.battle_boss = views["battle_boss"]
+        self.battle_health = views["battle_health"]
+        # 相当于 RpgEnv.agents: 还没有结束的 agent
+        self.active = views["active"]
+        self.current_step = views["current_step"]
+        self.agent_healths[:] = AGENT_MAX_HEALTH
+        self.battle_boss[:] = -1
+
+        self._rngs = BatchedBlockUniforms([None] * n_envs, self._block_size, blocks=views["rng_block"],
+                                          pos=views["rng_pos"], words=views["rng_words"])
+
+    def _bind_tables(self):
+        """绑定编译好的 config 表 (见 config_tables.py)"""
+        tables = self.tables
+        self._boss_hp = tables.boss_hp
+        self._boss_retaliation = tables.boss_retaliation
+        self._boss_is_final = tables.boss_is_final
+        self._requires_max_weapon = tables.requires_max_weapon
+        self._damage = tables.damage
+        self._cost = tables.cost
+        self._loot_count = tables.loot_count
+        self._loot_item = tables.loot_item
+        self._loot_prob = tables.loot_prob
+        self._loot_amount = tables.loot_amount
+        self._max_level = tables.max_weapon_level
+
+    def _get_obs(self):
+        """所有世界所有 agent 的观察 (键同 RpgEnv._get_obs)"""
+        in_battle = self.agent_states == BATTLE
+        return {
+            "my_health": self.agent_healths.copy(),
+            "my_state": self.agent_states.copy(),
+            "my_inventory": self.agent_inventories.copy(),
+            "my_weapons": self.agent_weapons.copy(),
+            "battle_boss_health": np.where(in_battle, self.battle_health, 0.0),
+        }
+
+    def reset(self, seed=None, options=None):
+        """
+        重置所有世界。
+        seed 可以是 int (第 i 个世界用 seed + i) 或者长度为 n_envs 的列表。
+        """
+        if seed is None:
+            seeds = [None] * self.n_envs
+        elif isinstance(seed, (int, np.integer)):
+            seeds = [int(seed) + i for i in range(self.n_envs)]
+        else:
+            seeds = list(seed)
+            if len(seeds) != self.n_envs:
+                raise ValueError(f"需要 {self.n_envs} 个种子, 但收到了 {len(seeds)} 个")
+        self._rngs.reseed(seeds)
+
+        self.agent_healths[:] = AGENT_MAX_HEALTH
+        self.agent_inventories[:] = 0
+        self.agent_weapons[:] = 0
+        self.agent_states[:] = WORLD
+        self.battle_boss[:] = -1
+        self.battle_health[:] = 0
+        self.active[:] = True
+        self.current_step[:] = 0
+
+        infos = {}
+        return self._get_obs(), infos
+
+    def get_state(self):
+        """所有世界的完整状态 (一维 uint8 数组, 格式见 env_state.py)"""
+        return self._state.copy()
+
+    def set_state(self, state):
+        """恢复 get_state() 的结果 (一次内存拷贝)"""
+        self._state[:] = self._state_layout.check(state)
+        self._rngs.invalidate()
+
+    def _calculate_damage(self, env_idx, agent_idx, boss_idx):
+        """批量版的 RpgEnv._calculate_damage (只用第一把等级 > 0 的武器)"""
+        levels = self.agent_weapons[env_idx, agent_idx]  # (N, W)
+        owned = levels > 0
+        has_weapon = owned.any(axis=1)
+        first = owned.argmax(axis=1)
+        first_level = levels[np.arange(len(first)), first]
+
+        damage = np.where(has_weapon, self._damage[first, first_level, boss_idx], float(FIST_DAMAGE))
+
+        # final_boss 需要一把满级武器, 否则 0 伤害
+        has_max_weapon = (levels == self._max_level).any(axis=1)
+        damage[self._requires_max_weapon[boss_idx] & ~has_max_weapon] = 0.0
+        return damage
+
+    def step(self, actions):
+        """
+        actions: (n_envs, n_agents) 的整数数组。已经结束的 agent 的动作会被忽略。
+        返回 (observations, rewards, terminations, truncations, infos), 除 infos 外都是数组。
+        """
+        actions = np.asarray(actions)
+        if actions.shape != (self.n_envs, self.n_agents):
+            raise ValueError(f"actions 的形状应为 {(self.n_envs, self.n_agents)}, 实际为 {actions.shape}")
+
+        n_bosses = len(self.boss_names)
+        rewards = np.zeros((self.n_envs, self.n_agents), dtype=np.float32)
+        terminations = np.zeros((self.n_envs, self.n_agents), dtype=bool)
+        truncations = np.zeros((self.n_envs, self.n_agents), dtype=bool)
+
+        live_envs = self.active.any(axis=1)
+        self.current_step[live_envs] += 1
+
+        # 状态机分支要在任何修改之前确定 (刚进入战斗的 agent 这一步不攻击)
+        in_world = self.active & (self.agent_states == WORLD)
+        in_battle = self.active & (self.agent_states == BATTLE)
+
+        # --- 1. 世界中: 开始战斗 ---
+        start = in_world & (actions >= 1) & (actions <= n_bosses)
+        if start.any():
+            boss_idx = actions[start] - 1
+            self.agent_states[start] = BATTLE
+            self.battle_boss[start] = boss_idx
+            self.battle_health[start] = self._boss_hp[boss_idx]
+
+        # --- 2. 世界中: 制作/升级武器 ---
+        craft = in_world & (actions > n_bosses) & (actions < self.num_actions)
+        if craft.any():
+            env_idx, agent_idx = np.nonzero(craft)
+            weapon_idx = actions[env_idx, agent_idx] - (n_bosses + 1)
+            level = self.agent_weapons[env_idx, agent_idx, weapon_idx]
+            next_level = np.minimum(level + 1, self._max_level)
+            cost = self._cost[weapon_idx, next_level]  # (N, S)
+            inventory = self.agent_inventories[env_idx, agent_idx]
+            ok = (level < self._max_level) & (inventory >= cost).all(axis=1)
+            if ok.any():
+                env_idx, agent_idx, weapon_idx = env_idx[ok], agent_idx[ok], weapon_idx[ok]
+                self.agent_inventories[env_idx, agent_idx] -= cost[ok]
+                self.agent_weapons[env_idx, agent_idx, weapon_idx] += 1
+                rewards[env_idx, agent_idx] = 50
+
+        # --- 3. 战斗中: 任何非闲置动作都是攻击 ---
+        attack = in_battle & (actions > 0)
+        if attack.any():
+            env_idx, agent_idx = np.nonzero(attack)
+            boss_idx = self.battle_boss[env_idx, agent_idx].astype(np.intp)
+            damage = self._calculate_damage(env_idx, agent_idx, boss_idx)
+            health = self.battle_health[env_idx, agent_idx] - damage
+            self.battle_health[env_idx, agent_idx] = health
+
+            win = health <= 0
+            if win.any():
+                self._resolve_battle_win(env_idx[win], agent_idx[win], boss_idx[win], rewards, terminations)
+
+            # Boss 反击 (如果会反击)
+            lose = ~win
+            env_idx, agent_idx, boss_idx = env_idx[lose], agent_idx[lose], boss_idx[lose]
+            self.agent_healths[env_idx, agent_idx] -= self._boss_retaliation[boss_idx]
+            dead = self.agent_healths[env_idx, agent_idx] <= 0
+            if dead.any():
+                # 死亡: 满血复活, 副本删除, 没有奖励
+                env_idx, agent_idx = env_idx[dead], agent_idx[dead]
+                self.agent_healths[env_idx, agent_idx] = AGENT_MAX_HEALTH
+                self.agent_states[env_idx, agent_idx] = WORLD
+                self.battle_boss[env_idx, agent_idx] = -1
+
+        # --- 4. 超时 和 结束 ---
+        truncated_envs = live_envs & (self.current_step >= AGENT_MAX_STEPS)
+        truncations[truncated_envs] = self.active[truncated_envs]
+        self.active[truncated_envs] = False
+        self.active &= ~terminations
+
+        infos = {}
+        return self._get_obs(), rewards, terminations, truncations, infos
+
+    def _resolve_battle_win(self, env_idx, agent_idx, boss_idx, rewards, terminations):
+        """Boss 死亡: 掉落, 离开战斗, 发放奖励"""
+        # 所有击杀的掉落一次性判定: 每个击杀从自己世界的流里取 loot_count[boss] 个均匀数,
+        # 按 (env, agent) 顺序取 (np.nonzero 的顺序), 和 RpgEnv 里 agent 的处理顺序一致
+        uniforms = self._rngs.take(env_idx, self._loot_count[boss_idx], self._loot_prob.shape[1])
+        dropped = uniforms < self._loot_prob[boss_idx]  # 补齐的条目概率为 0, 不会掉
+        if dropped.any():
+            kill, entry = np.nonzero(dropped)
+            item = self._loot_item[boss_idx[kill], entry]
+            amount = self._loot_amount[boss_idx[kill], entry]
+            np.add.at(self.agent_inventories, (env_idx[kill], agent_idx[kill], item), amount)
+
+        self.agent_states[env_idx, agent_idx] = WORLD
+        self.battle_boss[env_idx, agent_idx] = -1
+
+        is_final = self._boss_is_final[boss_idx]
+        rewards[env_idx, agent_idx] = np.where(is_final, 10000, 100)
+        terminations[env_idx[is_final], agent_idx[is_final]] = True
@@ -1,12 +1,15 @@
 import gymnasium
 from gymnasium.spaces import Discrete
 from pettingzoo import AECEnv
-from pettingzoo.utils.agent_selector import agent_selector
 import numpy as np
 
 """
 这是你的“最小可行”RPG环境。
 它实现了 PettingZoo 的 AECEnv (Agent-Environment-Cycle) 接口。
+
+(新) 轮转不用 agent_selector: 只记一个下标, 每一步 O(1)。
+奖励只更新这一步行动的 agent, 不再每一步遍历所有 agent。
+结束的 agent 在它的下一次 step (动作为 None) 时被移出 self.agents, agent_iter() 才会停下来。
 """
 
 class HelloBossEnv(AECEnv):
@@ -52,9 +55,11 @@ class HelloBossEnv(AECEnv):
         self.truncations = {agent: False for agent in self.agents}
         self.infos = {agent: {} for agent in self.agents}
         
-        # 决定谁是第一个行动的
-        self.agent_selector = agent_selector(self.agents)
-        self.agent_selection = self.agent_selector.reset()
+        # 决定谁是第一个行动的 (self.agents 里的下标)
+        self._agent_index = 0
+        self.agent_selection = self.agents[0]
+        # 上一步拿到奖励的 agent (下一步只需要把它的单步奖励清零)
+        self._rewarded = None
         
         # 返回 (观察, info)
         return self.observe(self.agent_selection), {}
@@ -64,19 +69,18 @@ class HelloBossEnv(AECEnv):
 
         agent = self.agent_selection
 
-        # 1. 关键：为 env.last() 存储“上一步”的累积奖励
-        # env.last() 会用 (self.rewards[agent] - self._cumulative_rewards[agent]) 来计算单步奖励
-        self._cumulative_rewards[agent] = self.rewards[agent]
+        # 1. 关键：env.last() 已经把这个 agent 的累积奖励读走了, 从 0 重新累积;
+        #    上一步的单步奖励清零 (只有上一个行动的 agent 可能拿到了奖励)
+        self._cumulative_rewards[agent] = 0
+        if self._rewarded is not None:
+            self.rewards[self._rewarded] = 0
+            self._rewarded = None
 
-        # 2. 如果 agent 已经结束了，切换到下一个
+        # 2. 如果 agent 已经结束了 (动作是 None), 把它移出 self.agents, 切换到下一个
         if self.terminations[agent] or self.truncations[agent]:
-            # 当 agent 结束后, env.last() 必须返回 0 奖励
-            # (我们不需要在这里设置 self.rewards[agent] = 0, 
-            # 因为 _cumulative_rewards 已经等于 rewards, 相减已经是 0)
-            self.agent_selection = self.agent_selector.next()
+            self._remove_agent(agent)
             return
 
-
         # 先把这一步的奖励算作 0
         step_reward = 0
 
@@ -94,20 +98,36 @@ class HelloBossEnv(AECEnv):
         if self.boss_health <= 0 and not self.terminations[agent]: # 确保只触发一次
             print(f"*** Boss 被 {agent} 击败! ***")
             # 所有 agent 的游戏都结束了
-            self.terminations = {a: True for a in self.agents}
+            for a in self.agents:
+                self.terminations[a] = True
             # 给予击杀者额外奖励
             step_reward += 10
 
         # --- 4. 关键：把“单步奖励”加到“累积奖励”上 ---
-        self.rewards[agent] += step_reward
+        self.rewards[agent] = step_reward
+        self._cumulative_rewards[agent] += step_reward
+        self._rewarded = agent
 
         # --- 5. 切换到下一个 agent ---
-        self.agent_selection = self.agent_selector.next()
+        self._agent_index += 1
+        if self._agent_index == len(self.agents):
+            self._agent_index = 0
+        self.agent_selection = self.agents[self._agent_index]
 
         # --- 6. 渲染 (如果需要) ---
         if self.render_mode == "human":
             self.render()
 
+    def _remove_agent(self, agent):
+        """把已经结束的 agent (就是当前的 agent_selection) 移出去; 下一个 agent 移到了同一个下标上"""
+        del self.agents[self._agent_index]
+        del self.rewards[agent], self._cumulative_rewards[agent], self.infos[agent]
+        del self.terminations[agent], self.truncations[agent]
+        if self.agents:
+            if self._agent_index == len(self.agents):
+                self._agent_index = 0
+            self.agent_selection = self.agents[self._agent_index]
+
     def render(self):
         # (PettingZoo API) 可视化 (我们先用文本)
         if self.render_mode == "human":
@@ -38,7 +38,8 @@ def run_game():
     env.close()
 
 if __name__ == "__main__":
-    print("--- [已跳过] 正在进行 PettingZoo API 兼容性测试 ---")
+    print("--- 正在进行 PettingZoo API 兼容性测试 ---")
+    api_test(HelloBossEnv(), num_cycles=100)
 
     # 运行我们自己写的游戏
     print("--- 直接运行我们自己的游戏 ---")
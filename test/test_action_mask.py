@@ -0,0 +1,105 @@
+import random
+
+import numpy as np
+
+from projects.rpg_env import RpgEnv
+from projects.subproc_vec_env import SubprocRpgVecEnv
+
+"""
+增量维护的合法动作掩码 (dirty 位 + 共用的只读数组 + mask_buffer) 和按规则暴力重算的结果一致。
+
+    python -m pytest test
+"""
+
+
+def brute_force_mask(env, agent):
+    """按 env 现在的状态逐条检查每个动作是否合法"""
+    tables = env.tables
+    n_bosses = len(tables.boss_names)
+    mask = np.zeros(env.action_spaces[agent].n, dtype=np.int8)
+    mask[0] = 1
+    if env.agent_states[agent] == "BATTLE":
+        mask[1 + env.battle_instances[agent].boss] = 1
+        return mask
+    levels = list(env.agent_weapons[agent].values())
+    inventory = np.array([env.agent_inventories[agent][stone] for stone in tables.stone_names])
+    has_max_weapon = tables.max_weapon_level in levels
+    for boss_idx in range(n_bosses):
+        if has_max_weapon or not tables.requires_max_weapon[boss_idx]:
+            mask[1 + boss_idx] = 1
+    for weapon_idx, level in enumerate(levels):
+        if level < tables.max_weapon_level and (inventory >= tables.cost[weapon_idx, level + 1]).all():
+            mask[1 + n_bosses + weapon_idx] = 1
+    return mask
+
+
+def _random_action(rng, mask):
+    # 大多数时候选合法动作, 偶尔选一个不合法的 (掩码必须跟着真实状态走, 不能只跟着合法动作走)
+    if rng.random() < 0.1:
+        return rng.randrange(len(mask))
+    return rng.choice([action for action, valid in enumerate(mask) if valid])
+
+
+def test_incremental_masks_match_brute_force():
+    for kwargs in (dict(obs_format="dict"), dict(obs_format="array"), dict(fast_forward=True)):
+        for seed in range(3):
+            n_agents = 5
+            n_actions = RpgEnv(verbosity="silent").action_spaces["player_0"].n
+            mask_buffer = np.zeros((n_agents, n_actions), dtype=np.int8)
+            env = RpgEnv(verbosity="silent", n_agents=n_agents, mask_buffer=mask_buffer, **kwargs)
+            rng = random.Random(seed)
+            _, infos = env.reset(seed=seed)
+            state = None
+            for step in range(300):
+                if not env.agents:
+                    break
+                if step == 50:
+                    state = env.get_state()
+                if step == 100:
+                    env.set_state(state)
+                    infos = {agent: {"action_mask": env.action_mask(agent)} for agent in env.agents}
+                for i, agent in enumerate(env.possible_agents):
+                    expected = brute_force_mask(env, agent)
+                    assert np.array_equal(env.action_mask(agent), expected), (kwargs, seed, step, agent)
+                    assert np.array_equal(mask_buffer[i], expected)
+                    assert not env.action_mask(agent).flags.writeable
+                actions = {agent: _random_action(rng, infos[agent]["action_mask"]) for agent in env.agents}
+                _, _, _, _, step_infos = env.step(actions)
+                for agent, info in step_infos.items():
+                    assert info["action_mask"] is env.action_mask(agent)
+                infos = step_infos
+
+
+def test_subproc_mask_buffer_matches_brute_force():
+    n_worlds, n_agents, seed = 2, 3, 0
+    envs = SubprocRpgVecEnv(n_worlds, n_agents=n_agents, n_workers=2)
+    try:
+        # 和 worker 里的世界用同样的种子和动作, 在本进程里重放一份
+        mirrors = [RpgEnv(verbosity="silent", n_agents=n_agents, obs_format="array") for _ in range(n_worlds)]
+        episodes = [1] * n_worlds
+        for w, mirror in enumerate(mirrors):
+            mirror.reset(seed=seed + w)
+        _, infos = envs.reset(seed=seed)
+        rng = random.Random(seed)
+        for _ in range(200):
+            masks = infos["action_mask"]
+            for w, mirror in enumerate(mirrors):
+                for i, agent in enumerate(mirror.possible_agents):
+                    slot = w * n_agents + i
+                    if agent in mirror.agents:
+                        assert infos["active"][slot]
+                        assert np.array_equal(masks[slot], brute_force_mask(mirror, agent))
+                    else:
+                        # 先结束的 agent: 直到世界重置只有闲置
+                        assert not infos["active"][slot]
+                        assert masks[slot].tolist() == [1] + [0] * (len(masks[slot]) - 1)
+            actions = np.array([_random_action(rng, mask) for mask in masks])
+            _, _, _, _, infos = envs.step(actions)
+            for w, mirror in enumerate(mirrors):
+                mirror.step({agent: int(actions[w * n_agents + i])
+                             for i, agent in enumerate(mirror.possible_agents) if agent in mirror.agents})
+                if not mirror.agents:
+                    mirror.reset(seed=seed + w + episodes[w] * n_worlds)
+                    episodes[w] += 1
+    finally:
+        envs.close()
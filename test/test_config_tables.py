@@ -0,0 +1,41 @@
+import random
+
+from projects.rpg_env import RpgEnv
+from projects.config_tables import compile_config
+
+"""
+RpgEnv 用覆盖过的 config 表 (compile_config(...)) 运行。
+
+    python -m pytest test
+"""
+
+
+def test_env_steps_with_overridden_max_weapon_level():
+    tables = compile_config(max_weapon_level=2)
+    final_boss_action = 1 + tables.final_boss
+    for obs_format in ("dict", "array"):
+        env = RpgEnv(verbosity="silent", config_tables=tables, obs_format=obs_format)
+        space = env.observation_spaces["player_0"]
+        rng = random.Random(0)
+        observations, infos = env.reset(seed=0)
+        reached_max = False
+        while env.agents:
+            actions = {}
+            for agent in env.agents:
+                obs = observations[agent]
+                if obs_format == "array":
+                    assert space.contains(obs)
+                else:
+                    # (dict 格式里 Boss 血量是 float, 只检查范围)
+                    assert space["my_weapons"].contains(obs["my_weapons"])
+                    assert obs["battle_boss_health"] < space["battle_boss_health"].n
+                mask = infos[agent]["action_mask"]
+                if 2 in env.agent_weapons[agent].values():
+                    reached_max = True
+                    # 满级 (2 级) 武器就能去打 final_boss
+                    if env.agent_states[agent] == "WORLD":
+                        assert mask[final_boss_action]
+                actions[agent] = rng.choice([a for a, valid in enumerate(mask) if valid])
+            observations, _, _, _, infos = env.step(actions)
+        assert reached_max
+        assert max(level for weapons in env.agent_weapons.values() for level in weapons.values()) == 2
@@ -0,0 +1,68 @@
+from projects.rpg_env import RpgEnv
+
+"""
+fast_forward 模式和逐步 step 的一致性。
+
+    python -m pytest test
+"""
+
+
+def _battle_snapshot(seed=0):
+    """所有 agent 进入 fire_boss 的战斗并攻击一次之后的快照 (战斗还没结束)"""
+    env = RpgEnv(verbosity="silent")
+    env.reset(seed=seed)
+    for _ in range(2):
+        env.step(dict.fromkeys(env.agents, 1))
+    assert all(state == "BATTLE" for state in env.agent_states.values())
+    return env.get_state()
+
+
+def _finish_stepwise(env):
+    """逐步攻击直到所有 agent 回到世界里"""
+    while any(state == "BATTLE" for state in env.agent_states.values()):
+        env.step({agent: 1 for agent in env.agents if env.agent_states[agent] == "BATTLE"})
+
+
+def test_fast_forward_resumes_mid_battle_snapshot():
+    state = _battle_snapshot()
+
+    fast = RpgEnv(verbosity="silent", fast_forward=True)
+    fast.reset(seed=0)
+    fast.set_state(state)
+    observations, rewards, terminations, truncations, infos = fast.step(dict.fromkeys(fast.agents, 1))
+
+    slow = RpgEnv(verbosity="silent")
+    slow.reset(seed=0)
+    slow.set_state(state)
+    _finish_stepwise(slow)
+
+    for agent in slow.possible_agents:
+        assert observations[agent] == slow.observe(agent)
+        assert fast.agent_healths[agent] == slow.agent_healths[agent]
+        assert fast.agent_steps[agent] == slow.current_step
+
+
+def test_fast_forward_matches_stepwise_for_mixed_policy():
+    # 从战斗中的快照开始: 战斗中闲置, 用制作动作 (战斗中就是攻击) 打完, 之后在世界里混合各种动作
+    env = RpgEnv(verbosity="silent", n_agents=1)
+    env.reset(seed=0)
+    env.step({"player_0": 1})
+    assert env.agent_states["player_0"] == "BATTLE"
+    state = env.get_state()
+
+    fast = RpgEnv(verbosity="silent", fast_forward=True, n_agents=1)
+    slow = RpgEnv(verbosity="silent", n_agents=1)
+    for e in (fast, slow):
+        e.reset(seed=0)
+        e.set_state(state)
+
+    for action in (0, 7, 0, 7, 1, 8, 0, 2, 7, 3):
+        observations = fast.step({"player_0": action})[0]
+        slow.step({"player_0": action})
+        # 逐步模式下一直用同一个动作打到战斗结束
+        while action > 0 and slow.agent_states.get("player_0") == "BATTLE":
+            slow.step({"player_0": action})
+        assert observations["player_0"] == slow.observe("player_0")
+        assert fast.agent_states["player_0"] == slow.agent_states["player_0"]
+        assert fast.agent_healths["player_0"] == slow.agent_healths["player_0"]
+        assert fast.agent_steps["player_0"] == slow.current_step
@@ -0,0 +1,70 @@
+import sqlite3
+
+from projects.rpg_env import RpgEnv
+from projects.llm_agent import LLMAgent
+from projects.fake_llm import FakeGenerativeModel, FakeResponse
+from projects.decision_cache import DecisionCache
+
+"""
+LLMAgent 的回复解析和决策缓存。
+
+    python -m pytest test
+"""
+
+
+class ReplyModel:
+    """每次都返回同一段回复文本的模型"""
+
+    def __init__(self, text):
+        self.text = text
+
+    def generate_content(self, prompt):
+        return FakeResponse(self.text)
+
+
+def _first_obs():
+    env = RpgEnv(verbosity="silent")
+    observations, infos = env.reset(seed=0)
+    return observations["player_0"], infos["player_0"]["action_mask"]
+
+
+def test_garbage_reply_is_not_cached(tmp_path):
+    obs, mask = _first_obs()
+    path = str(tmp_path / "decisions.sqlite")
+    for text in ("这不是 JSON", '{"action_id": "attack"}', '{"action_id": 99}', '{"action_id": 7}'):
+        cache = DecisionCache(path=path)
+        agent = LLMAgent(model=ReplyModel(text), cache=cache)
+        # 7 (升级武器) 在一开始是不可用的动作
+        assert agent.choose_action(obs, 0, mask) == 0
+        assert len(cache) == 0
+        cache.close()
+    with sqlite3.connect(path) as db:
+        assert db.execute("SELECT COUNT(*) FROM decisions").fetchone()[0] == 0
+
+
+def test_valid_reply_is_cached():
+    obs, mask = _first_obs()
+    cache = DecisionCache()
+    agent = LLMAgent(model=FakeGenerativeModel(latency=0, policy=lambda prompt: 1), cache=cache)
+    assert agent.choose_action(obs, 0, mask) == 1
+    assert len(cache) == 1
+    assert agent.choose_action(obs, 0, mask) == 1
+    assert agent.routes["cache"] == 1
+
+
+def test_joint_fallback_gets_step_and_mask():
+    from projects.joint_llm_controller import JointLLMController
+    env = RpgEnv(verbosity="silent")
+    observations, infos = env.reset(seed=0)
+    masks = {agent: infos[agent]["action_mask"] for agent in env.agents}
+    calls = []
+
+    def fallback(obs, current_step, action_mask):
+        calls.append((current_step, action_mask))
+        return 0
+
+    controller = JointLLMController(env.action_spaces, model=ReplyModel("这不是 JSON"), fallback=fallback)
+    actions = controller.choose_actions(observations, list(env.agents), 3, masks)
+    assert actions == dict.fromkeys(env.agents, 0)
+    assert calls == [(3, masks[agent]) for agent in env.agents]
+    assert controller.fallbacks == len(env.agents)
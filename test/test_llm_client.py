@@ -0,0 +1,64 @@
+import time
+import asyncio
+
+import pytest
+
+from projects.fake_llm import FakeResponse
+from projects.llm_client import LLMClient, CircuitBreaker, LLMUnavailableError
+
+"""
+LLMClient 的熔断、超时和重试。
+
+    python -m pytest test
+"""
+
+
+class FlakyModel:
+    """前 failures 次调用抛出 error, 之后正常回复"""
+
+    def __init__(self, error, failures=1, delay=0.0):
+        self.error = error
+        self.failures = failures
+        self.delay = delay
+        self.calls = 0
+
+    def generate_content(self, prompt):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.calls <= self.failures:
+            raise self.error
+        return FakeResponse('{"action_id": 1}')
+
+
+def test_breaker_cancel_only_releases_own_probe():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=1, recovery_s=10, clock=lambda: now[0])
+    stale = breaker.allow()
+    breaker.record_failure()
+    now[0] = 10.0
+    probe = breaker.allow()
+    assert probe
+    assert not breaker.allow()
+    # 别的请求 (这里是熔断之前放行的) 取消不能把探测名额还回去
+    breaker.cancel(stale)
+    assert not breaker.allow()
+    breaker.cancel(probe)
+    assert breaker.allow()
+
+
+def test_model_timeout_error_is_retried():
+    for run in (lambda client: client.generate("p"), lambda client: asyncio.run(client.generate_async("p"))):
+        model = FlakyModel(TimeoutError("read timed out"))
+        client = LLMClient(model, max_retries=2, backoff_s=0.0, deadline_s=5)
+        assert run(client).text == '{"action_id": 1}'
+        assert model.calls == 2
+        assert client.stats["retries"] == 1
+
+
+def test_sync_generate_honours_deadline():
+    client = LLMClient(FlakyModel(None, failures=0, delay=2.0), deadline_s=0.1)
+    start = time.monotonic()
+    with pytest.raises(LLMUnavailableError):
+        client.generate("p")
+    assert time.monotonic() - start < 1.0
+    assert client.stats["deadline_exceeded"] == 1
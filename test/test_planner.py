@@ -0,0 +1,50 @@
+from projects.planner import Planner, PlannerAgent
+from projects.rpg_env import RpgEnv
+
+"""
+Planner 在 AGENT_MAX_STEPS 之内求奖励最大的计划, PlannerAgent 在 RpgEnv 里拿到的正是这个奖励。
+
+    python -m pytest test
+"""
+
+
+def _run(env, agent_brain):
+    observations, infos = env.reset(seed=0)
+    returns = dict.fromkeys(env.possible_agents, 0)
+    while env.agents:
+        actions = {agent: agent_brain.choose_action(observations[agent], env.current_step, infos[agent]["action_mask"])
+                   for agent in env.agents}
+        observations, rewards, terminations, truncations, infos = env.step(actions)
+        for agent, reward in rewards.items():
+            returns[agent] += int(reward)
+    return returns
+
+
+def test_planner_agent_earns_best_reward_within_horizon():
+    env = RpgEnv(verbosity="silent", n_agents=2)
+    agent_brain = PlannerAgent(env)
+    planner = agent_brain.planner
+    weapons = [0] * planner.n_weapons
+    inventory = [0] * len(env.tables.stone_names)
+    # 默认 config 的最短通关计划比 AGENT_MAX_STEPS 长: 时限内打不到 final_boss
+    assert planner.steps_to_goal(weapons, inventory) > planner.max_steps
+    plan = planner.plan(weapons, inventory)
+    assert plan[-1][0] != 1 + env.tables.final_boss
+    assert sum(steps for _, steps in plan) <= planner.max_steps
+
+    best = planner.best_reward(weapons, inventory)
+    assert _run(env, agent_brain) == dict.fromkeys(env.possible_agents, best)
+
+
+def test_planner_reaches_final_boss_with_longer_horizon():
+    env = RpgEnv(verbosity="silent")
+    weapons = [0] * len(env.tables.weapon_names)
+    inventory = [0] * len(env.tables.stone_names)
+    shortest = Planner(env.tables).steps_to_goal(weapons, inventory)
+
+    planner = Planner(env.tables, max_steps=shortest)
+    plan = planner.plan(weapons, inventory)
+    assert plan[-1][0] == 1 + env.tables.final_boss
+    assert sum(steps for _, steps in plan) == shortest
+    # 时限更长时奖励不会变少
+    assert planner.best_reward(weapons, inventory) > Planner(env.tables).best_reward(weapons, inventory)
@@ -0,0 +1,24 @@
+from projects.rpg_env import RpgEnv
+from projects.profiler import Profiler
+
+"""
+Profiler 的分阶段计数。
+
+    python -m pytest test
+"""
+
+
+def test_obs_phases_are_not_double_counted():
+    profiler = Profiler()
+    env = RpgEnv(verbosity="silent", profiler=profiler)
+    env.reset(seed=0)
+    state = env.get_state()
+    returned = 0
+    for i in range(10):
+        if i == 5:
+            env.set_state(state) # 缓存作废: 下一次 _step_obs 会调用 _get_obs
+        returned += len(env.step(dict.fromkeys(env.agents, 1))[0])
+    timings = profiler.snapshot()["timings"]
+    assert timings["env.obs"]["calls"] == returned
+    assert timings["env.obs_full"]["calls"] == 2 * len(env.possible_agents)
+    assert timings["env.step_other"]["calls"] == timings["env.step"]["calls"] == 10
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from projects.rpg_env import RpgEnv
+from projects.trajectory import TrajectoryRecorder, TrajectoryReader
+
+"""
+轨迹记录的 dtype 和 env.close()。
+
+    python -m pytest test
+"""
+
+
+def test_env_close_writes_recorded_rows(tmp_path):
+    recorder = TrajectoryRecorder(str(tmp_path))
+    env = RpgEnv(verbosity="silent", recorder=recorder)
+    env.reset(seed=0)
+    env.step(dict.fromkeys(env.agents, 1))
+    env.close()
+    reader = TrajectoryReader(str(tmp_path))
+    assert len(reader) == 5
+    assert reader.episodes == 1
+
+
+def test_agent_column_fits_n_agents(tmp_path):
+    assert TrajectoryRecorder(str(tmp_path / "small")).max_agents == 32768
+    with pytest.raises(ValueError):
+        RpgEnv(verbosity="silent", n_agents=40000, recorder=TrajectoryRecorder(str(tmp_path / "small")))
+
+    recorder = TrajectoryRecorder(str(tmp_path / "big"), n_agents=40000)
+    env = RpgEnv(verbosity="silent", fast_forward=True, n_agents=40000, recorder=recorder)
+    env.reset(seed=0)
+    env.step({"player_39999": 0})
+    env.close()
+    agents = TrajectoryReader(str(tmp_path / "big")).take(np.arange(1), columns=["agent"])["agent"]
+    assert agents.tolist() == [39999]